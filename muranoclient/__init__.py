@@ -13,6 +13,7 @@
 #    under the License.
 
 import os
+import sys
 
 import pbr.version
 
@@ -24,7 +25,24 @@ def get_resource(path):
 
 version_info = pbr.version.VersionInfo('python-muranoclient')
 
-try:
-    __version__ = version_info.version_string()
-except AttributeError:
-    __version__ = None
+
+def _version_string():
+    try:
+        return version_info.version_string()
+    except AttributeError:
+        return None
+
+
+if sys.version_info >= (3, 7):
+    # NOTE: version_string() imports pbr.packaging and setuptools, which
+    # makes up a large part of the CLI start up time, so __version__ is
+    # only computed when it is actually accessed
+    def __getattr__(name):
+        if name == '__version__':
+            global __version__
+            __version__ = _version_string()
+            return __version__
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(
+            __name__, name))
+else:
+    __version__ = _version_string()
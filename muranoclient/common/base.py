@@ -18,7 +18,10 @@ Base utilities to build API operation managers and objects on top of.
 """
 
 import abc
-import copy
+import collections
+from multiprocessing import pool as mp_pool
+import threading
+import time
 
 import six
 
@@ -32,6 +35,38 @@ except NameError:
     def all(iterable):
         return True not in (not x for x in iterable)
 
+FIND_CACHE_TTL = 30  # seconds
+GET_MANY_CONCURRENCY = 8
+
+# result of calling a function for a single item in run_concurrently,
+# either result or error is None
+CallResult = collections.namedtuple('CallResult', ['item', 'result', 'error'])
+
+
+def run_concurrently(func, items, concurrency):
+    """Call func for every item using at most concurrency threads.
+
+    An exception raised for one of the items does not abort the others,
+    it is returned in the result of the item.
+
+    :returns: list of CallResult in the order of items
+    """
+    def call(item):
+        try:
+            return CallResult(item, func(item), None)
+        except Exception as e:
+            return CallResult(item, None, e)
+
+    items = list(items)
+    if concurrency <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+    pool = mp_pool.ThreadPool(min(concurrency, len(items)))
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+
 
 def getid(obj):
     """Get obj's id or object itself if no id
@@ -56,15 +91,42 @@ class Manager(object):
     def __init__(self, api):
         self.api = api
 
+    def get_many(self, ids, concurrency=GET_MANY_CONCURRENCY, **kwargs):
+        """Fetch resources with get() concurrently.
+
+        Resources are fetched by at most ``concurrency`` threads, each id
+        only once. Failure to fetch one of the resources does not abort
+        the others.
+
+        :param ids: ids of resources to fetch
+        :param kwargs: passed to every get() call
+        :returns: list of CallResult in the order of first occurrence of
+                  ids
+        """
+        def fetch(resource_id):
+            return self.get(resource_id, **kwargs)
+
+        return run_concurrently(fetch, collections.OrderedDict.fromkeys(ids),
+                                concurrency)
+
     def _list(self, url, response_key=None, obj_class=None,
-              data=None, headers=None):
+              data=None, headers=None, stream=False):
+        """List resources.
 
+        With ``stream`` an iterator is returned, which yields resources as
+        they are decoded from the response, instead of decoding the whole
+        response at once.
+        """
         if headers is None:
             headers = {}
-        resp, body = self.api.json_request(url, 'GET', headers=headers)
-
         if obj_class is None:
             obj_class = self.resource_class
+        if stream:
+            resp, items = self.api.json_stream_request(
+                url, 'GET', response_key=response_key, headers=headers)
+            return (obj_class(self, res, loaded=True) for res in items if res)
+
+        resp, body = self.api.json_request(url, 'GET', headers=headers)
 
         if response_key:
             if response_key not in body:
@@ -128,17 +190,62 @@ class Manager(object):
 
 @six.add_metaclass(abc.ABCMeta)
 class ManagerWithFind(Manager):
-    """Manager with additional `find()`/`findall()` methods."""
+    """Manager with additional `find()`/`findall()` methods.
+
+    The listing searched by `find()`/`findall()` is indexed by name and id
+    and reused for ``find_cache_ttl`` seconds, so resolving many names
+    costs a single listing. The index is dropped when resources are
+    created, updated or deleted through the manager.
+    """
+    find_cache_ttl = FIND_CACHE_TTL
+    _find_cache = None
+
+    def __init__(self, api):
+        super(ManagerWithFind, self).__init__(api)
+        # NOTE: names resolved concurrently should share a single listing
+        self._find_lock = threading.Lock()
 
     @abc.abstractmethod
     def list(self):
         pass
 
+    def invalidate_find_cache(self):
+        self._find_cache = None
+
+    def _listing(self):
+        """Return (objects, {name: [objects]}, {id: object}) of list()."""
+        with self._find_lock:
+            cached = self._find_cache
+            now = time.time()
+            if cached is None or now - cached[0] > self.find_cache_ttl:
+                objs = list(self.list())
+                by_name = {}
+                by_id = {}
+                for obj in objs:
+                    by_name.setdefault(getattr(obj, 'name', None),
+                                       []).append(obj)
+                    by_id[getattr(obj, 'id', None)] = obj
+                cached = (now, (objs, by_name, by_id))
+                self._find_cache = cached
+        return cached[1]
+
+    def _create(self, *args, **kwargs):
+        self.invalidate_find_cache()
+        return super(ManagerWithFind, self)._create(*args, **kwargs)
+
+    def _update(self, *args, **kwargs):
+        self.invalidate_find_cache()
+        return super(ManagerWithFind, self)._update(*args, **kwargs)
+
+    def _delete(self, *args, **kwargs):
+        self.invalidate_find_cache()
+        return super(ManagerWithFind, self)._delete(*args, **kwargs)
+
     def find(self, **kwargs):
         """Find a single item with attributes matching ``**kwargs``.
 
-        This isn't very efficient: it loads the entire list then filters on
-        the Python side.
+        The listed object is returned as is, without fetching details of
+        the item.
         """
         rl = self.findall(**kwargs)
         num = len(rl)
@@ -149,18 +256,25 @@ class ManagerWithFind(Manager):
         elif num > 1:
             raise exceptions.NoUniqueMatch
         else:
-            return self.get(rl[0].id)
+            return rl[0]
 
     def findall(self, **kwargs):
         """Find all items with attributes matching ``**kwargs``.
 
-        This isn't very efficient: it loads the entire list then filters on
-        the Python side.
+        Lookups by name or id use the index of the listing, other ones
+        filter the listing on the Python side.
         """
+        objs, by_name, by_id = self._listing()
+        if list(kwargs) == ['name']:
+            return list(by_name.get(kwargs['name'], []))
+        if list(kwargs) == ['id']:
+            obj = by_id.get(kwargs['id'])
+            return [] if obj is None else [obj]
+
         found = []
         searches = kwargs.items()
 
-        for obj in self.list():
+        for obj in objs:
             try:
                 if all(getattr(obj, attr) == value
                        for (attr, value) in searches):
@@ -171,44 +285,136 @@ class ManagerWithFind(Manager):
         return found
 
 
+def _copy_tree(value):
+    """Copy nested dicts and lists, sharing all other values."""
+    if isinstance(value, dict):
+        return dict((k, _copy_tree(v)) for k, v in six.iteritems(value))
+    if isinstance(value, list):
+        return [_copy_tree(v) for v in value]
+    return value
+
+
+# NOTE: __dict__ is only created for resources with fields named like
+# attributes of their class, see Resource._shadow
+_RESOURCE_SLOTS = ('manager', '_info', '_loaded', '_attrs', '__dict__')
+_MISSING = object()
+
+
 class Resource(object):
     """Represents an instance of an object
 
     A resource represents a particular instance of an object (tenant, user,
     etc). This is pretty much just a bag for attributes.
 
+    Attributes are read from the ``info`` dict, which is kept as is and is
+    never modified in place: details loaded later are merged into a copy
+    of it. Attributes assigned to a resource are kept apart from ``info``
+    and are not returned by `to_dict()`. Only the few fields listed in
+    ``__slots__`` are stored on the instance itself.
+
+    Fields are resolved by `__getattr__`, after the normal lookup fails.
+    Fields named like methods of the class are also copied to the instance
+    ``__dict__``, so that they shadow the methods as they used to.
+
     :param manager: Manager object
     :param info: dictionary representing resource attributes
     :param loaded: prevent lazy-loading if set to True
     """
+    __slots__ = _RESOURCE_SLOTS
+
+    def __new__(cls, *args, **kwargs):
+        self = super(Resource, cls).__new__(cls)
+        # NOTE: subclasses may skip __init__, so that slots are always set
+        # here and attribute lookups never find them empty
+        object.__setattr__(self, 'manager', None)
+        object.__setattr__(self, '_info', {})
+        object.__setattr__(self, '_loaded', False)
+        object.__setattr__(self, '_attrs', None)
+        return self
 
     def __init__(self, manager, info, loaded=False):
         self.manager = manager
         self._info = info
-        self._add_details(info)
         self._loaded = loaded
+        self._shadow(info)
+
+    def _shadow(self, names):
+        for k in names:
+            if k.startswith('_'):
+                continue
+            attr = getattr(type(self), k, _MISSING)
+            if attr is _MISSING or hasattr(attr, '__set__'):
+                continue
+            if self._attrs is not None and k in self._attrs:
+                self.__dict__[k] = self._attrs[k]
+            elif k in self._info:
+                self.__dict__[k] = self._info[k]
+            else:
+                self.__dict__.pop(k, None)
 
     def _add_details(self, info):
-        for k, v in info.items():
-            setattr(self, k, v)
+        details = dict(self._info)
+        details.update(info)
+        self._info = details
+        self._shadow(info)
+
+    def __getstate__(self):
+        return {'manager': self.manager, '_info': self._info,
+                '_loaded': self._loaded,
+                '_attrs': None if self._attrs is None else dict(self._attrs)}
 
     def __setstate__(self, d):
         for k, v in d.items():
             setattr(self, k, v)
+        self._shadow(self._info)
+        self._shadow(self._attrs or ())
+
+    def __setattr__(self, k, v):
+        if (k in _RESOURCE_SLOTS or
+                hasattr(getattr(type(self), k, None), '__set__')):
+            object.__setattr__(self, k, v)
+            return
+        if self._attrs is None:
+            self._attrs = {}
+        self._attrs[k] = v
+        self._shadow((k,))
+
+    def __delattr__(self, k):
+        if self._attrs is not None and k in self._attrs:
+            del self._attrs[k]
+        elif k in self._info:
+            self._info = dict((key, value)
+                              for key, value in six.iteritems(self._info)
+                              if key != k)
+        else:
+            object.__delattr__(self, k)
+            return
+        self._shadow((k,))
 
     def __getattr__(self, k):
-        if k not in self.__dict__:
+        # NOTE: only called when the normal lookup fails, fields of the
+        # resource are not stored on the instance and are resolved here
+        if k not in _RESOURCE_SLOTS:
+            if self._attrs is not None and k in self._attrs:
+                return self._attrs[k]
+            if k in self._info:
+                return self._info[k]
             # NOTE(bcwaldon): disallow lazy-loading if already loaded once
             if not self.is_loaded():
                 self.get()
-                return self.__getattr__(k)
-            raise AttributeError(k)
-        else:
-            return self.__dict__[k]
+                return getattr(self, k)
+        raise AttributeError(k)
+
+    def __dir__(self):
+        names = set(dir(type(self)))
+        names.update(self._info)
+        names.update(self._attrs or ())
+        return sorted(names)
 
     def __repr__(self):
-        reprkeys = sorted(k for k in self.__dict__.keys() if k[0] != '_' and
-                          k != 'manager')
+        keys = set(self._info)
+        keys.update(self._attrs or ())
+        reprkeys = sorted(k for k in keys if k[0] != '_' and k != 'manager')
         info = ", ".join("%s=%s" % (k, getattr(self, k)) for k in reprkeys)
         return "<%s %s>" % (self.__class__.__name__, info)
 
@@ -237,4 +443,4 @@ class Resource(object):
         self._loaded = val
 
     def to_dict(self):
-        return copy.deepcopy(self._info)
+        return _copy_tree(self._info)
@@ -0,0 +1,678 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Client side caches for responses of murano API and package repositories.
+"""
+
+import collections
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import encodeutils
+from oslo_utils import importutils
+import requests
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_ENTRY_SIZE = 1024 * 1024  # 1MB
+DEFAULT_DOWNLOAD_CACHE_SIZE = 1024 * 1024 * 1024  # 1GB
+DEFAULT_DISCOVERY_TTL = 24 * 60 * 60  # 1 day
+
+
+class LRUCache(object):
+    """Thread-safe mapping holding at most ``max_entries`` recent items."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+_MISSING = object()
+_INVALID = object()
+
+
+class ParseCache(object):
+    """Bounded memo of a parse function shared by validation and parsing.
+
+    Failed parses are remembered too, so rejecting a string again is as
+    cheap as accepting it.
+
+    :param parse: function parsing a string
+    :param errors: exception classes raised by ``parse`` for invalid input
+    :param max_entries: maximum number of remembered strings
+    """
+
+    def __init__(self, parse, errors, max_entries=DEFAULT_MAX_ENTRIES):
+        self._parse = parse
+        self._errors = errors
+        self._memory = LRUCache(max_entries)
+
+    def parse(self, text):
+        """Return parsed text, raising the parser error if it is invalid."""
+        result = self._memory.get(text, _MISSING)
+        if result is _MISSING or result is _INVALID:
+            try:
+                result = self._parse(text)
+            except self._errors:
+                self._memory.set(text, _INVALID)
+                raise
+            self._memory.set(text, result)
+        return result
+
+    def is_valid(self, text):
+        result = self._memory.get(text, _MISSING)
+        if result is _MISSING:
+            try:
+                result = self._parse(text)
+            except self._errors:
+                result = _INVALID
+            self._memory.set(text, result)
+        return result is not _INVALID
+
+    def clear(self):
+        self._memory.clear()
+
+    def stats(self):
+        return self._memory.stats()
+
+
+def _private_makedirs(path):
+    if not os.path.isdir(path):
+        os.makedirs(path, 0o700)
+
+
+def _private_open(path, mode='wb'):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    return os.fdopen(fd, mode)
+
+
+class CachedResponse(object):
+    """Body and validators of a response stored in ResponseCache."""
+
+    def __init__(self, status_code, reason, headers, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @classmethod
+    def from_response(cls, resp):
+        return cls(resp.status_code, resp.reason, dict(resp.headers),
+                   resp.content)
+
+    def validators(self):
+        """Headers used to revalidate the response with the server."""
+        headers = {}
+        for name, value in six.iteritems(self.headers):
+            if name.lower() == 'etag':
+                headers['If-None-Match'] = value
+            elif name.lower() == 'last-modified':
+                headers['If-Modified-Since'] = value
+        return headers
+
+    def to_response(self, not_modified):
+        """Build a response from the cached one and a 304 reply."""
+        resp = requests.Response()
+        resp.status_code = self.status_code
+        resp.reason = self.reason
+        resp.headers = requests.structures.CaseInsensitiveDict(self.headers)
+        # NOTE: 304 replies may carry refreshed validators
+        for name in ('ETag', 'Last-Modified', 'Date'):
+            if name in not_modified.headers:
+                resp.headers[name] = not_modified.headers[name]
+        resp._content = self.content
+        resp.url = getattr(not_modified, 'url', None)
+        resp.raw = getattr(not_modified, 'raw', None)
+        resp.request = getattr(not_modified, 'request', None)
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        return resp
+
+    def dump(self, fileobj):
+        meta = {'status_code': self.status_code, 'reason': self.reason,
+                'headers': self.headers}
+        fileobj.write(jsonutils.dump_as_bytes(meta) + b'\n')
+        fileobj.write(self.content)
+
+    @classmethod
+    def load(cls, fileobj):
+        meta = jsonutils.loads(fileobj.readline())
+        return cls(meta['status_code'], meta['reason'], meta['headers'],
+                   fileobj.read())
+
+
+class ResponseCache(object):
+    """Cache of GET responses revalidated with ETag/Last-Modified.
+
+    Responses carrying an ``ETag`` or ``Last-Modified`` header are kept in
+    a bounded in-memory LRU and, if ``cache_dir`` is given, on disk. Next
+    requests to the same resource are sent with ``If-None-Match`` and
+    ``If-Modified-Since`` headers and a ``304 Not Modified`` reply is served
+    from the cache.
+
+    :param max_entries: maximum number of responses kept in memory and on
+                        disk
+    :param max_entry_size: responses with bigger bodies are not cached
+    :param cache_dir: directory to persist responses in (optional)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_entry_size=DEFAULT_MAX_ENTRY_SIZE, cache_dir=None):
+        self.max_entry_size = max_entry_size
+        self.cache_dir = cache_dir
+        self._memory = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            _private_makedirs(cache_dir)
+
+    @staticmethod
+    def make_key(url, scope=None, headers=None):
+        """Key of a resource as seen by a particular user."""
+        key = hashlib.sha256()
+        key.update(encodeutils.safe_encode(url))
+        for item in (scope or ()):
+            key.update(b'\0' + six.text_type(item).encode('utf-8'))
+        for name, value in sorted(six.iteritems(headers or {})):
+            if name.lower().startswith('if-'):
+                continue
+            key.update(b'\0' + six.text_type(name).encode('utf-8') +
+                       b':' + six.text_type(value).encode('utf-8'))
+        return key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        entry = self._memory.get(key)
+        if entry is None and self.cache_dir:
+            try:
+                with open(self._path(key), 'rb') as cache_file:
+                    entry = CachedResponse.load(cache_file)
+                # NOTE: mtime tracks last use, atime is often not updated
+                os.utime(self._path(key), None)
+            except (IOError, OSError, ValueError, KeyError):
+                return None
+            self._memory.set(key, entry)
+        return entry
+
+    def set(self, key, resp):
+        """Store a response if it can be revalidated later."""
+        entry = CachedResponse.from_response(resp)
+        if not entry.validators():
+            return
+        if entry.content is None or len(entry.content) > self.max_entry_size:
+            return
+        self._memory.set(key, entry)
+        if self.cache_dir:
+            try:
+                with _private_open(self._path(key)) as cache_file:
+                    entry.dump(cache_file)
+                self._prune_disk()
+            except (IOError, OSError) as e:
+                LOG.debug("Could not store response in {0}: {1}".format(
+                    self.cache_dir, e))
+
+    def _prune_disk(self):
+        names = os.listdir(self.cache_dir)
+        excess = len(names) - self._memory.max_entries
+        if excess <= 0:
+            return
+        paths = sorted((os.path.join(self.cache_dir, name) for name in names),
+                       key=os.path.getmtime)
+        for path in paths[:excess]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def invalidate(self, key):
+        self._memory.pop(key)
+        if self.cache_dir:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                self.invalidate(name)
+
+    def validators(self, key):
+        """Return stored entry and revalidation headers for a key."""
+        entry = self.get(key)
+        if entry is None:
+            return None, {}
+        return entry, entry.validators()
+
+    def update(self, key, entry, resp):
+        """Process a reply to a (possibly) conditional request.
+
+        Returns the response that should be handed to the caller: the
+        cached one for ``304 Not Modified`` and ``resp`` otherwise.
+        """
+        if entry is not None and resp.status_code == 304:
+            self.hits += 1
+            return entry.to_response(resp)
+        self.misses += 1
+        if resp.status_code == 200:
+            self.set(key, resp)
+        elif entry is not None:
+            self.invalidate(key)
+        return resp
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._memory),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': float(self.hits) / total if total else 0,
+            'evictions': self._memory.evictions,
+        }
+
+
+class ValidationCache(object):
+    """Results of package validation keyed by archive digest.
+
+    Results are kept in a bounded in-memory LRU and, if ``cache_dir`` is
+    given, on disk, so unchanged packages are validated once across runs.
+
+    :param cache_dir: directory to persist results in (optional)
+    :param max_entries: maximum number of results kept in memory
+    """
+
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self._memory = LRUCache(max_entries)
+        if cache_dir:
+            _private_makedirs(cache_dir)
+
+    @staticmethod
+    def make_key(digest, validator_version):
+        """Key of an archive digest validated by a validator version."""
+        key = hashlib.sha256(encodeutils.safe_encode(digest))
+        key.update(b'\0' + encodeutils.safe_encode(validator_version))
+        return key.hexdigest()
+
+    def get(self, key):
+        """Return (found, result) pair for a key."""
+        result = self._memory.get(key, self)
+        if result is not self:
+            return True, result
+        if self.cache_dir:
+            try:
+                with open(os.path.join(self.cache_dir, key), 'rb') as f:
+                    result = jsonutils.loads(f.read())['result']
+            except (IOError, OSError, ValueError, KeyError):
+                return False, None
+            self._memory.set(key, result)
+            return True, result
+        return False, None
+
+    def set(self, key, result):
+        self._memory.set(key, result)
+        if self.cache_dir:
+            try:
+                with _private_open(os.path.join(self.cache_dir, key)) as f:
+                    f.write(jsonutils.dump_as_bytes({'result': result}))
+            except (IOError, OSError) as e:
+                LOG.debug("Could not store validation result in {0}: "
+                          "{1}".format(self.cache_dir, e))
+
+    def clear(self):
+        self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                try:
+                    os.unlink(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        return self._memory.stats()
+
+
+class DownloadCache(object):
+    """Persistent cache of files downloaded from package repositories.
+
+    Downloaded files are stored once per content hash, an index maps urls
+    to hashes and validators of the last response. Cached urls are
+    revalidated with ``If-None-Match``/``If-Modified-Since`` and served
+    from disk on ``304 Not Modified`` or when the repository is
+    unreachable. Least recently used files are removed once the cache
+    grows over ``max_size`` bytes.
+
+    :param cache_dir: directory to keep the cache in
+    :param max_size: size budget of the cache in bytes
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_DOWNLOAD_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._blobs_dir = os.path.join(cache_dir, 'blobs')
+        self._index_dir = os.path.join(cache_dir, 'index')
+        _private_makedirs(self._blobs_dir)
+        _private_makedirs(self._index_dir)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _index_path(self, url):
+        key = hashlib.sha256(encodeutils.safe_encode(url)).hexdigest()
+        return os.path.join(self._index_dir, key)
+
+    def _blob_path(self, digest):
+        return os.path.join(self._blobs_dir, digest)
+
+    def _load(self, url):
+        try:
+            with open(self._index_path(url), 'rb') as index_file:
+                meta = jsonutils.loads(index_file.read())
+        except (IOError, OSError, ValueError):
+            return None
+        if (meta.get('url') != url or
+                not os.path.isfile(self._blob_path(meta.get('sha256', '')))):
+            return None
+        return meta
+
+    def _open_blob(self, meta, mode):
+        path = self._blob_path(meta['sha256'])
+        # NOTE: mtime tracks last use, atime is often not updated
+        os.utime(path, None)
+        return open(path, mode)
+
+    def _store(self, resp):
+        digest = hashlib.sha256()
+        # NOTE: NamedTemporaryFile is created with 0600 permissions
+        tmp = tempfile.NamedTemporaryFile(dir=self._blobs_dir, prefix='.',
+                                          delete=False)
+        try:
+            with tmp:
+                for chunk in resp.iter_content(1024 * 1024):
+                    tmp.write(chunk)
+                    digest.update(chunk)
+            os.rename(tmp.name, self._blob_path(digest.hexdigest()))
+        except Exception:
+            os.unlink(tmp.name)
+            raise
+        return digest.hexdigest()
+
+    def open(self, url, mode='rb'):
+        """Return file object with contents of url."""
+        meta = self._load(url)
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            resp = requests.get(url, stream=True, headers=headers)
+        except requests.exceptions.ConnectionError as e:
+            if meta is None:
+                raise
+            LOG.warning("Could not revalidate {0}, using cached copy: "
+                        "{1}".format(url, e))
+            self.hits += 1
+            return self._open_blob(meta, mode)
+
+        if meta is not None and resp.status_code == 304:
+            resp.close()
+            self.hits += 1
+            return self._open_blob(meta, mode)
+        if not resp.ok:
+            raise ValueError("Got non-ok status({0}) "
+                             "while connecting to {1}".format(
+                                 resp.status_code, url))
+
+        self.misses += 1
+        meta = {
+            'url': url,
+            'sha256': self._store(resp),
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+        }
+        with _private_open(self._index_path(url)) as index_file:
+            index_file.write(jsonutils.dump_as_bytes(meta))
+        # NOTE: the file is opened before pruning, so it stays readable even
+        # if it is evicted right away
+        blob = self._open_blob(meta, mode)
+        self._prune()
+        return blob
+
+    def _prune(self):
+        with self._lock:
+            blobs = []
+            for name in os.listdir(self._blobs_dir):
+                if name.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(self._blob_path(name))
+                except OSError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, name))
+            size = sum(blob[1] for blob in blobs)
+            evicted = set()
+            for mtime, blob_size, name in sorted(blobs):
+                if size <= self.max_size:
+                    break
+                try:
+                    os.unlink(self._blob_path(name))
+                except OSError:
+                    continue
+                size -= blob_size
+                evicted.add(name)
+            if evicted:
+                self._remove_index_entries(evicted)
+
+    def _remove_index_entries(self, digests):
+        """Remove index entries of urls stored in evicted blobs."""
+        for name in os.listdir(self._index_dir):
+            path = os.path.join(self._index_dir, name)
+            try:
+                with open(path, 'rb') as index_file:
+                    meta = jsonutils.loads(index_file.read())
+            except (IOError, OSError, ValueError):
+                continue
+            if meta.get('sha256') in digests:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class AuthCache(object):
+    """Keystone discovery results and tokens shared between CLI runs.
+
+    Tokens are stored together with their service catalog, so endpoints
+    are resolved without contacting keystone until the token is about to
+    expire or is invalidated, e.g. after it was rejected with 401.
+    Entries contain credentials, so the cache directory and files are
+    only accessible by their owner.
+
+    :param cache_dir: directory to keep the cache in, created if missing
+    :param discovery_ttl: seconds to reuse discovered identity API versions
+    :raises ValueError: if an existing cache_dir is accessible by other
+                        users
+    """
+
+    def __init__(self, cache_dir, discovery_ttl=DEFAULT_DISCOVERY_TTL):
+        self.cache_dir = cache_dir
+        self.discovery_ttl = discovery_ttl
+        _private_makedirs(cache_dir)
+        # NOTE: the directory may be supplied by the user, its permissions
+        # are checked rather than changed
+        dir_stat = os.stat(cache_dir)
+        if (stat.S_IMODE(dir_stat.st_mode) & 0o077 or
+                (hasattr(os, 'getuid') and dir_stat.st_uid != os.getuid())):
+            raise ValueError("Directory {0} is accessible by other users, "
+                             "tokens are not cached in it".format(cache_dir))
+
+    @staticmethod
+    def make_key(*parts):
+        """Key of a token issued for given auth url, credentials and scope.
+
+        Like keystoneauth cache ids the key covers secrets too, so a
+        token is never handed out for different credentials.
+        """
+        key = hashlib.sha256()
+        for part in parts:
+            key.update(encodeutils.safe_encode(part or '') + b'\0')
+        return key.hexdigest()
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, '{0}-{1}'.format(kind, key))
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return jsonutils.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, path, data):
+        # NOTE: NamedTemporaryFile is created with 0600 permissions
+        tmp = tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix='.',
+                                          delete=False)
+        try:
+            with tmp:
+                tmp.write(jsonutils.dump_as_bytes(data))
+            os.rename(tmp.name, path)
+        except (IOError, OSError) as e:
+            LOG.debug("Could not store {0}: {1}".format(path, e))
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def get_discovery(self, auth_url):
+        """Return cached (v2_auth_url, v3_auth_url) of auth_url or None."""
+        path = self._path('discovery', self.make_key(auth_url))
+        entry = self._read(path)
+        if not entry:
+            return None
+        if time.time() - entry.get('time', 0) > self.discovery_ttl:
+            self._remove(path)
+            return None
+        return tuple(entry['versions'])
+
+    def set_discovery(self, auth_url, versions):
+        self._write(self._path('discovery', self.make_key(auth_url)),
+                    {'time': time.time(), 'versions': list(versions)})
+
+    def get_auth_ref(self, key):
+        """Return cached keystoneclient AccessInfo or None.
+
+        Tokens which expire soon are not returned, so that keystone is
+        asked for a new one before requests start to fail.
+        """
+        path = self._path('token', key)
+        entry = self._read(path)
+        if not entry:
+            return None
+        access = importutils.import_module('keystoneclient.access')
+        try:
+            auth_ref = access.AccessInfo.factory(
+                body=entry['body'], auth_token=entry['auth_token'])
+            expired = auth_ref.will_expire_soon()
+        except Exception as e:
+            LOG.debug("Ignoring invalid cached token {0}: {1}".format(
+                path, e))
+            expired = True
+        if expired:
+            self._remove(path)
+            return None
+        return auth_ref
+
+    def set_auth_ref(self, key, auth_ref):
+        root = 'token' if auth_ref.version == 'v3' else 'access'
+        self._write(self._path('token', key),
+                    {'auth_token': auth_ref.auth_token,
+                     'body': {root: dict(auth_ref)}})
+
+    def invalidate(self, key):
+        """Forget a token, e.g. after it was rejected."""
+        self._remove(self._path('token', key))
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            self._remove(os.path.join(self.cache_dir, name))
@@ -36,6 +36,14 @@ class CommunicationError(BaseException):
     """Unable to communicate with server."""
 
 
+class DownloadError(BaseException):
+    """Downloaded data is incomplete or corrupted."""
+
+
+class WaitTimeout(BaseException):
+    """Timed out waiting for an operation to finish."""
+
+
 class ClientException(Exception):
     """DEPRECATED!"""
 
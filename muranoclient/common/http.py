@@ -14,25 +14,36 @@
 #    under the License.
 
 import copy
-import hashlib
 import os
 import socket
+import threading
+import time
 
 import keystoneclient.adapter as keystone_adapter
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
-from oslo_utils import encodeutils
 import requests
-import six
 from six.moves import urllib
 
 from muranoclient.common import exceptions as exc
+from muranoclient.common import jsonstream
+from muranoclient.common import tracing
 from muranoclient.i18n import _LW
 
 LOG = logging.getLogger(__name__)
 USER_AGENT = 'python-muranoclient'
 CHUNKSIZE = 1024 * 64  # 64kB
 
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_POOL_IDLE_TIMEOUT = 60
+POOL_OPTIONS = ('pool_connections', 'pool_maxsize', 'pool_idle_timeout')
+
+DEFAULT_TRACER = tracing.Tracer([tracing.LogSink(LOG)])
+
+_pooled_adapters = {}
+_pooled_adapters_lock = threading.Lock()
+
 
 def get_system_ca_file():
     """Return path to system default CA file."""
@@ -52,10 +63,118 @@ def get_system_ca_file():
     LOG.warning(_LW("System ca file could not be found."))
 
 
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter keeping keep-alive connections between requests.
+
+    :param pool_connections: number of per-host connection pools to keep
+    :param pool_maxsize: maximum number of connections kept per host
+    :param idle_timeout: seconds after which idle connections are dropped,
+                         None keeps them until the server closes them
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._last_used = None
+        self._retired_requests = 0
+        self._retired_connections = 0
+        super(PooledHTTPAdapter, self).__init__(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            now = time.time()
+            if (self.idle_timeout is not None and
+                    self._last_used is not None and
+                    now - self._last_used > self.idle_timeout):
+                LOG.debug("Connection pool idle for more than %s seconds, "
+                          "dropping kept-alive connections", self.idle_timeout)
+                self._retire_pools()
+            self._last_used = now
+        return super(PooledHTTPAdapter, self).send(request, **kwargs)
+
+    def _connection_pools(self):
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                yield pool
+
+    def _retire_pools(self):
+        for pool in self._connection_pools():
+            self._retired_requests += pool.num_requests
+            self._retired_connections += pool.num_connections
+        self.poolmanager.clear()
+
+    def stats(self):
+        """Return usage statistics of the pool.
+
+        ``requests`` is the number of requests sent, ``connections`` the
+        number of connections opened to serve them, ``reuse_ratio`` the
+        share of requests served over an already open connection and
+        ``open_connections`` the number of connections currently kept alive.
+        """
+        with self._lock:
+            num_requests = self._retired_requests
+            num_connections = self._retired_connections
+            open_connections = 0
+            pools = 0
+            for pool in self._connection_pools():
+                pools += 1
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+                open_connections += sum(
+                    1 for conn in list(pool.pool.queue)
+                    if conn is not None and
+                    getattr(conn, 'sock', None) is not None)
+        reused = max(num_requests - num_connections, 0)
+        return {
+            'pools': pools,
+            'requests': num_requests,
+            'connections': num_connections,
+            'reused': reused,
+            'reuse_ratio': float(reused) / num_requests if num_requests else 0,
+            'open_connections': open_connections,
+        }
+
+
+def get_pooled_adapter(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                       pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                       pool_idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+    """Return connection pool shared by all clients with same settings."""
+    key = (pool_connections, pool_maxsize, pool_idle_timeout)
+    with _pooled_adapters_lock:
+        adapter = _pooled_adapters.get(key)
+        if adapter is None:
+            adapter = PooledHTTPAdapter(pool_connections=pool_connections,
+                                        pool_maxsize=pool_maxsize,
+                                        idle_timeout=pool_idle_timeout)
+            _pooled_adapters[key] = adapter
+    return adapter
+
+
+def pop_pool_options(kwargs):
+    """Remove connection pool options from kwargs and return them."""
+    return dict((name, kwargs.pop(name)) for name in POOL_OPTIONS
+                if kwargs.get(name) is not None)
+
+
+def mount_pooled_adapter(session, adapter):
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class HTTPClient(object):
 
     def __init__(self, endpoint, **kwargs):
         self.endpoint = endpoint
+        self.adapter = get_pooled_adapter(**pop_pool_options(kwargs))
+        self.session = mount_pooled_adapter(requests.Session(), self.adapter)
+        self.cache = kwargs.get('cache')
+        self.tracer = kwargs.get('tracer') or DEFAULT_TRACER
         self.auth_url = kwargs.get('auth_url')
         self.auth_token = kwargs.get('token')
         self.username = kwargs.get('username')
@@ -83,63 +202,27 @@ class HTTPClient(object):
                 self.verify_cert = kwargs.get('cacert', get_system_ca_file())
 
     def _safe_header(self, name, value):
-        if name in ['X-Auth-Token', 'X-Subject-Token']:
-            # because in python3 byte string handling is ... ug
-            v = value.encode('utf-8')
-            h = hashlib.sha1(v)
-            d = h.hexdigest()
-            return encodeutils.safe_decode(name), "{SHA1}%s" % d
-        else:
-            return (encodeutils.safe_decode(name),
-                    encodeutils.safe_decode(value))
+        return tracing.safe_header(name, value)
 
     def log_curl_request(self, url, method, kwargs):
-        curl = ['curl -i -X %s' % method]
-
-        for (key, value) in kwargs['headers'].items():
-            header = '-H \'%s: %s\'' % self._safe_header(key, value)
-            curl.append(header)
-
-        conn_params_fmt = [
-            ('key_file', '--key %s'),
-            ('cert_file', '--cert %s'),
-            ('cacert', '--cacert %s'),
-        ]
-        for (key, fmt) in conn_params_fmt:
-            value = self.ssl_connection_params.get(key)
-            if value:
-                curl.append(fmt % value)
-
-        if self.ssl_connection_params.get('insecure'):
-            curl.append('-k')
-
-        if 'data' in kwargs:
-            curl.append('-d \'%s\'' % kwargs['data'])
-
-        curl.append('%s%s' % (self.endpoint, url))
-        LOG.debug(' '.join(curl))
+        sink = tracing.LogSink(LOG)
+        if sink.enabled():
+            sink.request(tracing.Trace(method, self.endpoint + url,
+                                       kwargs['headers'], kwargs.get('data'),
+                                       self.ssl_connection_params))
 
     @staticmethod
     def log_http_response(resp):
-        status = (resp.raw.version / 10.0, resp.status_code, resp.reason)
-        dump = ['\nHTTP/%.1f %s %s' % status]
-        dump.extend(['%s: %s' % (k, v) for k, v in resp.headers.items()])
-        dump.append('')
-        if resp.content:
-            content = resp.content
-            if isinstance(content, six.binary_type):
-                try:
-                    content = encodeutils.safe_decode(resp.content)
-                except UnicodeDecodeError:
-                    pass
-                else:
-                    dump.extend([content, ''])
-        LOG.debug('\n'.join(dump))
+        sink = tracing.LogSink(LOG)
+        if sink.enabled():
+            trace = tracing.Trace(None, None, {})
+            trace.set_response(resp)
+            sink.response(trace)
 
     def request(self, url, method, log=True, **kwargs):
         """Send an http request with the specified characteristics.
 
-        Wrapper around requests.request to handle tasks such
+        Wrapper around requests.Session.request to handle tasks such
         as setting headers and error handling.
         """
         _set_data(kwargs)
@@ -156,7 +239,16 @@ class HTTPClient(object):
         if self.region_name:
             kwargs['headers'].setdefault('X-Region-Name', self.region_name)
 
-        self.log_curl_request(url, method, kwargs)
+        cache_key = None
+        if self.cache is not None and _is_cacheable(method, kwargs):
+            cache_key = self.cache.make_key(self.endpoint_url + url,
+                                            headers=kwargs['headers'])
+            entry, validators = self.cache.validators(cache_key)
+            kwargs['headers'].update(validators)
+
+        trace = self.tracer.start(method, self.endpoint + url,
+                                  kwargs['headers'], kwargs.get('data'),
+                                  self.ssl_connection_params)
 
         if self.cert_file and self.key_file:
             kwargs['cert'] = (self.cert_file, self.key_file)
@@ -181,7 +273,7 @@ class HTTPClient(object):
         allow_redirects = False
 
         try:
-            resp = requests.request(
+            resp = self.session.request(
                 method,
                 self.endpoint_url + url,
                 allow_redirects=allow_redirects,
@@ -198,8 +290,10 @@ class HTTPClient(object):
                        {'endpoint': endpoint, 'e': e})
             raise exc.CommunicationError(message=message)
 
-        if log:
-            self.log_http_response(resp)
+        self.tracer.finish(trace, resp, with_body=log)
+
+        if cache_key is not None:
+            resp = self.cache.update(cache_key, entry, resp)
 
         if 'X-Auth-Key' not in kwargs['headers'] and \
                 (resp.status_code == 401 or
@@ -222,6 +316,9 @@ class HTTPClient(object):
 
         return resp
 
+    def pool_stats(self):
+        return self.adapter.stats()
+
     def strip_endpoint(self, location):
         if location is None:
             message = "Location not returned with 302"
@@ -264,6 +361,19 @@ class HTTPClient(object):
 
         return resp, body
 
+    def json_stream_request(self, url, method, response_key=None,
+                            **kwargs):
+        """Send a request and decode the JSON array of the response lazily.
+
+        :param response_key: key of the array in the response object, the
+                             response is an array if not given
+        :returns: (response, iterator over items of the array)
+        """
+        kwargs.setdefault('headers', {})
+        kwargs['headers'].setdefault('Content-Type', 'application/json')
+        resp = self.request(url, method, stream=True, **kwargs)
+        return resp, _iter_json(resp, response_key)
+
     def json_patch_request(self, url, method='PATCH', **kwargs):
         content_type = 'application/murano-packages-json-patch'
         return self.json_request(
@@ -297,13 +407,46 @@ class SessionClient(keystone_adapter.Adapter):
     adapter.
     """
 
+    def __init__(self, *args, **kwargs):
+        self.cache = kwargs.pop('cache', None)
+        # NOTE: keystone session logs requests on its own, so only trace
+        # them if a tracer was passed explicitly.
+        self.tracer = kwargs.pop('tracer', None)
+        super(SessionClient, self).__init__(*args, **kwargs)
+
+    def _cache_scope(self):
+        try:
+            return (self.get_user_id(), self.get_project_id(),
+                    self.region_name, self.endpoint_override)
+        except Exception as e:
+            LOG.debug("Could not determine cache scope: {0}".format(e))
+            return None
+
     def request(self, url, method, **kwargs):
         raise_exc = kwargs.pop('raise_exc', True)
         _set_data(kwargs)
+
+        cache_key = None
+        if self.cache is not None and _is_cacheable(method, kwargs):
+            scope = self._cache_scope()
+            if scope is not None:
+                headers = kwargs.setdefault('headers', {})
+                cache_key = self.cache.make_key(url, scope, headers)
+                entry, validators = self.cache.validators(cache_key)
+                headers.update(validators)
+
+        trace = None
+        if self.tracer is not None:
+            trace = self.tracer.start(method, url, kwargs.get('headers', {}),
+                                      kwargs.get('data'))
         resp = super(SessionClient, self).request(url,
                                                   method,
                                                   raise_exc=False,
                                                   **kwargs)
+        if trace is not None:
+            self.tracer.finish(trace, resp)
+        if cache_key is not None:
+            resp = self.cache.update(cache_key, entry, resp)
 
         if raise_exc and resp.status_code >= 400:
             LOG.trace("Error communicating with {url}: {exc}"
@@ -334,18 +477,59 @@ class SessionClient(keystone_adapter.Adapter):
 
         return resp, body
 
+    def json_stream_request(self, url, method, response_key=None,
+                            **kwargs):
+        """Send a request and decode the JSON array of the response lazily.
+
+        :param response_key: key of the array in the response object, the
+                             response is an array if not given
+        :returns: (response, iterator over items of the array)
+        """
+        headers = kwargs.setdefault('headers', {})
+        headers['Content-Type'] = 'application/json'
+        resp = self.request(url, method, stream=True, **kwargs)
+        return resp, _iter_json(resp, response_key)
+
     def json_patch_request(self, url, method='PATCH', **kwargs):
         content_type = 'application/murano-packages-json-patch'
         return self.json_request(
             url, method, content_type=content_type, **kwargs)
 
 
+def _iter_json(resp, response_key):
+    """Yield items of the JSON array of a streamed response."""
+    try:
+        if 'application/json' not in resp.headers.get('content-type', ''):
+            # NOTE: decode a body without the JSON content type as a whole,
+            # so that it is not mistaken for an empty array. A body which
+            # is not JSON raises ValueError.
+            if not resp.content:
+                return
+            body = resp.json()
+            if response_key is not None:
+                body = body.get(response_key)
+            for item in body or []:
+                yield item
+            return
+        chunks = resp.iter_content(jsonstream.CHUNK_SIZE)
+        for item in jsonstream.iter_items(chunks, response_key):
+            yield item
+    finally:
+        resp.close()
+
+
 def _construct_http_client(*args, **kwargs):
     session = kwargs.pop('session', None)
     auth = kwargs.pop('auth', None)
     endpoint = next(iter(args), None)
 
     if session:
+        pool_options = pop_pool_options(kwargs)
+        if pool_options and hasattr(session, 'session'):
+            # NOTE: keystone sessions keep connections alive on their own,
+            # only replace their pool if asked to do so explicitly.
+            mount_pooled_adapter(session.session,
+                                 get_pooled_adapter(**pool_options))
         service_type = kwargs.pop('service_type', None)
         endpoint_type = kwargs.pop('endpoint_type', None)
         region_name = kwargs.pop('region_name', None)
@@ -366,6 +550,10 @@ def _construct_http_client(*args, **kwargs):
         return HTTPClient(*args, **kwargs)
 
 
+def _is_cacheable(method, kwargs):
+    return method == 'GET' and not kwargs.get('stream')
+
+
 def _set_data(kwargs):
     if 'body' in kwargs:
         if 'data' in kwargs:
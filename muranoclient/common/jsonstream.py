@@ -0,0 +1,157 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Incremental decoding of JSON arrays from a stream of chunks.
+"""
+
+import codecs
+import json
+
+import six
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+# characters which may continue a number after a valid prefix of it
+_NUMBER_CHARS = '0123456789+-.eE'
+_NUMBER_TYPES = six.integer_types + (float,)
+
+
+class _Reader(object):
+    """Text buffer filled from chunks of UTF-8 encoded bytes on demand."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = u''
+        self.pos = 0
+        self.exhausted = False
+
+    def _fill(self, size):
+        """Read chunks until the buffer has size characters or more."""
+        # NOTE: drop the consumed part, so that only the unparsed data is
+        # kept in memory
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while length < size and not self.exhausted:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                chunk = b''
+                self.exhausted = True
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode('utf-8')
+            text = self.decoder.decode(chunk, final=self.exhausted)
+            parts.append(text)
+            length += len(text)
+        self.buffer = u''.join(parts)
+
+    def peek(self):
+        """Return the next non-whitespace character or None at the end."""
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in _WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.exhausted:
+                return None
+            self._fill(1)
+
+    def expect(self, chars):
+        char = self.peek()
+        if char is None or char not in chars:
+            raise ValueError("Expected one of {0!r}, got {1!r}".format(
+                chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer,
+                                                          self.pos)
+            except ValueError:
+                if self.exhausted:
+                    raise
+            else:
+                # NOTE: a number cut by the end of the buffer may continue
+                # in the next chunk, e.g. "1." or "1e" decode as 1, so it
+                # is complete only when followed by a delimiter. Other
+                # values end with a delimiter of their own.
+                if (self.exhausted or
+                        not isinstance(value, _NUMBER_TYPES) or
+                        (end < len(self.buffer) and
+                         self.buffer[end] not in _NUMBER_CHARS)):
+                    self.pos = end
+                    return value
+            # grow the buffer geometrically, so that a value spanning many
+            # chunks is decoded a logarithmic number of times
+            self._fill(2 * (len(self.buffer) - self.pos) + 1)
+
+
+def _iter_array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_items(chunks, key=None):
+    """Yield items of a JSON array as they are decoded from chunks.
+
+    Only the item being decoded is kept in memory, not the whole
+    document.
+
+    :param chunks: iterable of bytes of a JSON document
+    :param key: if given, the document is an object and items of the
+                array under this key are yielded, otherwise the document
+                is an array. Nothing is yielded if the key is missing or
+                null.
+    :raises ValueError: if the document is not valid JSON
+    """
+    reader = _Reader(chunks)
+    if key is None:
+        for item in _iter_array(reader):
+            yield item
+        return
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key:
+            if reader.peek() == '[':
+                for item in _iter_array(reader):
+                    yield item
+            else:
+                for item in reader.value() or []:
+                    yield item
+            # NOTE: the rest of the document is not needed
+            return
+        # other values are skipped as a whole
+        reader.value()
+        if reader.expect(',}') == '}':
+            return
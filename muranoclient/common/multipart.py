@@ -0,0 +1,165 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Streaming multipart/form-data encoder for uploads.
+"""
+
+import collections
+import os
+import time
+import uuid
+
+from oslo_log import log as logging
+from oslo_utils import encodeutils
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 64  # 64kB
+
+
+def _file_size(fileobj):
+    """Return number of bytes left in a file object or None."""
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - position
+        fileobj.seek(position)
+        return size
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+
+class MultipartEncoder(object):
+    """File-like multipart/form-data body read from its parts on demand.
+
+    Requests streams file-like bodies with a known length, so files are
+    read in chunks while the body is being sent instead of being copied
+    into a single in-memory body first.
+
+    :param fields: dict of form field names to string values
+    :param files: dict of form field names to file objects or
+                  ``(filename, fileobj)`` tuples
+    :param chunk_size: size of chunks produced by iteration
+    :param callback: called with ``(bytes_read, total_bytes)`` after each
+                     read
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, callback=None):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.callback = callback
+        self.bytes_read = 0
+        self.started = None
+        self.finished = None
+        self._parts = collections.deque()
+        self.len = 0
+
+        for name, value in six.iteritems(fields or {}):
+            self._add(self._header(name) + b'\r\n')
+            self._add(encodeutils.safe_encode(value) + b'\r\n')
+        for name, value in six.iteritems(files or {}):
+            if isinstance(value, (tuple, list)):
+                filename, fileobj = value[:2]
+            else:
+                filename = os.path.basename(getattr(value, 'name', '') or '')
+                fileobj = value
+            self._add(self._header(name, filename or name) + b'\r\n')
+            self._add_file(fileobj)
+            self._add(b'\r\n')
+        self._add(encodeutils.safe_encode(
+            '--{0}--\r\n'.format(self.boundary)))
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={0}'.format(self.boundary)
+
+    def _header(self, name, filename=None):
+        disposition = 'form-data; name="{0}"'.format(name)
+        if filename is not None:
+            disposition += '; filename="{0}"'.format(filename)
+        return encodeutils.safe_encode(
+            '--{0}\r\nContent-Disposition: {1}\r\n'.format(
+                self.boundary, disposition))
+
+    def _add(self, data):
+        self._parts.append(data)
+        self.len += len(data)
+
+    def _add_file(self, fileobj):
+        size = _file_size(fileobj)
+        if size is None:
+            # NOTE: length of a non seekable stream can only be learned by
+            # reading it
+            self._add(fileobj.read())
+            return
+        self._parts.append(fileobj)
+        self.len += size
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if self.started is None:
+            self.started = time.time()
+        if size is None or size < 0:
+            size = self.len - self.bytes_read
+        chunks = []
+        left = size
+        while left > 0 and self._parts:
+            part = self._parts[0]
+            if isinstance(part, six.binary_type):
+                chunk = part[:left]
+                if len(chunk) < len(part):
+                    self._parts[0] = part[left:]
+                else:
+                    self._parts.popleft()
+            else:
+                chunk = encodeutils.safe_encode(part.read(left))
+                if len(chunk) < left:
+                    self._parts.popleft()
+            chunks.append(chunk)
+            left -= len(chunk)
+        data = b''.join(chunks)
+        self.bytes_read += len(data)
+        if self.callback is not None:
+            self.callback(self.bytes_read, self.len)
+        if not self._parts and self.finished is None:
+            self.finished = time.time()
+            LOG.debug("Uploaded {0} bytes in {1:.2f}s ({2:.1f} kB/s)".format(
+                self.bytes_read, self.elapsed, self.throughput / 1024.0))
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @property
+    def elapsed(self):
+        """Seconds spent on sending the body so far."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        """Average upload speed in bytes per second."""
+        elapsed = self.elapsed
+        return self.bytes_read / elapsed if elapsed else 0.0
+
+    def __repr__(self):
+        return '<MultipartEncoder {0} bytes>'.format(self.len)
@@ -0,0 +1,209 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Tracing of HTTP requests sent by murano clients.
+
+A Tracer hands request/response traces to a list of sinks. Nothing is
+formatted, hashed or read from a response unless at least one sink is
+enabled and the request was sampled.
+"""
+
+import hashlib
+import logging as std_logging
+import random
+import time
+
+from oslo_log import log as logging
+from oslo_utils import encodeutils
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_BODY_BYTES = 4096
+SENSITIVE_HEADERS = ('X-Auth-Token', 'X-Subject-Token', 'X-Auth-Key')
+STREAMED_BODY = '<streamed body>'
+
+
+def safe_header(name, value):
+    """Return header with credentials replaced by their SHA1 digest."""
+    if name in SENSITIVE_HEADERS:
+        # because in python3 byte string handling is ... ug
+        v = encodeutils.safe_encode(value)
+        d = hashlib.sha1(v).hexdigest()
+        return encodeutils.safe_decode(name), "{SHA1}%s" % d
+    else:
+        return (encodeutils.safe_decode(name),
+                encodeutils.safe_decode(value))
+
+
+def capture_body(body, max_bytes):
+    """Return at most max_bytes of a body suitable for a trace.
+
+    File objects and iterators are never read, so a traced upload or
+    download is sent exactly as it would be without tracing.
+    """
+    if body is None:
+        return None
+    if not isinstance(body, (six.binary_type, six.text_type)):
+        return STREAMED_BODY
+    truncated = len(body) > max_bytes
+    body = body[:max_bytes]
+    if isinstance(body, six.binary_type):
+        body = _decode_prefix(body, truncated)
+        if body is None:
+            return '<binary body>'
+    if truncated:
+        body += '... (truncated)'
+    return body
+
+
+def _decode_prefix(data, truncated):
+    """Decode text data, possibly cut inside a multi-byte character."""
+    # NOTE: a UTF-8 character is at most 4 bytes long, so at most 3 bytes
+    # of an incomplete one are dropped from the end of a truncated body
+    for cut in range(4 if truncated else 1):
+        try:
+            return encodeutils.safe_decode(data[:len(data) - cut])
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def response_body(resp, max_bytes):
+    """Return captured body of a response without consuming streams."""
+    # NOTE: requests keeps _content False until a streamed body is read
+    content = getattr(resp, '_content', None)
+    if content is False:
+        return STREAMED_BODY
+    if content is None:
+        content = getattr(resp, 'content', None)
+    return capture_body(content or None, max_bytes)
+
+
+class Trace(object):
+    """Request (and later response) data handed to sinks."""
+
+    def __init__(self, method, url, headers, body=None, ssl_params=None,
+                 max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+        self.method = method
+        self.url = url
+        self.headers = [safe_header(k, v) for k, v in six.iteritems(headers)]
+        self.body = capture_body(body, max_body_bytes)
+        self.ssl_params = ssl_params or {}
+        self.max_body_bytes = max_body_bytes
+        self.started = time.time()
+        self.elapsed = None
+        self.status_code = None
+        self.reason = None
+        self.http_version = None
+        self.response_headers = None
+        self.response_body = None
+        self.sinks = []
+
+    def set_response(self, resp, capture=True):
+        self.elapsed = time.time() - self.started
+        self.status_code = resp.status_code
+        self.reason = resp.reason
+        self.http_version = getattr(resp.raw, 'version', 11) / 10.0
+        self.response_headers = list(resp.headers.items())
+        if capture:
+            self.response_body = response_body(resp, self.max_body_bytes)
+
+    def format_request(self):
+        curl = ['curl -i -X %s' % self.method]
+        for header in self.headers:
+            curl.append('-H \'%s: %s\'' % header)
+
+        conn_params_fmt = [
+            ('key_file', '--key %s'),
+            ('cert_file', '--cert %s'),
+            ('cacert', '--cacert %s'),
+        ]
+        for (key, fmt) in conn_params_fmt:
+            value = self.ssl_params.get(key)
+            if value:
+                curl.append(fmt % value)
+
+        if self.ssl_params.get('insecure'):
+            curl.append('-k')
+
+        if self.body is not None:
+            curl.append('-d \'%s\'' % self.body)
+
+        curl.append(self.url)
+        return ' '.join(curl)
+
+    def format_response(self):
+        status = (self.http_version, self.status_code, self.reason)
+        dump = ['\nHTTP/%.1f %s %s' % status]
+        dump.extend(['%s: %s' % (k, v) for k, v in self.response_headers])
+        dump.append('')
+        if self.response_body:
+            dump.extend([self.response_body, ''])
+        return '\n'.join(dump)
+
+
+class LogSink(object):
+    """Sink writing traces to a logger at DEBUG level."""
+
+    def __init__(self, logger=None):
+        self.logger = logger or LOG
+
+    def enabled(self):
+        return self.logger.isEnabledFor(std_logging.DEBUG)
+
+    def request(self, trace):
+        self.logger.debug(trace.format_request())
+
+    def response(self, trace):
+        self.logger.debug(trace.format_response())
+
+
+class Tracer(object):
+    """Hands sampled request traces to enabled sinks.
+
+    :param sinks: objects with ``enabled()``, ``request(trace)`` and
+                  ``response(trace)`` methods
+    :param sample_rate: share of requests to trace, from 0 to 1
+    :param max_body_bytes: maximum size of a captured request/response body
+    """
+
+    def __init__(self, sinks=None, sample_rate=1.0,
+                 max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+        self.sinks = list(sinks or [])
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def start(self, method, url, headers, body=None, ssl_params=None):
+        """Start tracing a request, returns None if it is not traced."""
+        sinks = [sink for sink in self.sinks if sink.enabled()]
+        if not sinks:
+            return None
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        trace = Trace(method, url, headers, body, ssl_params,
+                      max_body_bytes=self.max_body_bytes)
+        trace.sinks = sinks
+        for sink in sinks:
+            sink.request(trace)
+        return trace
+
+    def finish(self, trace, resp, with_body=True):
+        if trace is None:
+            return
+        trace.set_response(resp, capture=with_body)
+        for sink in trace.sinks:
+            sink.response(trace)
@@ -16,16 +16,20 @@
 from __future__ import print_function
 
 import collections
+import contextlib
+import hashlib
+import io
 import json
-from muranopkgcheck import manager as check_manager
-from muranopkgcheck import pkg_loader as check_pkg_loader
-from muranopkgcheck import validators as check_validators
+from multiprocessing import pool as mp_pool
 import os
+import random
 import re
 import shutil
 import sys
 import tempfile
 import textwrap
+import threading
+import time
 import uuid
 import warnings
 import zipfile
@@ -34,27 +38,34 @@ from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
 from oslo_utils import importutils
+from pbr import version as pbr_version
 import prettytable
 import requests
 import six
 from six.moves import urllib
 import yaml
-import yaql
 
+from muranoclient.apiclient import exceptions as apiclient_exceptions
+from muranoclient.common import base
+from muranoclient.common import cache
 from muranoclient.common import exceptions
+from muranoclient.common.yaqlexpression import YaqlExpression
 from muranoclient.i18n import _
 from muranoclient.i18n import _LW
 
-try:
-    import yaql.language  # noqa
 
-    from muranoclient.common.yaqlexpression import YaqlExpression
-except ImportError:
-    # no yaql.language means legacy yaql
-    from muranoclient.common.yaqlexpression_legacy import YaqlExpression
+LOG = logging.getLogger(__name__)
 
+DEPENDENCY_WORKERS = 8
+BULK_CONCURRENCY = 8
+POLL_INTERVAL = 1  # seconds
+POLL_MAX_INTERVAL = 30  # seconds
+DIR_ARCHIVE_CACHE_SIZE = 32
+DIR_ARCHIVE_MEMORY_LIMIT = 1024 * 1024  # 1MB
 
-LOG = logging.getLogger(__name__)
+_dir_archives = cache.LRUCache(DIR_ARCHIVE_CACHE_SIZE)
+_pkg_check_version = None
+_opened_zip_loader_class = None
 
 
 # Decorator for cli-args
@@ -204,6 +215,136 @@ def exception_to_str(exc):
     return encodeutils.safe_encode(error, errors='ignore')
 
 
+_PREFETCH_DONE = object()
+_PREFETCH_ERROR = object()
+
+
+def prefetch(iterable, lookahead=1):
+    """Iterate over iterable, producing up to lookahead items in advance.
+
+    Items are produced by a background thread, so that slow producers,
+    e.g. requests of consecutive pages of an API listing, overlap with
+    processing of the items already produced. Exceptions are re-raised
+    in the consumer. The thread stops when the returned generator is
+    exhausted or closed.
+    """
+    if lookahead < 1:
+        for item in iterable:
+            yield item
+        return
+
+    items = six.moves.queue.Queue()
+    # NOTE: one slot for the item being consumed and one per item ahead
+    slots = threading.Semaphore(lookahead + 1)
+    stopped = threading.Event()
+
+    def produce():
+        iterator = iter(iterable)
+        while True:
+            slots.acquire()
+            if stopped.is_set():
+                return
+            try:
+                item = next(iterator)
+            except StopIteration:
+                items.put((_PREFETCH_DONE, None))
+                return
+            except Exception:
+                items.put((_PREFETCH_ERROR, sys.exc_info()))
+                return
+            items.put((None, item))
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            kind, item = items.get()
+            if kind is _PREFETCH_DONE:
+                return
+            if kind is _PREFETCH_ERROR:
+                six.reraise(*item)
+            yield item
+            slots.release()
+    finally:
+        stopped.set()
+        slots.release()
+
+
+# errors of missing resources raised by HTTP client and by managers
+_NOT_FOUND = (exceptions.NotFound, apiclient_exceptions.NotFound)
+
+
+def bulk_delete(delete, ids, name, plural, find=None,
+                concurrency=BULK_CONCURRENCY):
+    """Delete resources concurrently, reporting the result of each one.
+
+    :param delete: callable deleting a resource by its id
+    :param ids: ids of resources, or names or ids if find is given
+    :param name: name of the resource type used in messages
+    :param plural: plural of name used in messages
+    :param find: callable returning the resource for an item of ids,
+                 the resources found are deleted by their ids
+    :returns: list of CallResult of deletion in the order of ids
+    :raises CommandError: if none of the resources was deleted
+    """
+    targets = collections.OrderedDict()
+    errors = {}
+    if find is None:
+        targets.update((item, item) for item in ids)
+    else:
+        for found in base.run_concurrently(find, ids, concurrency):
+            if found.error is None:
+                targets[found.item] = found.result.id
+            else:
+                errors[found.item] = found.error
+    # NOTE: several names may refer to the same resource, delete it once
+    unique = list(collections.OrderedDict.fromkeys(targets.values()))
+    deleted = dict((result.item, result)
+                   for result in base.run_concurrently(delete, unique,
+                                                       concurrency))
+
+    results = []
+    for item in ids:
+        if item in errors:
+            result = base.CallResult(item, None, errors[item])
+        else:
+            result = deleted[targets[item]]._replace(item=item)
+        results.append(result)
+        if result.error is None:
+            print("Deleted {0} '{1}'".format(name, item))
+        elif isinstance(result.error, _NOT_FOUND):
+            print("Failed to delete '{0}'; {1} not found".format(item, name))
+        else:
+            print("Failed to delete '{0}'; {1}".format(
+                item, encodeutils.exception_to_unicode(result.error)))
+
+    failed = sum(1 for result in results if result.error is not None)
+    if failed == len(results):
+        raise apiclient_exceptions.CommandError(
+            "Unable to find and delete any of the specified {0}.".format(
+                plural))
+    if failed:
+        print("Failed to delete {0} of {1} {2}".format(failed, len(results),
+                                                       plural))
+    return results
+
+
+def backoff(initial=POLL_INTERVAL, maximum=POLL_MAX_INTERVAL, factor=2,
+            jitter=0.5):
+    """Yield exponentially growing delays between polls.
+
+    The delays start at ``initial`` and are multiplied by ``factor`` up
+    to ``maximum``. Each one is shortened by a random fraction of up to
+    ``jitter``, so that clients started at the same time do not poll the
+    API in lockstep.
+    """
+    delay = initial
+    while True:
+        yield delay * (1 - random.uniform(0, jitter))
+        delay = min(delay * factor, maximum)
+
+
 class NoCloseProxy(object):
     """A proxy object, that does nothing on close."""
     def __init__(self, obj):
@@ -216,10 +357,89 @@ class NoCloseProxy(object):
         return getattr(self.obj, name)
 
 
+def _tree_fingerprint(path, hash_contents=False):
+    """Return digest and total size of files in a directory tree.
+
+    The digest covers location of the tree and names, sizes and
+    modification times of its files, and also their contents if
+    ``hash_contents`` is set.
+    """
+    digest = hashlib.sha256(encodeutils.safe_encode(os.path.realpath(path)))
+    total_size = 0
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for _file in sorted(files):
+            file_path = os.path.join(root, _file)
+            stat = os.stat(file_path)
+            digest.update(encodeutils.safe_encode(u'\0{0}\0{1}\0{2}'.format(
+                os.path.relpath(file_path, path), stat.st_size,
+                getattr(stat, 'st_mtime_ns', stat.st_mtime))))
+            if hash_contents:
+                with open(file_path, 'rb') as content:
+                    for chunk in iter(lambda: content.read(65536), b''):
+                        digest.update(chunk)
+            total_size += stat.st_size
+    return digest.hexdigest(), total_size
+
+
+def _zip_tree(path, fileobj):
+    archive = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for _file in sorted(files):
+            destination = os.path.relpath(
+                os.path.join(root, _file), os.path.join(path))
+            archive.write(os.path.join(root, _file), destination)
+    archive.close()
+
+
 class File(object):
-    def __init__(self, name, binary=True):
+    """Package or bundle file given by a path, an url or a file object.
+
+    Directories are packed into zip archives, which are cached by
+    fingerprint of the directory tree, so the same unchanged directory is
+    only packed once.
+
+    :param dir_memory_limit: directories with less than this many bytes of
+                             files are packed in memory instead of a
+                             temporary file
+    :param hash_contents: also hash file contents when fingerprinting
+                          directories, instead of relying on file sizes
+                          and modification times only
+
+    Files downloaded from urls are kept in ``File.download_cache`` if it
+    is set to a ``cache.DownloadCache``.
+    """
+
+    download_cache = None
+
+    def __init__(self, name, binary=True,
+                 dir_memory_limit=DIR_ARCHIVE_MEMORY_LIMIT,
+                 hash_contents=False):
         self.name = name
         self.binary = binary
+        self.dir_memory_limit = dir_memory_limit
+        self.hash_contents = hash_contents
+
+    def _open_dir(self, mode):
+        key, size = _tree_fingerprint(self.name, self.hash_contents)
+        archive = _dir_archives.get(key)
+        if archive is None:
+            if size <= self.dir_memory_limit:
+                buf = six.BytesIO()
+                _zip_tree(self.name, buf)
+                archive = buf.getvalue()
+            else:
+                # NOTE: the temporary file is removed once the archive is
+                # evicted from cache and all the files opened from it are
+                # closed
+                archive = tempfile.NamedTemporaryFile()
+                _zip_tree(self.name, archive)
+                archive.flush()
+            _dir_archives.set(key, archive)
+        if isinstance(archive, six.binary_type):
+            return six.BytesIO(archive)
+        return open(archive.name, mode)
 
     def open(self):
         mode = 'rb' if self.binary else 'r'
@@ -232,17 +452,11 @@ class File(object):
             if os.path.isfile(self.name):
                 return open(self.name, mode)
             if os.path.isdir(self.name):
-                tmp = tempfile.NamedTemporaryFile()
-                archive = zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED)
-                for root, dirs, files in os.walk(self.name):
-                    for _file in files:
-                        destination = os.path.relpath(
-                            os.path.join(root, _file), os.path.join(self.name))
-                        archive.write(os.path.join(root, _file), destination)
-                tmp.flush()
-                return open(tmp.name, mode)
+                return self._open_dir(mode)
             url = urllib.parse.urlparse(self.name)
             if url.scheme in ('http', 'https'):
+                if self.download_cache is not None:
+                    return self.download_cache.open(self.name, mode)
                 resp = requests.get(self.name, stream=True)
                 if not resp.ok:
                     raise ValueError("Got non-ok status({0}) "
@@ -256,6 +470,19 @@ class File(object):
             raise ValueError("Can't open {0}".format(self.name))
 
 
+@contextlib.contextmanager
+def open_destination(dst):
+    """Open a path for binary writing, or pass through a file object.
+
+    File objects are not closed on exit, the caller owns them.
+    """
+    if hasattr(dst, 'write'):
+        yield dst
+    else:
+        with open(dst, 'wb') as dst_file:
+            yield dst_file
+
+
 def to_url(filename, base_url, version='', path='/', extension=''):
     if urllib.parse.urlparse(filename).scheme in ('http', 'https'):
         return filename
@@ -304,8 +531,45 @@ class FileWrapperMixin(object):
         self.close()
 
 
+def _opened_zip_loader():
+    """Return package checker loader class of an already opened archive."""
+    global _opened_zip_loader_class
+    if _opened_zip_loader_class is None:
+        check_pkg_loader = importutils.import_module(
+            'muranopkgcheck.pkg_loader')
+
+        class OpenedZipLoader(check_pkg_loader.ZipLoader):
+            """ZipLoader of a ZipFile, instead of a path or file object."""
+
+            def __init__(self, zip_obj):
+                # NOTE: ZipLoader would read the whole archive once again
+                super(check_pkg_loader.ZipLoader, self).__init__(zip_obj)
+                self._zipfile = zip_obj
+
+        _opened_zip_loader_class = OpenedZipLoader
+    return _opened_zip_loader_class
+
+
+def _validator_version():
+    """Version of muranopkgcheck, part of validation cache keys."""
+    global _pkg_check_version
+    if _pkg_check_version is None:
+        try:
+            _pkg_check_version = pbr_version.VersionInfo(
+                'murano-pkg-check').version_string()
+        except Exception:
+            _pkg_check_version = ''
+    return _pkg_check_version
+
+
 class Package(FileWrapperMixin):
-    """Represents murano package contents."""
+    """Represents murano package contents.
+
+    Validation results are kept in ``Package.validation_cache`` by digest
+    of the archive and version of muranopkgcheck.
+    """
+
+    validation_cache = cache.ValidationCache()
 
     @staticmethod
     def from_file(file_obj):
@@ -350,9 +614,36 @@ class Package(FileWrapperMixin):
             extension='.zip')
         )
 
+    def digest(self):
+        """SHA-256 hex digest of the package archive."""
+        if not hasattr(self, '_digest'):
+            digest = hashlib.sha256()
+            self._file.seek(0)
+            for chunk in iter(lambda: self._file.read(65536), b''):
+                digest.update(chunk)
+            self._file.seek(0)
+            self._digest = digest.hexdigest()
+        return self._digest
+
     def validate(self):
-        m = check_manager.Manager(self._file,
-                                  loader=check_pkg_loader.ZipLoader)
+        version = _validator_version()
+        if self.validation_cache is None or not version:
+            return self._validate()
+        key = self.validation_cache.make_key(self.digest(), version)
+        found, errors = self.validation_cache.get(key)
+        if not found:
+            errors = self._validate()
+            self.validation_cache.set(key, errors)
+        return errors
+
+    def _validate(self):
+        # NOTE: muranopkgcheck imports yaql, so it is only loaded when a
+        # package is validated
+        check_manager = importutils.import_module('muranopkgcheck.manager')
+        check_validators = importutils.import_module(
+            'muranopkgcheck.validators')
+        m = check_manager.Manager(self.contents,
+                                  loader=_opened_zip_loader())
         errors = m.validate(
             validators=[check_validators.manifest.ManifestValidator],
             only_errors=True)
@@ -362,9 +653,17 @@ class Package(FileWrapperMixin):
 
     @property
     def contents(self):
-        """Contents of a package."""
-        if not hasattr(self, '_contents'):
+        """Contents of a package.
+
+        The archive is read in place from the package file, members are
+        only decompressed when opened.
+        """
+        if not hasattr(self, '_zip_obj'):
             try:
+                self._file.seek(0)
+                self._zip_obj = zipfile.ZipFile(self._file)
+            except (AttributeError, io.UnsupportedOperation):
+                # NOTE: not seekable streams have to be copied to memory
                 self._file.seek(0)
                 self._zip_obj = zipfile.ZipFile(
                     six.BytesIO(self._file.read()))
@@ -374,13 +673,20 @@ class Package(FileWrapperMixin):
                 raise
         return self._zip_obj
 
+    @property
+    def members(self):
+        """Set of names of files in a package."""
+        if not hasattr(self, '_members'):
+            self._members = frozenset(self.contents.namelist())
+        return self._members
+
     @property
     def manifest(self):
         """Parsed manifest file of a package."""
         if not hasattr(self, '_manifest'):
             try:
-                self._manifest = yaml.safe_load(
-                    self.contents.open('manifest.yaml'))
+                self._manifest = yaml.load(
+                    self.contents.open('manifest.yaml'), SafeLoader)
             except Exception as e:
                 LOG.error("Error {0} occurred, while extracting "
                           "manifest from package".format(e))
@@ -389,13 +695,16 @@ class Package(FileWrapperMixin):
 
     def images(self):
         """Returns a list of required image specifications."""
-        if 'images.lst' not in self.contents.namelist():
-            return []
-        try:
-            return yaml.safe_load(
-                self.contents.open('images.lst')).get('Images', [])
-        except Exception:
-            return []
+        if not hasattr(self, '_images'):
+            self._images = []
+            if 'images.lst' in self.members:
+                try:
+                    self._images = yaml.load(
+                        self.contents.open('images.lst'),
+                        SafeLoader).get('Images', [])
+                except Exception:
+                    pass
+        return self._images
 
     @property
     def resolvers(self):
@@ -411,7 +720,7 @@ class Package(FileWrapperMixin):
             for class_name, class_file in six.iteritems(
                     self.manifest.get('Classes', {})):
                 filename = "Classes/%s" % class_file
-                if filename not in self.contents.namelist():
+                if filename not in self.members:
                     continue
                 klass_list = yaml.load_all(self.contents.open(filename),
                                            DummyYaqlYamlLoader)
@@ -434,7 +743,7 @@ class Package(FileWrapperMixin):
     @property
     def ui(self):
         if not hasattr(self, '_ui'):
-            if 'UI/ui.yaml' in self.contents.namelist():
+            if 'UI/ui.yaml' in self.members:
                 self._ui = self.contents.open('UI/ui.yaml')
             else:
                 self._ui = None
@@ -443,7 +752,7 @@ class Package(FileWrapperMixin):
     @property
     def logo(self):
         if not hasattr(self, '_logo'):
-            if 'logo.png' in self.contents.namelist():
+            if 'logo.png' in self.members:
                 self._logo = self.contents.open('logo.png')
             else:
                 self._logo = None
@@ -500,28 +809,55 @@ class Package(FileWrapperMixin):
             return reversed(result)
         return top_sort_by_components(transposed, order)
 
-    def requirements(self, base_url, path=None, dep_dict=None):
+    def requirements(self, base_url, path=None, dep_dict=None,
+                     workers=DEPENDENCY_WORKERS):
         """Scans Require section of manifests of all the dependencies.
 
         Returns a dict with FQPNs as keys and respective Package objects
-        as values, ordered by topological sort.
+        as values, ordered by topological sort. Dependencies are loaded by
+        a pool of ``workers`` threads as soon as they are discovered; time
+        spent on loading each of them is kept in ``dependency_timings``.
 
         :param base_url: url of packages location
         :param path: local path of packages location
         :param dep_dict: unused. Left for backward compatibility
+        :param workers: maximum number of dependencies loaded concurrently
         """
 
         unordered_requirements = {}
         requirements_graph = collections.defaultdict(list)
-        dep_queue = collections.deque([(self.manifest['FullName'], self)])
-        while dep_queue:
-            dep_name, dep_file = dep_queue.popleft()
-            unordered_requirements[dep_name] = dep_file
-            direct_deps = Package._get_direct_deps(dep_file, base_url, path)
-            for name, file in direct_deps:
-                if name not in unordered_requirements:
-                    dep_queue.append((name, file))
-            requirements_graph[dep_name] = [dep[0] for dep in direct_deps]
+        self.dependency_timings = {}
+        loading = {}
+        pools = []
+
+        def schedule_deps(package):
+            for dep_name, ver in six.iteritems(
+                    package.manifest.get('Require') or {}):
+                if (dep_name, ver) in loading:
+                    continue
+                if not pools:
+                    pools.append(mp_pool.ThreadPool(max(workers, 1)))
+                loading[(dep_name, ver)] = pools[0].apply_async(
+                    Package._load_dependency,
+                    (dep_name, ver, base_url, path))
+
+        try:
+            schedule_deps(self)
+            dep_queue = collections.deque([(self.manifest['FullName'], self)])
+            while dep_queue:
+                dep_name, dep_file = dep_queue.popleft()
+                unordered_requirements[dep_name] = dep_file
+                direct_deps = Package._get_direct_deps(
+                    dep_file, base_url, path, loading=loading,
+                    timings=self.dependency_timings)
+                for name, file in direct_deps:
+                    if name not in unordered_requirements:
+                        dep_queue.append((name, file))
+                        schedule_deps(file)
+                requirements_graph[dep_name] = [dep[0] for dep in direct_deps]
+        finally:
+            for pool in pools:
+                pool.terminate()
 
         ordered_reqs_names = self._get_package_order(requirements_graph)
         ordered_reqs_dict = collections.OrderedDict()
@@ -531,24 +867,51 @@ class Package(FileWrapperMixin):
         return ordered_reqs_dict
 
     @staticmethod
-    def _get_direct_deps(package, base_url, path):
+    def _load_dependency(dep_name, version, base_url, path):
+        """Return (package, error, seconds spent) for a dependency."""
+        started = time.time()
+        try:
+            req_file = Package.from_location(
+                dep_name,
+                version=version,
+                path=path,
+                base_url=base_url,
+            )
+        except Exception as e:
+            return None, e, time.time() - started
+        try:
+            # NOTE: parse manifest in the worker, errors are raised again
+            # when it is accessed by the caller
+            req_file.manifest
+        except Exception:
+            pass
+        return req_file, None, time.time() - started
+
+    @staticmethod
+    def _get_direct_deps(package, base_url, path, loading=None,
+                         timings=None):
         result = []
         if 'Require' in package.manifest:
             for dep_name, ver in six.iteritems(package.manifest['Require']):
-                try:
-                    req_file = Package.from_location(
-                        dep_name,
-                        version=ver,
-                        path=path,
-                        base_url=base_url,
-                    )
-                except Exception as e:
+                if loading is not None and (dep_name, ver) in loading:
+                    req_file, error, elapsed = loading[(dep_name, ver)].get()
+                else:
+                    req_file, error, elapsed = Package._load_dependency(
+                        dep_name, ver, base_url, path)
+                if error is not None:
                     LOG.error("Error {0} occurred while parsing package {1}, "
                               "required by {2} package".format(
-                                  e, dep_name,
+                                  error, dep_name,
                                   package.manifest['FullName']))
                     continue
-                result.append((req_file.manifest['FullName'], req_file))
+                full_name = req_file.manifest['FullName']
+                LOG.debug("Loaded package {0} required by {1} in "
+                          "{2:.2f}s".format(full_name,
+                                            package.manifest['FullName'],
+                                            elapsed))
+                if timings is not None:
+                    timings.setdefault(full_name, elapsed)
+                result.append((full_name, req_file))
         return result
 
 
@@ -711,7 +1074,7 @@ class Bundle(FileWrapperMixin):
             pass
         if bundle is None:
             try:
-                bundle = yaml.safe_load(self._file)
+                bundle = yaml.load(self._file, SafeLoader)
             except yaml.error.YAMLError:
                 pass
 
@@ -746,7 +1109,12 @@ class Bundle(FileWrapperMixin):
             yield pkg_obj
 
 
-class DummyYaqlYamlLoader(yaml.SafeLoader):
+# NOTE: LibYAML based parser is several times faster, tags and implicit
+# resolvers are handled in python by both loaders
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class DummyYaqlYamlLoader(SafeLoader):
     """Constructor that treats !yaql as string."""
     pass
 
@@ -754,12 +1122,12 @@ DummyYaqlYamlLoader.add_constructor(
     u'!yaql', DummyYaqlYamlLoader.yaml_constructors[u'tag:yaml.org,2002:str'])
 
 
-class YaqlYamlLoader(yaml.SafeLoader):
+class YaqlYamlLoader(SafeLoader):
     pass
 
 # workaround for PyYAML bug: http://pyyaml.org/ticket/221
 resolvers = {}
-for k, v in yaml.SafeLoader.yaml_implicit_resolvers.items():
+for k, v in SafeLoader.yaml_implicit_resolvers.items():
     resolvers[k] = v[:]
 YaqlYamlLoader.yaml_implicit_resolvers = resolvers
 
@@ -12,26 +12,71 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import re
+import threading
 
 import six
-import yaql
-from yaql.language import exceptions as yaql_exc
 
+from muranoclient.common import cache
 
-def _set_up_yaql():
-    legacy_engine_options = {
-        'yaql.limitIterators': 10000,
-        'yaql.memoryQuota': 1000000
-    }
-    return yaql.YaqlFactory().create(options=legacy_engine_options)
+LEGACY_ENGINE_OPTIONS = {
+    'yaql.limitIterators': 10000,
+    'yaql.memoryQuota': 1000000
+}
+PARSE_CACHE_SIZE = 4096
 
-YAQL = _set_up_yaql()
+# NOTE: such strings are never treated as expressions. This is the only
+# check before parsing, strings without '$' or '(' like "a-b" or "[1, 2]"
+# are valid expressions too, and YAML scalars like them are loaded as yaql.
+_PLAIN_STRING = re.compile(r'^[\s\w\d.:]*$')
+_NO_VALUE = object()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+class Engine(object):
+    """Parser of the installed yaql version.
+
+    Current yaql (the one with ``yaql.language``) and legacy yaql 0.2 are
+    both supported.
+    """
+
+    def __init__(self):
+        import yaql
+        try:
+            from yaql.language import exceptions as yaql_exc
+        except ImportError:
+            # no yaql.language means legacy yaql
+            self.parse = yaql.parse
+            self.errors = (yaql.exceptions.YaqlGrammarException,
+                           yaql.exceptions.YaqlLexicalException)
+            self.no_value = None
+            self.legacy = True
+        else:
+            self.parse = yaql.YaqlFactory().create(
+                options=LEGACY_ENGINE_OPTIONS)
+            self.errors = (yaql_exc.YaqlGrammarException,
+                           yaql_exc.YaqlLexicalException)
+            self.no_value = yaql.utils.NO_VALUE
+            self.legacy = False
+        self.cache = cache.ParseCache(self.parse, self.errors,
+                                      PARSE_CACHE_SIZE)
+
+
+def get_engine():
+    """Return yaql engine, it is created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = Engine()
+    return _engine
 
 
 class YaqlExpression(object):
     def __init__(self, expression):
         self._expression = str(expression)
-        self._parsed_expression = YAQL(self._expression)
+        self._parsed_expression = get_engine().cache.parse(self._expression)
 
     def expression(self):
         return self._expression
@@ -46,15 +91,16 @@ class YaqlExpression(object):
     def match(expr):
         if not isinstance(expr, six.string_types):
             return False
-        if re.match('^[\s\w\d.:]*$', expr):
-            return False
-        try:
-            YAQL(expr)
-            return True
-        except yaql_exc.YaqlGrammarException:
-            return False
-        except yaql_exc.YaqlLexicalException:
+        if _PLAIN_STRING.match(expr):
             return False
+        return get_engine().cache.is_valid(expr)
+
+    @staticmethod
+    def cache_stats():
+        """Statistics of the cache of parsed expressions."""
+        return get_engine().cache.stats()
 
-    def evaluate(self, data=yaql.utils.NO_VALUE, context=None):
+    def evaluate(self, data=_NO_VALUE, context=None):
+        if data is _NO_VALUE:
+            data = get_engine().no_value
         return self._parsed_expression.evaluate(data=data, context=context)
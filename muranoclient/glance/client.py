@@ -15,6 +15,7 @@
 from glanceclient.common import http
 from glanceclient.common import utils
 
+from muranoclient.common import http as murano_http
 from muranoclient.glance import artifacts
 
 
@@ -26,12 +27,22 @@ class Client(object):
     :param string token: Token for authentication.
     :param integer timeout: Allows customization of the timeout for client
                             http requests. (optional)
+    :param integer pool_connections: Number of per-host connection pools
+                                     shared between clients. (optional)
+    :param integer pool_maxsize: Maximum number of keep-alive connections
+                                 per host. (optional)
+    :param integer pool_idle_timeout: Seconds after which idle keep-alive
+                                      connections are dropped. (optional)
     """
 
     def __init__(self, endpoint, type_name, type_version, **kwargs):
         endpoint, version = utils.strip_version(endpoint)
         self.version = version or '0.1'
+        self.adapter = murano_http.get_pooled_adapter(
+            **murano_http.pop_pool_options(kwargs))
         self.http_client = http.HTTPClient(endpoint, **kwargs)
+        murano_http.mount_pooled_adapter(self.http_client.session,
+                                         self.adapter)
 
         self.type_name = type_name
         self.type_version = type_version
@@ -40,3 +51,6 @@ class Client(object):
                                               self.type_name,
                                               self.type_version,
                                               self.version)
+
+    def pool_stats(self):
+        return self.adapter.stats()
@@ -14,9 +14,9 @@
 
 from osc_lib import utils
 from oslo_log import log as logging
+from oslo_utils import importutils
 
 from muranoclient.apiclient import exceptions as exc
-from muranoclient.glance import client as art_client
 from muranoclient.i18n import _
 
 LOG = logging.getLogger(__name__)
@@ -66,6 +66,7 @@ def make_client(instance):
                     " via either --glare-url or env[GLARE_API]".format(
                         murano_packages_service))
 
+        art_client = importutils.import_module('muranoclient.glance.client')
         artifacts_client = art_client.Client(
             endpoint=glare_endpoint,
             type_name='murano',
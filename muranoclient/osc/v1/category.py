@@ -18,7 +18,7 @@ from osc_lib.command import command
 from osc_lib import utils
 from oslo_log import log as logging
 
-from muranoclient.apiclient import exceptions
+from muranoclient.common import utils as murano_utils
 
 LOG = logging.getLogger(__name__)
 
@@ -126,17 +126,8 @@ class DeleteCategory(command.Lister):
         LOG.debug("take_action({0})".format(parsed_args))
         client = self.app.client_manager.application_catalog
 
-        failure_count = 0
-        for category_id in parsed_args.id:
-            try:
-                client.categories.delete(category_id)
-            except Exception:
-                failure_count += 1
-                print("Failed to delete '{0}'; category not found".
-                      format(category_id))
-        if failure_count == len(parsed_args.id):
-            raise exceptions.CommandError("Unable to find and delete any of "
-                                          "the specified categories.")
+        murano_utils.bulk_delete(client.categories.delete, parsed_args.id,
+                                 'category', 'categories')
         data = client.categories.list()
 
         fields = ["id", "name"]
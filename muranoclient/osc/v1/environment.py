@@ -15,6 +15,7 @@
 import json
 import six
 import sys
+import time
 import uuid
 
 import jsonpatch
@@ -24,6 +25,7 @@ from oslo_log import log as logging
 from oslo_serialization import jsonutils
 
 from muranoclient.apiclient import exceptions
+from muranoclient.common import exceptions as common_exceptions
 from muranoclient.common import utils as murano_utils
 
 
@@ -267,20 +269,12 @@ class EnvironmentDelete(command.Lister):
         client = self.app.client_manager.application_catalog
 
         abandon = getattr(parsed_args, 'abandon', False)
-        failure_count = 0
-        for environment_id in parsed_args.id:
-            try:
-                environment = murano_utils.find_resource(client.environments,
-                                                         environment_id)
-                client.environments.delete(environment.id, abandon)
-            except exceptions.NotFound:
-                failure_count += 1
-                print("Failed to delete '{0}'; environment not found".
-                      format(environment_id))
-
-        if failure_count == len(parsed_args.id):
-            raise exceptions.CommandError("Unable to find and delete any of "
-                                          "the specified environments.")
+        murano_utils.bulk_delete(
+            lambda environment_id: client.environments.delete(
+                environment_id, abandon),
+            parsed_args.id, 'environment', 'environments',
+            find=lambda name_or_id: murano_utils.find_resource(
+                client.environments, name_or_id))
 
         data = client.environments.list()
 
@@ -311,6 +305,19 @@ class EnvironmentDeploy(command.ShowOne):
             metavar="<SESSION>",
             help="ID of configuration session to deploy.",
         )
+        parser.add_argument(
+            '--wait',
+            action='store_true',
+            default=False,
+            help="Wait until the deployment finishes.",
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=None,
+            help="Fail if the deployment does not finish in that many "
+                 "seconds, implies --wait.",
+        )
 
         return parser
 
@@ -318,7 +325,23 @@ class EnvironmentDeploy(command.ShowOne):
         LOG.debug("take_action({0})".format(parsed_args))
         client = self.app.client_manager.application_catalog
 
-        client.sessions.deploy(parsed_args.id, parsed_args.session_id)
+        if parsed_args.wait or parsed_args.timeout is not None:
+            started = time.time()
+            try:
+                deployed = client.sessions.deploy(
+                    parsed_args.id, parsed_args.session_id, wait=True,
+                    timeout=parsed_args.timeout)
+            except common_exceptions.WaitTimeout as e:
+                raise exceptions.CommandError(six.text_type(e))
+            message = ("Environment {0} finished deploying with status "
+                       "'{1}' in {2:.1f}s".format(parsed_args.id,
+                                                  deployed.status,
+                                                  time.time() - started))
+            if deployed.status != 'ready':
+                raise exceptions.CommandError(message)
+            sys.stderr.write(message + '\n')
+        else:
+            client.sessions.deploy(parsed_args.id, parsed_args.session_id)
 
         environment = utils.find_resource(client.environments,
                                           parsed_args.id)
@@ -19,45 +19,102 @@ Command-line interface to the Murano Project.
 from __future__ import print_function
 
 import argparse
+import functools
+import os
 import sys
 
-import glanceclient
 from keystoneclient.auth.identity.generic.cli import DefaultCLI
 from keystoneclient.auth.identity import v3 as identity
-from keystoneclient import discover
 from keystoneclient import exceptions as ks_exc
 from keystoneclient import session as ksession
 from oslo_log import handlers
 from oslo_log import log as logging
 from oslo_log import versionutils
 from oslo_utils import encodeutils
+from oslo_utils import importutils
 import six
 import six.moves.urllib.parse as urlparse
 
 import muranoclient
 from muranoclient.apiclient import exceptions as exc
 from muranoclient import client as murano_client
+from muranoclient.common import cache
 from muranoclient.common import utils
-from muranoclient.glance import client as art_client
 
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_REPO_URL = "http://apps.openstack.org/api/v1/murano_repo/liberty/"
 
+# options identifying a token in the auth cache
+AUTH_CACHE_KEY_OPTIONS = ('os_auth_url', 'os_username', 'os_user_id',
+                          'os_user_domain_id', 'os_user_domain_name',
+                          'os_password', 'os_auth_token', 'os_project_id',
+                          'os_project_name', 'os_project_domain_id',
+                          'os_project_domain_name', 'os_region_name')
+
 
 # quick local fix for keystoneclient bug which blocks built-in reauth
 # functionality in case of expired token.
 # bug: https://bugs.launchpad.net/python-keystoneclient/+bug/1551392
 # fix: https://review.openstack.org/#/c/286236/
 class AuthCLI(DefaultCLI):
+    auth_cache = None
+    auth_cache_key = None
+    _cached_auth_ref = None
+
     def invalidate(self):
         retval = super(AuthCLI, self).invalidate()
         if self._token:
             self._token = None
             retval = True
+        if self.auth_cache is not None:
+            self.auth_cache.invalidate(self.auth_cache_key)
         return retval
 
+    def use_cache(self, auth_cache, key):
+        """Reuse a token cached by a previous run, if it is still valid."""
+        self.auth_cache = auth_cache
+        self.auth_cache_key = key
+        self.auth_ref = self._cached_auth_ref = auth_cache.get_auth_ref(key)
+
+    def save_cache(self):
+        """Cache the current token unless it came from the cache."""
+        if (self.auth_cache is not None and self.auth_ref is not None and
+                self.auth_ref is not self._cached_auth_ref):
+            self.auth_cache.set_auth_ref(self.auth_cache_key, self.auth_ref)
+            self._cached_auth_ref = self.auth_ref
+
+
+class VersionAction(argparse.Action):
+    """Print the client version and exit.
+
+    Unlike the stock 'version' action the version string is only
+    computed when the option is given, since doing so is slow.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super(VersionAction, self).__init__(option_strings=option_strings,
+                                            dest=dest, default=default,
+                                            nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(muranoclient.__version__)
+        parser.exit()
+
+
+def _make_glance_client(endpoint, **kwargs):
+    glanceclient = importutils.import_module('glanceclient')
+    try:
+        # TODO(starodubcevna): switch back to glance APIv2 when it will
+        # be ready for use.
+        return glanceclient.Client('1', endpoint, **kwargs)
+    except Exception:
+        logger.warning("Could not initialize glance client. "
+                       "Image creation will be unavailable.")
+        return None
+
 
 class MuranoShell(object):
 
@@ -84,8 +141,7 @@ class MuranoShell(object):
                             help=argparse.SUPPRESS, )
 
         parser.add_argument('--version',
-                            action='version',
-                            version=muranoclient.__version__,
+                            action=VersionAction,
                             help="Show program's version number and exit.")
 
         parser.add_argument('-d', '--debug',
@@ -175,6 +231,50 @@ class MuranoShell(object):
                             help=('Defaults to env[MURANO_REPO_URL] '
                                   'or {0}'.format(DEFAULT_REPO_URL)))
 
+        parser.add_argument('--murano-repo-cache',
+                            metavar='<dir>',
+                            default=utils.env('MURANO_REPO_CACHE'),
+                            help='Directory to cache packages and bundles '
+                                 'downloaded from murano repository and '
+                                 'results of their validation in. '
+                                 'Defaults to env[MURANO_REPO_CACHE], '
+                                 'caching is disabled if not set.')
+
+        parser.add_argument('--murano-repo-cache-size',
+                            metavar='<MB>', type=int,
+                            default=utils.env('MURANO_REPO_CACHE_SIZE',
+                                              default=1024),
+                            help='Size budget of murano repository cache in '
+                                 'megabytes. Defaults to '
+                                 'env[MURANO_REPO_CACHE_SIZE] or 1024.')
+
+        parser.add_argument('--murano-package-index',
+                            metavar='<file>',
+                            default=utils.env('MURANO_PACKAGE_INDEX'),
+                            help='File of a local package index which '
+                                 'answers package lookups and listings '
+                                 'without querying murano API. Defaults to '
+                                 'env[MURANO_PACKAGE_INDEX], the index is '
+                                 'not used if not set.')
+
+        parser.add_argument('--murano-package-index-max-age',
+                            metavar='<seconds>', type=int,
+                            default=utils.env('MURANO_PACKAGE_INDEX_MAX_AGE',
+                                              default=300),
+                            help='Seconds after which the package index is '
+                                 'synced with murano API before it is used. '
+                                 'Defaults to '
+                                 'env[MURANO_PACKAGE_INDEX_MAX_AGE] or 300.')
+
+        parser.add_argument('--murano-auth-cache',
+                            metavar='<dir>',
+                            default=utils.env('MURANO_AUTH_CACHE'),
+                            help='Directory to cache keystone version '
+                                 'discovery, tokens and service catalogs '
+                                 'in between runs. Defaults to '
+                                 'env[MURANO_AUTH_CACHE], caching is '
+                                 'disabled if not set.')
+
         parser.add_argument('--murano-packages-service',
                             choices=['murano', 'glance', 'glare'],
                             default=utils.env('MURANO_PACKAGES_SERVICE',
@@ -231,11 +331,16 @@ class MuranoShell(object):
                 subparser.add_argument(*args, **kwargs)
             subparser.set_defaults(func=callback)
 
-    def _discover_auth_versions(self, session, auth_url):
+    def _discover_auth_versions(self, session, auth_url, auth_cache=None):
         # discover the API versions the server is supporting base on the
         # given URL
+        if auth_cache is not None:
+            versions = auth_cache.get_discovery(auth_url)
+            if versions is not None:
+                return versions
         v2_auth_url = None
         v3_auth_url = None
+        discover = importutils.import_module('keystoneclient.discover')
         try:
             ks_discover = discover.Discover(session=session, auth_url=auth_url)
             v2_auth_url = ks_discover.url_for('2.0')
@@ -259,6 +364,8 @@ class MuranoShell(object):
                        'auth_url instead. error=%s') % (e)
                 raise exc.CommandError(msg)
 
+        if auth_cache is not None:
+            auth_cache.set_discovery(auth_url, (v2_auth_url, v3_auth_url))
         return (v2_auth_url, v3_auth_url)
 
     def _setup_logging(self, debug):
@@ -385,6 +492,12 @@ class MuranoShell(object):
         else:
             # Create a keystone session and keystone auth
             keystone_session = ksession.Session.load_from_cli_options(args)
+            auth_cache = None
+            if args.murano_auth_cache:
+                try:
+                    auth_cache = cache.AuthCache(args.murano_auth_cache)
+                except ValueError as e:
+                    logger.warning(e)
 
             args.os_project_name = args.os_project_name or args.os_tenant_name
             args.os_project_id = args.os_project_id or args.os_tenant_id
@@ -395,7 +508,7 @@ class MuranoShell(object):
             # avoid password prompt if no password given
             args.os_password = args.os_password or '<no password>'
             (v2_auth_url, v3_auth_url) = self._discover_auth_versions(
-                keystone_session, args.os_auth_url)
+                keystone_session, args.os_auth_url, auth_cache)
             if v3_auth_url:
                 args.os_project_domain_id = (args.os_project_domain_id or
                                              'default')
@@ -403,6 +516,10 @@ class MuranoShell(object):
                                           'default')
 
             keystone_auth = AuthCLI.load_from_argparse_arguments(args)
+            if auth_cache is not None:
+                keystone_auth.use_cache(auth_cache, auth_cache.make_key(
+                    *[getattr(args, option, None)
+                      for option in AUTH_CACHE_KEY_OPTIONS]))
 
             service_type = args.os_service_type or 'application-catalog'
 
@@ -438,17 +555,11 @@ class MuranoShell(object):
             except Exception:
                 pass
 
-        glance_client = None
         if glance_endpoint:
-            try:
-                # TODO(starodubcevna): switch back to glance APIv2 when it will
-                # be ready for use.
-                glance_client = glanceclient.Client(
-                    '1', glance_endpoint, **glance_kwargs)
-            except Exception:
-                pass
-        if glance_client:
-            kwargs['glance_client'] = glance_client
+            # NOTE: glanceclient is slow to import and only a few commands
+            # need it, so the client is created on first use
+            kwargs['glance_client_factory'] = functools.partial(
+                _make_glance_client, glance_endpoint, **glance_kwargs)
         else:
             logger.warning("Could not initialize glance client. "
                            "Image creation will be unavailable.")
@@ -477,6 +588,8 @@ class MuranoShell(object):
             auth_token = \
                 args.os_auth_token or keystone_auth.get_token(keystone_session)
 
+            art_client = importutils.import_module(
+                'muranoclient.glance.client')
             artifacts_client = art_client.Client(endpoint=glare_endpoint,
                                                  type_name='murano',
                                                  type_version=1,
@@ -484,9 +597,25 @@ class MuranoShell(object):
                                                  insecure=args.insecure)
             kwargs['artifacts_client'] = artifacts_client
 
+        if args.murano_package_index:
+            kwargs['package_index'] = args.murano_package_index
+            kwargs['package_index_max_age'] = int(
+                args.murano_package_index_max_age)
+
+        if args.murano_repo_cache:
+            utils.File.download_cache = cache.DownloadCache(
+                args.murano_repo_cache,
+                max_size=int(args.murano_repo_cache_size) * 1024 * 1024)
+            utils.Package.validation_cache = cache.ValidationCache(
+                os.path.join(args.murano_repo_cache, 'validation'))
+
         client = murano_client.Client(api_version, endpoint, **kwargs)
 
-        args.func(client, args)
+        try:
+            args.func(client, args)
+        finally:
+            if keystone_auth is not None:
+                keystone_auth.save_cache()
 
     def do_bash_completion(self, args):
         """Prints all of the commands and options to stdout."""
@@ -39,6 +39,9 @@ class FakeHTTPResponse(object):
     def iter_content(self, chunksize):
         return self.content
 
+    def close(self):
+        pass
+
     def json(self):
         return jsonutils.loads(self.content)
 
@@ -15,7 +15,9 @@ import json
 import tempfile
 
 import mock
+import six
 
+from muranoclient.apiclient import exceptions
 from muranoclient.osc.v1 import environment as osc_env
 from muranoclient.tests.unit.osc.v1 import fakes
 from muranoclient.v1 import environments as api_env
@@ -478,6 +480,33 @@ class TestEnvironmentDeploy(TestEnvironment):
                          '2015-12-16T17:31:54', '1')
         self.assertEqual(expected_data, data)
 
+    def test_environment_deploy_wait(self):
+        arglist = ['fake', '--session-id', 'abc123', '--wait']
+        verifylist = [('id', 'fake'), ('session_id', 'abc123'),
+                      ('wait', True)]
+        self.session_mock.deploy.return_value.status = 'ready'
+
+        parsed_args = self.check_parser(self.cmd, arglist, verifylist)
+        self.cmd.take_action(parsed_args)
+
+        self.session_mock.deploy.assert_called_once_with(
+            'fake', 'abc123', wait=True, timeout=None)
+
+    def test_environment_deploy_wait_failure(self):
+        arglist = ['fake', '--session-id', 'abc123', '--timeout', '60']
+        verifylist = [('id', 'fake'), ('session_id', 'abc123'),
+                      ('timeout', 60)]
+        self.session_mock.deploy.return_value.status = 'deploy failure'
+
+        parsed_args = self.check_parser(self.cmd, arglist, verifylist)
+        ex = self.assertRaises(exceptions.CommandError,
+                               self.cmd.take_action, parsed_args)
+
+        self.assertIn("finished deploying with status 'deploy failure'",
+                      six.text_type(ex))
+        self.session_mock.deploy.assert_called_once_with(
+            'fake', 'abc123', wait=True, timeout=60)
+
 
 class TestEnvironmentAppsEdit(TestEnvironment):
     def setUp(self):
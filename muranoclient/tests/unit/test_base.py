@@ -13,9 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import pickle
+import threading
+
+import mock
 import testtools
 
+from muranoclient.apiclient import exceptions
 from muranoclient.common import base
+from muranoclient.common import utils
+from muranoclient.v1 import environments
 from muranoclient.v1 import packages
 
 
@@ -44,3 +52,170 @@ class BaseTest(testtools.TestCase):
         r1 = base.Resource(None, {'name': 'joe', 'age': 12})
         r2 = base.Resource(None, {'name': 'joe', 'age': 12})
         self.assertEqual(r1, r2)
+
+    def test_attributes_are_view_of_info(self):
+        info = {'id': 1, 'tags': ['a']}
+        r = packages.Package(None, info, loaded=True)
+        self.assertIs(info['tags'], r.tags)
+        r.name = 'set'
+        self.assertEqual('set', r.name)
+        self.assertEqual({}, vars(r))
+        self.assertEqual({'id': 1, 'tags': ['a']}, info)
+        self.assertNotIn('name', r.to_dict())
+        self.assertRaises(AttributeError, getattr, r, 'missing')
+
+    def test_to_dict_copies_info(self):
+        info = {'id': 1, 'services': [{'?': {'id': 'x'}}]}
+        r = environments.Environment(None, info)
+        data = r.to_dict()
+        data['services'][0]['?']['id'] = 'y'
+        self.assertEqual('x', r.services[0]['?']['id'])
+
+    def test_lazy_load_does_not_modify_info(self):
+        info = {'id': 1}
+        manager = mock.Mock()
+        manager.get.return_value = base.Resource(None, {'id': 1,
+                                                        'name': 'loaded'})
+        r = base.Resource(manager, info)
+        self.assertEqual('loaded', r.name)
+        self.assertEqual({'id': 1}, info)
+        self.assertEqual({'id': 1, 'name': 'loaded'}, r.to_dict())
+        manager.get.assert_called_once_with(1)
+
+    def test_info_takes_precedence_over_methods(self):
+        r = environments.Environment(None, {'id': 1, 'data': 'value'})
+        self.assertEqual('value', r.data)
+        self.assertIs(environments.Environment, type(r))
+        self.assertEqual(r, environments.Environment(
+            None, {'id': 1, 'data': 'value'}))
+        r._add_details({'data': 'new'})
+        self.assertEqual('new', r.data)
+        self.assertEqual({'id': 1, 'data': 'new'}, r.to_dict())
+
+        clone = pickle.loads(pickle.dumps(r))
+        self.assertEqual('new', clone.data)
+        self.assertEqual(r, clone)
+
+        plain = environments.Environment(mock.Mock(), {'id': 1})
+        self.assertIs(environments.Environment, type(plain))
+        self.assertTrue(callable(plain.data))
+        plain.data = 'assigned'
+        self.assertEqual('assigned', plain.data)
+        del plain.data
+        self.assertTrue(callable(plain.data))
+
+    def test_pickle_and_copy(self):
+        r = base.Resource(None, {'id': 1}, loaded=True)
+        r.extra = 'a'
+        for clone in (pickle.loads(pickle.dumps(r)), copy.copy(r)):
+            self.assertEqual(r, clone)
+            self.assertEqual('a', clone.extra)
+            clone.extra = 'b'
+            self.assertEqual('a', r.extra)
+
+
+class ManagerWithFindTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ManagerWithFindTest, self).setUp()
+        self.api = mock.Mock()
+        self.api.json_request.return_value = (None, {'environments': [
+            {'id': 'id1', 'name': 'env1'},
+            {'id': 'id2', 'name': 'env2'},
+            {'id': 'id3', 'name': 'env2'},
+        ]})
+        self.manager = environments.EnvironmentManager(self.api)
+
+    def test_find_uses_single_listing(self):
+        self.assertEqual('id1', self.manager.find(name='env1').id)
+        self.assertEqual('id1', utils.find_resource(self.manager, 'env1').id)
+        self.assertEqual(['id2', 'id3'],
+                         [e.id for e in self.manager.findall(name='env2')])
+        self.assertEqual('env2', self.manager.find(id='id2').name)
+        self.assertRaises(exceptions.NotFound, self.manager.find,
+                          name='env3')
+        self.assertRaises(exceptions.NoUniqueMatch, self.manager.find,
+                          name='env2')
+        # listed objects are returned without fetching details
+        self.assertEqual(1, self.api.json_request.call_count)
+
+    def test_listing_expires(self):
+        self.manager.find(name='env1')
+        self.manager.find_cache_ttl = -1
+        self.manager.find(name='env1')
+        self.assertEqual(2, self.api.json_request.call_count)
+
+    def test_changes_invalidate_listing(self):
+        self.manager.find(name='env1')
+        self.manager.delete('id1')
+        self.manager.find(name='env1')
+        self.assertEqual(2, self.api.json_request.call_count)
+        self.manager.update('id1', 'renamed')
+        self.manager.find(name='env1')
+        self.assertEqual(4, self.api.json_request.call_count)
+
+
+class RunConcurrentlyTest(testtools.TestCase):
+
+    def test_run_concurrently(self):
+        started = []
+        barrier = threading.Event()
+
+        def call(item):
+            started.append(item)
+            if len(started) == 3:
+                barrier.set()
+            # NOTE: completes only if the items are processed concurrently
+            if not barrier.wait(5):
+                raise RuntimeError('not concurrent')
+            if item == 'b':
+                raise ValueError(item)
+            return item.upper()
+
+        results = base.run_concurrently(call, ['a', 'b', 'c'], 3)
+        self.assertEqual(['a', 'b', 'c'], [r.item for r in results])
+        self.assertEqual(['A', None, 'C'], [r.result for r in results])
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, ValueError)
+
+
+class GetManyTest(testtools.TestCase):
+
+    def setUp(self):
+        super(GetManyTest, self).setUp()
+        self.api = mock.Mock()
+        self.manager = environments.EnvironmentManager(self.api)
+        self.started = threading.Event()
+
+    def _get(self, url, method, headers=None):
+        env_id = url.rsplit('/', 1)[-1]
+        if env_id == 'missing':
+            raise exceptions.NotFound()
+        if env_id == 'slow':
+            # the first request blocks until another one starts
+            self.assertTrue(self.started.wait(5))
+        else:
+            self.started.set()
+        return None, {'id': env_id, 'session': headers}
+
+    def test_get_many(self):
+        self.api.json_request.side_effect = self._get
+        results = self.manager.get_many(
+            ['slow', 'id1', 'missing', 'id1', 'id2'], concurrency=3,
+            session_id='s1')
+
+        self.assertEqual(['slow', 'id1', 'missing', 'id2'],
+                         [r.item for r in results])
+        self.assertEqual(['slow', 'id1', None, 'id2'],
+                         [r.result and r.result.id for r in results])
+        self.assertIsInstance(results[2].error, exceptions.NotFound)
+        self.assertIsNone(results[0].error)
+        self.assertEqual({'X-Configuration-Session': 's1'},
+                         results[0].result.session)
+        self.assertEqual(4, self.api.json_request.call_count)
+
+    def test_get_many_sequential(self):
+        self.api.json_request.side_effect = self._get
+        results = self.manager.get_many(['id1', 'missing'], concurrency=1)
+        self.assertEqual(['id1', None],
+                         [r.result and r.result.id for r in results])
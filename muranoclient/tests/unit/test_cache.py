@@ -0,0 +1,312 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import shutil
+import stat
+import tempfile
+
+from keystoneclient import access
+from keystoneclient import fixture as ks_fixture
+import requests
+import requests_mock
+import testtools
+
+from muranoclient.common import cache
+from muranoclient.tests.unit import fakes
+
+
+class LRUCacheTest(testtools.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = cache.LRUCache(max_entries=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(1, lru.get('a'))
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(1, lru.get('a'))
+        self.assertEqual(3, lru.get('c'))
+        self.assertEqual({'entries': 2, 'hits': 3, 'misses': 1,
+                          'evictions': 1}, lru.stats())
+
+
+class ResponseCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ResponseCacheTest, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_response_without_validators_not_cached(self):
+        response_cache = cache.ResponseCache()
+        resp = fakes.FakeHTTPResponse(200, 'OK', {}, b'foo')
+        self.assertIs(resp, response_cache.update('key', None, resp))
+        self.assertEqual((None, {}), response_cache.validators('key'))
+
+    def test_validators(self):
+        response_cache = cache.ResponseCache()
+        response_cache.update('key', None, fakes.FakeHTTPResponse(
+            200, 'OK', {'ETag': '"1"',
+                        'Last-Modified': 'Mon, 10 Oct 2016 10:00:00 GMT'},
+            b'foo'))
+        entry, headers = response_cache.validators('key')
+        self.assertEqual({'If-None-Match': '"1"',
+                          'If-Modified-Since':
+                              'Mon, 10 Oct 2016 10:00:00 GMT'}, headers)
+
+        resp = response_cache.update(
+            'key', entry, fakes.FakeHTTPResponse(304, 'Not Modified', {}, ''))
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(b'foo', resp.content)
+
+    def test_changed_resource_replaces_entry(self):
+        response_cache = cache.ResponseCache()
+        response_cache.update('key', None, fakes.FakeHTTPResponse(
+            200, 'OK', {'ETag': '"1"'}, b'foo'))
+        entry, headers = response_cache.validators('key')
+        response_cache.update('key', entry, fakes.FakeHTTPResponse(
+            200, 'OK', {'ETag': '"2"'}, b'bar'))
+        entry, headers = response_cache.validators('key')
+        self.assertEqual(b'bar', entry.content)
+        self.assertEqual({'If-None-Match': '"2"'}, headers)
+
+    def test_big_response_not_cached(self):
+        response_cache = cache.ResponseCache(max_entry_size=2)
+        response_cache.update('key', None, fakes.FakeHTTPResponse(
+            200, 'OK', {'ETag': '"1"'}, b'foo'))
+        self.assertEqual((None, {}), response_cache.validators('key'))
+
+    def test_disk_cache(self):
+        response_cache = cache.ResponseCache(cache_dir=self.cache_dir)
+        response_cache.update('key', None, fakes.FakeHTTPResponse(
+            200, 'OK', {'ETag': '"1"'}, b'foo'))
+        mode = os.stat(os.path.join(self.cache_dir, 'key')).st_mode
+        self.assertEqual(0o600, stat.S_IMODE(mode))
+
+        response_cache = cache.ResponseCache(cache_dir=self.cache_dir)
+        entry, headers = response_cache.validators('key')
+        self.assertEqual(b'foo', entry.content)
+        self.assertEqual({'If-None-Match': '"1"'}, headers)
+
+    def test_disk_cache_bounded(self):
+        response_cache = cache.ResponseCache(max_entries=2,
+                                             cache_dir=self.cache_dir)
+        for key in ('a', 'b', 'c'):
+            response_cache.update(key, None, fakes.FakeHTTPResponse(
+                200, 'OK', {'ETag': '"1"'}, b'foo'))
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def test_make_key(self):
+        key = cache.ResponseCache.make_key
+        self.assertEqual(key('/v1/foo', ('user', 'project')),
+                         key('/v1/foo', ('user', 'project'),
+                             {'If-None-Match': '"1"'}))
+        self.assertNotEqual(key('/v1/foo', ('user', 'project')),
+                            key('/v1/foo', ('user', 'other')))
+
+
+class ValidationCacheTest(testtools.TestCase):
+
+    def test_memory(self):
+        results = cache.ValidationCache()
+        key = results.make_key('digest', '0.3.0')
+        self.assertEqual((False, None), results.get(key))
+        results.set(key, None)
+        self.assertEqual((True, None), results.get(key))
+        self.assertNotEqual(key, results.make_key('digest', '0.3.1'))
+
+    def test_disk(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        key = cache.ValidationCache.make_key('digest', '0.3.0')
+        cache.ValidationCache(cache_dir).set(key, 'Invalid Murano package')
+
+        results = cache.ValidationCache(cache_dir)
+        self.assertEqual((True, 'Invalid Murano package'), results.get(key))
+        mode = os.stat(os.path.join(cache_dir, key)).st_mode
+        self.assertEqual(0o600, stat.S_IMODE(mode))
+
+
+class DownloadCacheTest(testtools.TestCase):
+
+    url = 'http://127.0.0.1/apps/org.foo.zip'
+
+    def setUp(self):
+        super(DownloadCacheTest, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache = cache.DownloadCache(self.cache_dir)
+
+    def _read(self, url=None):
+        with self.cache.open(url or self.url) as cached:
+            return cached.read()
+
+    def _blobs(self):
+        return [name for name in os.listdir(
+            os.path.join(self.cache_dir, 'blobs')) if not name.startswith('.')]
+
+    def _index(self):
+        return os.listdir(os.path.join(self.cache_dir, 'index'))
+
+    @requests_mock.mock()
+    def test_revalidated_with_etag(self, m):
+        m.get(self.url, content=b'archive', headers={'ETag': '"v1"'})
+        self.assertEqual(b'archive', self._read())
+
+        m.get(self.url, status_code=304)
+        self.assertEqual(b'archive', self._read())
+        self.assertEqual('"v1"', m.last_request.headers['If-None-Match'])
+        self.assertEqual({'hits': 1, 'misses': 1}, self.cache.stats())
+
+    @requests_mock.mock()
+    def test_changed_file_replaced(self, m):
+        m.get(self.url, content=b'archive', headers={'ETag': '"v1"'})
+        self._read()
+        m.get(self.url, content=b'new archive', headers={'ETag': '"v2"'})
+        self.assertEqual(b'new archive', self._read())
+
+    @requests_mock.mock()
+    def test_blobs_stored_by_content(self, m):
+        m.get(self.url, content=b'archive')
+        m.get(self.url + '.copy', content=b'archive')
+        self._read()
+        self._read(self.url + '.copy')
+        self.assertEqual(1, len(self._blobs()))
+        mode = os.stat(os.path.join(self.cache_dir, 'blobs',
+                                    self._blobs()[0])).st_mode
+        self.assertEqual(0o600, stat.S_IMODE(mode))
+
+    @requests_mock.mock()
+    def test_served_when_repository_unreachable(self, m):
+        m.get(self.url, content=b'archive')
+        self._read()
+        m.get(self.url, exc=requests.exceptions.ConnectionError)
+        self.assertEqual(b'archive', self._read())
+
+    @requests_mock.mock()
+    def test_error_status(self, m):
+        m.get(self.url, status_code=404)
+        self.assertRaises(ValueError, self._read)
+
+    @requests_mock.mock()
+    def test_size_budget(self, m):
+        self.cache.max_size = 16
+        for i in range(3):
+            m.get(self.url + str(i), content=b'archive' + str(i).encode(),
+                  headers={'ETag': str(i)})
+            self._read(self.url + str(i))
+            # NOTE: make sure mtimes of blobs differ
+            for name in self._blobs():
+                path = os.path.join(self.cache_dir, 'blobs', name)
+                os.utime(path, (os.stat(path).st_mtime - 10,) * 2)
+        self.assertEqual(2, len(self._blobs()))
+        self.assertEqual(2, len(self._index()))
+
+        # NOTE: the least recently used file was evicted
+        self.assertEqual(b'archive0', self._read(self.url + '0'))
+        self.assertNotIn('If-None-Match', m.last_request.headers)
+        self.assertNotIn('If-Modified-Since', m.last_request.headers)
+
+    @requests_mock.mock()
+    def test_evicted_blob_removes_index_entries(self, m):
+        m.get(self.url, content=b'archive')
+        m.get(self.url + '.copy', content=b'archive')
+        self._read()
+        self._read(self.url + '.copy')
+        evicted = os.path.join(self.cache_dir, 'blobs', self._blobs()[0])
+        index = [os.path.join(self.cache_dir, 'index', name)
+                 for name in self._index()]
+        self.assertEqual(2, len(index))
+        os.utime(evicted, (os.stat(evicted).st_mtime - 10,) * 2)
+
+        self.cache.max_size = 16
+        m.get(self.url + '.new', content=b'new archive')
+        self._read(self.url + '.new')
+        self.assertFalse(os.path.exists(evicted))
+        for path in index:
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(1, len(self._blobs()))
+        self.assertEqual(1, len(self._index()))
+
+
+class AuthCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(AuthCacheTest, self).setUp()
+        self.cache_dir = os.path.join(tempfile.mkdtemp(), 'auth')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.cache_dir))
+        self.cache = cache.AuthCache(self.cache_dir)
+        self.key = self.cache.make_key('http://no.where/v3', 'user', 'pass')
+
+    def _auth_ref(self, expires=None, version=3):
+        if version == 3:
+            token = ks_fixture.V3Token(expires=expires)
+            token.set_project_scope()
+        else:
+            token = ks_fixture.V2Token(expires=expires)
+            token.set_scope()
+        token.add_service('application-catalog')
+        return access.AccessInfo.factory(body=token, auth_token='token')
+
+    def test_token_round_trip(self):
+        for version in (2, 3):
+            auth_ref = self._auth_ref(version=version)
+            self.cache.set_auth_ref(self.key, auth_ref)
+            cached = self.cache.get_auth_ref(self.key)
+            self.assertEqual(auth_ref.auth_token, cached.auth_token)
+            self.assertEqual(auth_ref.project_id, cached.project_id)
+            self.assertEqual(auth_ref.version, cached.version)
+
+    def test_private(self):
+        self.cache.set_auth_ref(self.key, self._auth_ref())
+        self.assertEqual(0o700,
+                         stat.S_IMODE(os.stat(self.cache_dir).st_mode))
+        for name in os.listdir(self.cache_dir):
+            mode = os.stat(os.path.join(self.cache_dir, name)).st_mode
+            self.assertEqual(0o600, stat.S_IMODE(mode))
+
+    def test_shared_directory_not_used(self):
+        shared_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, shared_dir)
+        os.chmod(shared_dir, 0o755)
+        self.assertRaises(ValueError, cache.AuthCache, shared_dir)
+        self.assertEqual(0o755, stat.S_IMODE(os.stat(shared_dir).st_mode))
+
+        os.chmod(shared_dir, 0o700)
+        cache.AuthCache(shared_dir)
+
+    def test_expiring_token_not_used(self):
+        expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=10)
+        self.cache.set_auth_ref(self.key, self._auth_ref(expires=expires))
+        self.assertIsNone(self.cache.get_auth_ref(self.key))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_invalidate(self):
+        self.cache.set_auth_ref(self.key, self._auth_ref())
+        self.cache.invalidate(self.key)
+        self.assertIsNone(self.cache.get_auth_ref(self.key))
+
+    def test_key_covers_credentials(self):
+        self.cache.set_auth_ref(self.key, self._auth_ref())
+        other = self.cache.make_key('http://no.where/v3', 'user', 'wrong')
+        self.assertIsNone(self.cache.get_auth_ref(other))
+
+    def test_discovery_ttl(self):
+        versions = (None, 'http://no.where/v3')
+        self.cache.set_discovery('http://no.where', versions)
+        self.assertEqual(versions,
+                         self.cache.get_discovery('http://no.where'))
+        self.cache.discovery_ttl = -1
+        self.assertIsNone(self.cache.get_discovery('http://no.where'))
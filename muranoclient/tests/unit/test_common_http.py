@@ -17,12 +17,13 @@ import socket
 import mock
 import testtools
 
+from muranoclient.common import cache
 from muranoclient.common import exceptions as exc
 from muranoclient.common import http
 from muranoclient.tests.unit import fakes
 
 
-@mock.patch('muranoclient.common.http.requests.request')
+@mock.patch('muranoclient.common.http.requests.Session.request')
 class HttpClientTest(testtools.TestCase):
 
     def test_http_raw_request(self, mock_request):
@@ -118,6 +119,36 @@ class HttpClientTest(testtools.TestCase):
             headers={'Content-Type': 'application/json',
                      'User-Agent': 'python-muranoclient'})
 
+    def test_http_json_stream_request(self, mock_request):
+        resp = fakes.FakeHTTPResponse(
+            200, 'OK', {'content-type': 'application/json'},
+            '{"total": 2, "reports": [{"id": 1}, null, {"id": 2}]}')
+        resp.close = mock.Mock()
+        mock_request.return_value = resp
+        client = http.HTTPClient('http://example.com:8082')
+        resp, items = client.json_stream_request('', 'GET',
+                                                 response_key='reports')
+        mock_request.assert_called_once_with(
+            'GET', 'http://example.com:8082',
+            allow_redirects=False, stream=True,
+            headers={'Content-Type': 'application/json',
+                     'User-Agent': 'python-muranoclient'})
+        self.assertEqual([{'id': 1}, None, {'id': 2}], list(items))
+        resp.close.assert_called_once_with()
+
+    def test_http_json_stream_request_non_json(self, mock_request):
+        mock_request.return_value = fakes.FakeHTTPResponse(
+            200, 'OK', {'content-type': 'text/plain'}, '{"reports": [1]}')
+        client = http.HTTPClient('http://example.com:8082')
+        resp, items = client.json_stream_request('', 'GET',
+                                                 response_key='reports')
+        self.assertEqual([1], list(items))
+
+        mock_request.return_value = fakes.FakeHTTPResponse(
+            200, 'OK', {'content-type': 'text/html'}, '<html></html>')
+        resp, items = client.json_stream_request('', 'GET')
+        self.assertRaises(ValueError, list, items)
+
     def test_http_json_request_argument_passed_to_requests(self, mock_request):
         """Check that we have sent the proper arguments to requests."""
         # Record a 200
@@ -461,3 +492,110 @@ class HttpClientTest(testtools.TestCase):
 #        client.log_curl_request('', "GET", kwargs=kwargs)
 #
 #        self.m.VerifyAll()
+
+
+class PooledAdapterTest(testtools.TestCase):
+
+    def test_clients_share_adapter(self):
+        client1 = http.HTTPClient('http://example.com:8082')
+        client2 = http.HTTPClient('http://example.com:8083')
+        self.assertIs(client1.adapter, client2.adapter)
+        self.assertIs(client1.adapter,
+                      client1.session.get_adapter('http://example.com'))
+        self.assertIs(client1.adapter,
+                      client1.session.get_adapter('https://example.com'))
+
+        client3 = http.HTTPClient('http://example.com:8082', pool_maxsize=2)
+        self.assertIsNot(client1.adapter, client3.adapter)
+        self.assertEqual(2, client3.adapter._pool_maxsize)
+
+    def test_glare_client_uses_shared_adapter(self):
+        from muranoclient.glance import client as art_client
+        glare = art_client.Client('http://example.com:9494',
+                                  type_name='murano', type_version=1,
+                                  pool_idle_timeout=5)
+        self.assertIs(http.get_pooled_adapter(pool_idle_timeout=5),
+                      glare.adapter)
+        self.assertIs(glare.adapter, glare.http_client.session.get_adapter(
+            'http://example.com:9494'))
+
+    def test_stats_empty(self):
+        adapter = http.PooledHTTPAdapter()
+        self.assertEqual({'pools': 0, 'requests': 0, 'connections': 0,
+                          'reused': 0, 'reuse_ratio': 0,
+                          'open_connections': 0}, adapter.stats())
+
+    def test_stats(self):
+        adapter = http.PooledHTTPAdapter()
+        pool = adapter.poolmanager.connection_from_url('http://example.com')
+        pool.num_requests = 4
+        pool.num_connections = 1
+        stats = adapter.stats()
+        self.assertEqual(1, stats['pools'])
+        self.assertEqual(3, stats['reused'])
+        self.assertEqual(0.75, stats['reuse_ratio'])
+
+    @mock.patch('requests.adapters.HTTPAdapter.send')
+    @mock.patch('muranoclient.common.http.time')
+    def test_idle_connections_dropped(self, mock_time, mock_send):
+        adapter = http.PooledHTTPAdapter(idle_timeout=10)
+        pool = adapter.poolmanager.connection_from_url('http://example.com')
+        pool.num_requests = pool.num_connections = 1
+
+        mock_time.time.return_value = 100
+        adapter.send(mock.sentinel.request)
+        mock_time.time.return_value = 105
+        adapter.send(mock.sentinel.request)
+        self.assertEqual(1, adapter.stats()['pools'])
+
+        mock_time.time.return_value = 120
+        adapter.send(mock.sentinel.request)
+        stats = adapter.stats()
+        self.assertEqual(0, stats['pools'])
+        self.assertEqual(1, stats['requests'])
+        self.assertEqual(3, mock_send.call_count)
+
+
+@mock.patch('muranoclient.common.http.requests.Session.request')
+class HttpClientCacheTest(testtools.TestCase):
+
+    def test_not_modified_served_from_cache(self, mock_request):
+        mock_request.side_effect = [
+            fakes.FakeHTTPResponse(
+                200, 'OK',
+                {'content-type': 'application/json', 'ETag': '"v1"'},
+                b'{"name": "foo"}'),
+            fakes.FakeHTTPResponse(304, 'Not Modified', {}, ''),
+        ]
+        response_cache = cache.ResponseCache()
+        client = http.HTTPClient('http://example.com:8082',
+                                 cache=response_cache)
+
+        resp, body = client.json_request('/v1/foo', 'GET')
+        self.assertEqual({'name': 'foo'}, body)
+        resp, body = client.json_request('/v1/foo', 'GET')
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({'name': 'foo'}, body)
+
+        mock_request.assert_called_with(
+            'GET', 'http://example.com:8082/v1/foo',
+            allow_redirects=False,
+            headers={'Content-Type': 'application/json',
+                     'User-Agent': 'python-muranoclient',
+                     'If-None-Match': '"v1"'})
+        self.assertEqual(1, response_cache.stats()['hits'])
+        self.assertEqual(1, response_cache.stats()['misses'])
+
+    def test_only_get_is_cached(self, mock_request):
+        mock_request.return_value = fakes.FakeHTTPResponse(
+            200, 'OK',
+            {'content-type': 'application/json', 'ETag': '"v1"'},
+            '{}')
+        response_cache = cache.ResponseCache()
+        client = http.HTTPClient('http://example.com:8082',
+                                 cache=response_cache)
+        client.json_request('/v1/foo', 'POST')
+        client.json_request('/v1/foo', 'POST')
+        self.assertNotIn('If-None-Match',
+                         mock_request.call_args[1]['headers'])
+        self.assertEqual(0, response_cache.stats()['entries'])
@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import testtools
+
+from muranoclient.common import jsonstream
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterItemsTest(testtools.TestCase):
+
+    def test_items_of_key(self):
+        doc = {'before': {'reports': [0]},
+               'reports': [{'id': i, 'text': u'ш' * i}
+                           for i in range(50)] + [123456789, None],
+               'after': 1}
+        data = json.dumps(doc).encode('utf-8')
+        for size in (1, 2, 7, 100, len(data)):
+            self.assertEqual(
+                doc['reports'],
+                list(jsonstream.iter_items(_chunks(data, size), 'reports')))
+
+    def test_array(self):
+        data = b' [1, 22, [3, {"a": "b"}], 456789] '
+        for size in (1, 3, len(data)):
+            self.assertEqual(
+                [1, 22, [3, {'a': 'b'}], 456789],
+                list(jsonstream.iter_items(_chunks(data, size))))
+
+    def test_number_split_across_chunks(self):
+        for number, value in ((b'1.5', 1.5), (b'1e5', 1e5), (b'-12', -12),
+                              (b'-1.25E-3', -1.25e-3)):
+            data = b'[' + number + b', 2]'
+            for split in range(1, len(number) + 1):
+                self.assertEqual(
+                    [value, 2],
+                    list(jsonstream.iter_items([data[:split + 1],
+                                                data[split + 1:]])))
+            self.assertEqual(
+                {'a': [value]},
+                {'a': list(jsonstream.iter_items(
+                    _chunks(b'{"a": [' + number + b']}', 1), 'a'))})
+            self.assertEqual([value], list(jsonstream.iter_items(
+                [b'[' + number[:1], number[1:] + b']'])))
+
+    def test_empty(self):
+        self.assertEqual([], list(jsonstream.iter_items([b'[ ]'])))
+        self.assertEqual([], list(jsonstream.iter_items([b'{}'], 'items')))
+        self.assertEqual([], list(jsonstream.iter_items(
+            [b'{"other": [1]}'], 'items')))
+        self.assertEqual([], list(jsonstream.iter_items(
+            [b'{"items": null}'], 'items')))
+
+    def test_items_decoded_incrementally(self):
+        consumed = []
+
+        def chunks():
+            for i in range(1000):
+                consumed.append(i)
+                yield b'[' if i == 0 else b','
+                yield json.dumps({'id': i}).encode('utf-8')
+            yield b']'
+
+        items = jsonstream.iter_items(chunks())
+        self.assertEqual({'id': 0}, next(items))
+        self.assertLess(len(consumed), 10)
+        self.assertEqual(999, len(list(items)))
+
+    def test_invalid(self):
+        for data in (b'{"items": [1, 2', b'[1, 2}', b'{"items" 1}', b'',
+                     b'[1, tru]'):
+            self.assertRaises(ValueError, list,
+                              jsonstream.iter_items([data], 'items'
+                                                    if data[:1] == b'{'
+                                                    else None))
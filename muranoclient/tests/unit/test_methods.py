@@ -12,12 +12,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import mock
 import six
+from six.moves import urllib
 import testtools
 
 from muranoclient import client
+from muranoclient.apiclient import exceptions as apiclient_exceptions
+from muranoclient.common import exceptions
+from muranoclient.common import multipart
 from muranoclient.v1 import actions
+from muranoclient.v1 import deployments
 import muranoclient.v1.environments as environments
 from muranoclient.v1 import packages
 import muranoclient.v1.sessions as sessions
@@ -49,6 +56,85 @@ class UnitTestsForClassesAndFunctions(testtools.TestCase):
 
         self.assertEqual([], result)
 
+    def test_env_manager_list_stream(self):
+        stream_api = mock.Mock()
+        stream_api.json_stream_request.return_value = (
+            None, iter([{'id': '1'}, None, {'id': '2'}]))
+        manager = environments.EnvironmentManager(stream_api)
+        result = manager.list(stream=True)
+
+        stream_api.json_stream_request.assert_called_once_with(
+            '/v1/environments?all_tenants=False', 'GET',
+            response_key='environments', headers={})
+        self.assertEqual(['1', '2'], [env.id for env in result])
+        self.assertFalse(stream_api.json_request.called)
+
+    def test_deployment_manager_reports_stream(self):
+        stream_api = mock.Mock()
+        stream_api.json_stream_request.return_value = (
+            None, iter([{'text': 'a'}, {'text': 'b'}]))
+        manager = deployments.DeploymentManager(stream_api)
+        result = manager.reports('env', 'dep', stream=True)
+
+        stream_api.json_stream_request.assert_called_once_with(
+            '/v1/environments/env/deployments/dep', 'GET',
+            response_key='reports')
+        self.assertEqual('a', next(result).text)
+        self.assertEqual(['b'], [status.text for status in result])
+
+    def test_deployment_manager_reports_services(self):
+        reports_api = mock.Mock()
+        reports_api.json_request.return_value = (None, {'reports': [{}]})
+        manager = deployments.DeploymentManager(reports_api)
+        manager.reports('env', 'dep', 'a', 'b c')
+
+        reports_api.json_request.assert_called_once_with(
+            '/v1/environments/env/deployments/dep?service_id=a&'
+            'service_id=b+c', 'GET')
+
+    def test_deployment_manager_reports_fan_out(self):
+        reports = {
+            'a': [{'created': '2016-01-01T00:00:01', 'text': 'a1'},
+                  {'created': '2016-01-01T00:00:04', 'text': 'a2'}],
+            'b': [{'created': '2016-01-01T00:00:02', 'text': 'b1'}],
+            'c': [{'created': '2016-01-01T00:00:01', 'text': 'c1'},
+                  {'created': '2016-01-01T00:00:03', 'text': 'c2'}],
+        }
+
+        def request(url, method, response_key=None):
+            service_id = urllib.parse.parse_qs(
+                urllib.parse.urlparse(url).query)['service_id']
+            self.assertEqual(1, len(service_id))
+            data = reports[service_id[0]]
+            if response_key is None:
+                return None, {'reports': data}
+            return None, iter(data)
+
+        reports_api = mock.Mock()
+        reports_api.json_request.side_effect = request
+        reports_api.json_stream_request.side_effect = request
+        manager = deployments.DeploymentManager(reports_api)
+
+        expected = ['a1', 'c1', 'b1', 'c2', 'a2']
+        result = manager.reports('env', 'dep', 'a', 'b', 'c', fan_out=True)
+        self.assertEqual(expected, [report.text for report in result])
+        self.assertEqual(3, reports_api.json_request.call_count)
+        result = manager.reports('env', 'dep', 'a', 'b', 'c', fan_out=True,
+                                 stream=True, concurrency=1)
+        self.assertNotIsInstance(result, list)
+        self.assertEqual(expected, [report.text for report in result])
+        self.assertEqual(6, reports_api.json_request.call_count)
+        self.assertFalse(reports_api.json_stream_request.called)
+
+    def test_deployment_manager_reports_fan_out_error(self):
+        reports_api = mock.Mock()
+        reports_api.json_request.side_effect = [
+            (None, {'reports': []}), exceptions.HTTPNotFound()]
+        manager = deployments.DeploymentManager(reports_api)
+        self.assertRaises(exceptions.HTTPNotFound, manager.reports,
+                          'env', 'dep', 'a', 'b', fan_out=True,
+                          concurrency=1)
+
     def test_env_manager_create(self):
         manager = environments.EnvironmentManager(api)
         result = manager.create({'name': 'test'})
@@ -224,6 +310,54 @@ class UnitTestsForClassesAndFunctions(testtools.TestCase):
 
         self.assertEqual(2, api.json_request.call_count)
 
+    def test_package_filter_prefetches_next_page(self):
+        responses = {
+            None: {'next_marker': 'm1', 'packages': [{'name': 'p1'}]},
+            'm1': {'next_marker': 'm2', 'packages': [{'name': 'p2'}]},
+            'm2': {'packages': [{'name': 'p3'}]},
+        }
+        requested = []
+        requested_event = threading.Event()
+
+        def json_request(url, method, *args, **kwargs):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+            self.assertEqual(['10'], query['limit'])
+            marker = query.get('marker', [None])
+            self.assertEqual(1, len(marker))
+            requested.append(marker[0])
+            if len(requested) == 2:
+                requested_event.set()
+            return mock.MagicMock(), responses[marker[0]]
+
+        api = mock.MagicMock()
+        api.configure_mock(**{'json_request.side_effect': json_request})
+
+        manager = packages.PackageManager(api)
+        pkgs = manager.filter(limit=10)
+        self.assertEqual('p1', next(pkgs).name)
+        # second page is requested while the first one is consumed
+        self.assertTrue(requested_event.wait(5))
+        self.assertEqual(['p2', 'p3'], [p.name for p in pkgs])
+        self.assertEqual([None, 'm1', 'm2'], requested)
+
+    def test_package_filter_marker_without_prefetch(self):
+        responses = [
+            {'next_marker': 'm2', 'packages': [{'name': 'p2'}]},
+            {'packages': [{'name': 'p3'}]}
+        ]
+        api = mock.MagicMock()
+        api.json_request.side_effect = lambda *args, **kwargs: (
+            mock.MagicMock(), responses.pop(0))
+
+        manager = packages.PackageManager(api)
+        pkgs = manager.filter(marker='m1', prefetch=0)
+        self.assertEqual('p2', next(pkgs).name)
+        self.assertEqual(1, api.json_request.call_count)
+        self.assertEqual('p3', next(pkgs).name)
+        urls = [c[0][0] for c in api.json_request.call_args_list]
+        self.assertEqual(['m1', 'm2'], [urllib.parse.parse_qs(
+            urllib.parse.urlparse(u).query)['marker'][0] for u in urls])
+
     def test_package_filter_encoding_good(self):
         responses = [
             {'next_marker': 'test_marker',
@@ -331,3 +465,227 @@ class UnitTestsForClassesAndFunctions(testtools.TestCase):
         result = manager.get('test')
 
         self.assertIsNotNone(result.manager)
+
+
+class PackageDownloadTest(testtools.TestCase):
+    def _response(self, status_code, chunks, headers=None, error=None):
+        def iter_content(chunk_size):
+            for chunk in chunks:
+                yield chunk
+            if error is not None:
+                raise error
+
+        response = mock.Mock(status_code=status_code, headers=headers or {})
+        response.iter_content.side_effect = iter_content
+        return response
+
+    def test_download_to_file_object(self):
+        api = mock.Mock()
+        api.request.return_value = self._response(
+            200, [b'abc', b'def'], {'content-length': '6'})
+        manager = packages.PackageManager(api)
+        archive = six.BytesIO()
+
+        written = manager.download_to('123', archive, chunk_size=3)
+
+        self.assertEqual(6, written)
+        self.assertEqual(b'abcdef', archive.getvalue())
+        api.request.assert_called_once_with(
+            '/v1/catalog/packages/123/download', 'GET', log=False,
+            stream=True, headers={})
+
+    def test_download_returns_content(self):
+        api = mock.Mock()
+        api.request.return_value = self._response(200, [b'abc'])
+        manager = packages.PackageManager(api)
+
+        self.assertEqual(b'abc', manager.download('123'))
+
+    def test_download_to_resumes_with_range(self):
+        api = mock.Mock()
+        api.request.side_effect = [
+            self._response(200, [b'abc'], {'content-length': '6'},
+                           error=exceptions.CommunicationError('reset')),
+            self._response(206, [b'def'],
+                           {'content-range': 'bytes 3-5/6'}),
+        ]
+        manager = packages.PackageManager(api)
+        archive = six.BytesIO()
+
+        written = manager.download_to(
+            '123', archive, checksum='e80b5017098950fc58aad83c8c14978e')
+
+        self.assertEqual(6, written)
+        self.assertEqual(b'abcdef', archive.getvalue())
+        self.assertEqual({'Range': 'bytes=3-'},
+                         api.request.call_args[1]['headers'])
+
+    def test_download_to_short_read_is_retried(self):
+        api = mock.Mock()
+        api.request.side_effect = [
+            self._response(200, [b'abc'], {'content-length': '6'}),
+            self._response(206, [b'def'],
+                           {'content-range': 'bytes 3-5/6'}),
+        ]
+        manager = packages.PackageManager(api)
+        archive = six.BytesIO()
+
+        self.assertEqual(6, manager.download_to('123', archive))
+        self.assertEqual(b'abcdef', archive.getvalue())
+
+    def test_download_to_gives_up_after_retries(self):
+        api = mock.Mock()
+        api.request.side_effect = exceptions.CommunicationError('down')
+        manager = packages.PackageManager(api)
+
+        self.assertRaises(exceptions.DownloadError, manager.download_to,
+                          '123', six.BytesIO(), retries=2)
+        self.assertEqual(3, api.request.call_count)
+
+    def test_download_to_checksum_mismatch(self):
+        api = mock.Mock()
+        api.request.return_value = self._response(200, [b'abc'])
+        manager = packages.PackageManager(api)
+
+        self.assertRaises(exceptions.DownloadError, manager.download_to,
+                          '123', six.BytesIO(), checksum='0' * 32)
+
+    def test_download_to_unexpected_content_range(self):
+        api = mock.Mock()
+        api.request.side_effect = [
+            self._response(200, [b'abc'], {'content-length': '6'}),
+            self._response(206, [b'cdef'],
+                           {'content-range': 'bytes 2-5/6'}),
+        ]
+        manager = packages.PackageManager(api)
+
+        self.assertRaises(exceptions.DownloadError, manager.download_to,
+                          '123', six.BytesIO())
+
+
+class PackageCreateTest(testtools.TestCase):
+    @mock.patch('muranoclient.common.utils.Package.from_file')
+    def test_create_streams_body(self, from_file):
+        api = mock.Mock()
+        api.request.return_value = mock.Mock(ok=True, text='{"id": "1"}')
+        manager = packages.PackageManager(api)
+        archive = six.BytesIO(b'PK' + b'x' * 1000)
+
+        package = manager.create({'is_public': False}, {'pkg': archive})
+
+        self.assertEqual('1', package.id)
+        kwargs = api.request.call_args[1]
+        body = kwargs['data']
+        self.assertIsInstance(body, multipart.MultipartEncoder)
+        self.assertEqual(body.content_type, kwargs['headers']['Content-Type'])
+        self.assertNotIn('files', kwargs)
+
+
+@mock.patch('muranoclient.v1.deployments.time')
+class DeploymentWatchTest(testtools.TestCase):
+    def setUp(self):
+        super(DeploymentWatchTest, self).setUp()
+        self.api = mock.Mock()
+        self.manager = deployments.DeploymentManager(self.api)
+        # deployment state and reports returned by consecutive polls
+        self.polls = [
+            ('running', [1]),
+            ('running', [1]),
+            ('running', [1]),
+            ('running', [1, 2, 3]),
+            ('success', [1, 2, 3, 4]),
+        ]
+        self.api.json_stream_request.side_effect = self._stream
+
+    def _stream(self, url, method, response_key=None, **kwargs):
+        if response_key == 'deployments':
+            state, _ = self.polls[0]
+            return None, iter([{'id': 'other', 'state': 'running'},
+                               {'id': 'dep', 'state': state}])
+        _, reports = self.polls.pop(0)
+        return None, iter({'id': i, 'text': 'report %d' % i}
+                          for i in reports)
+
+    def test_watch(self, mock_time):
+        mock_time.time.return_value = 0
+        watch = self.manager.watch('env', 'dep', interval=1,
+                                   max_interval=3)
+
+        self.assertEqual([1, 2, 3, 4], [report.id for report in watch])
+        self.assertEqual('success', watch.deployment.state)
+        self.assertTrue(watch.finished)
+        self.assertEqual(0, watch.elapsed)
+        # backs off while nothing changes and resets on new reports
+        self.assertEqual([mock.call(1), mock.call(1), mock.call(2),
+                          mock.call(1)],
+                         mock_time.sleep.call_args_list)
+
+    def test_watch_timeout(self, mock_time):
+        mock_time.time.side_effect = [0, 1, 2, 3]
+        watch = self.manager.watch('env', 'dep', timeout=2.5)
+
+        reports = iter(watch)
+        self.assertEqual(1, next(reports).id)
+        self.assertRaises(exceptions.WaitTimeout, list, reports)
+        self.assertEqual([mock.call(1), mock.call(0.5)],
+                         mock_time.sleep.call_args_list)
+
+    def test_watch_invalid_intervals(self, mock_time):
+        for interval, max_interval in ((0, 30), (-1, 30), (5, 2)):
+            self.assertRaises(ValueError, self.manager.watch, 'env', 'dep',
+                              interval=interval, max_interval=max_interval)
+        self.assertFalse(self.api.json_stream_request.called)
+
+    def test_get_not_found(self, mock_time):
+        self.assertRaises(apiclient_exceptions.NotFound,
+                          self.manager.get, 'env', 'missing')
+
+
+@mock.patch('muranoclient.v1.sessions.time')
+class SessionDeployWaitTest(testtools.TestCase):
+    def setUp(self):
+        super(SessionDeployWaitTest, self).setUp()
+        self.api = mock.Mock()
+        self.statuses = ['deploying', 'deploying', 'ready']
+        self.api.json_request.side_effect = self._request
+        self.manager = sessions.SessionManager(self.api)
+
+    def _request(self, url, method, headers=None):
+        if method == 'POST':
+            return None, None
+        return None, {'id': 'env', 'status': self.statuses.pop(0)}
+
+    def test_deploy_wait(self, mock_time):
+        mock_time.time.return_value = 0
+        environment = self.manager.deploy('env', 'sess', wait=True,
+                                          poll=[1, 2, 4])
+
+        self.assertEqual('ready', environment.status)
+        self.assertEqual([mock.call(1), mock.call(2)],
+                         mock_time.sleep.call_args_list)
+        self.assertEqual(
+            [mock.call('/v1/environments/env/sessions/sess/deploy', 'POST')] +
+            [mock.call('/v1/environments/env', 'GET', headers={})] * 3,
+            self.api.json_request.call_args_list)
+
+    def test_deploy_wait_repeats_last_delay(self, mock_time):
+        mock_time.time.return_value = 0
+        self.statuses = ['deploying'] * 4 + ['ready']
+        environment = self.manager.deploy('env', 'sess', wait=True,
+                                          poll=[0, 3])
+
+        self.assertEqual('ready', environment.status)
+        self.assertEqual([mock.call(0)] + [mock.call(3)] * 3,
+                         mock_time.sleep.call_args_list)
+
+    def test_deploy_wait_timeout(self, mock_time):
+        mock_time.time.side_effect = [0, 1, 3]
+        self.assertRaises(exceptions.WaitTimeout, self.manager.deploy,
+                          'env', 'sess', wait=True, timeout=2.5,
+                          poll=[2, 2])
+        self.assertEqual([mock.call(1.5)], mock_time.sleep.call_args_list)
+
+    def test_deploy_no_wait(self, mock_time):
+        self.assertIsNone(self.manager.deploy('env', 'sess'))
+        self.assertEqual(1, self.api.json_request.call_count)
+        self.assertFalse(mock_time.sleep.called)
@@ -0,0 +1,80 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import tempfile
+
+import mock
+import requests
+import six
+import testtools
+
+from muranoclient.common import multipart
+
+
+class MultipartEncoderTest(testtools.TestCase):
+    def _archive(self, content):
+        archive = tempfile.NamedTemporaryFile()
+        archive.write(content)
+        archive.seek(0)
+        self.addCleanup(archive.close)
+        return archive
+
+    def test_body_matches_requests_encoding(self):
+        archive = self._archive(b'PK\x03\x04' + b'x' * 100000)
+        request = requests.Request(
+            'POST', 'http://murano', files={'pkg': archive},
+            data={'__metadata__': '{"is_public": false}'}).prepare()
+        expected = request.body
+        content_type = request.headers['Content-Type']
+        archive.seek(0)
+
+        body = multipart.MultipartEncoder(
+            fields={'__metadata__': '{"is_public": false}'},
+            files={'pkg': archive},
+            boundary=content_type.split('boundary=')[1])
+
+        self.assertEqual(content_type, body.content_type)
+        self.assertEqual(len(expected), len(body))
+        self.assertEqual(expected, b''.join(body))
+
+    def test_reads_are_bounded(self):
+        archive = self._archive(b'x' * 10000)
+        body = multipart.MultipartEncoder(files={'pkg': archive})
+        sizes = [len(chunk) for chunk in iter(lambda: body.read(1000), b'')]
+
+        self.assertEqual(len(body), sum(sizes))
+        self.assertTrue(all(size <= 1000 for size in sizes))
+
+    def test_filename_from_file_object(self):
+        archive = self._archive(b'data')
+        body = multipart.MultipartEncoder(files={'pkg': archive}).read()
+
+        self.assertIn(b'filename="' + archive.name.split('/')[-1].encode(),
+                      body)
+
+    def test_non_seekable_stream(self):
+        stream = mock.Mock(spec=['read'])
+        stream.read.return_value = b'data'
+        body = multipart.MultipartEncoder(files={'pkg': ('p.zip', stream)})
+
+        self.assertEqual(len(body), len(body.read()))
+
+    def test_progress_callback(self):
+        callback = mock.Mock()
+        body = multipart.MultipartEncoder(
+            files={'pkg': ('p.zip', six.BytesIO(b'x' * 10))},
+            callback=callback)
+        body.read()
+
+        callback.assert_called_with(len(body), len(body))
+        self.assertEqual(len(body), body.bytes_read)
+        self.assertIsNotNone(body.finished)
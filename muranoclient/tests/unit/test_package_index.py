@@ -0,0 +1,143 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+import mock
+from six.moves import urllib
+import testtools
+
+from muranoclient.v1 import package_index
+from muranoclient.v1 import packages
+
+
+def make_package(pkg_id, **kwargs):
+    package = {
+        'id': pkg_id,
+        'name': 'Package {0}'.format(pkg_id),
+        'fully_qualified_name': 'org.example.{0}'.format(pkg_id),
+        'type': 'Application',
+        'owner_id': 'owner',
+        'enabled': True,
+        'class_definitions': ['org.example.{0}'.format(pkg_id)],
+        'tags': [],
+        'categories': [],
+        'updated': '2016-01-01T00:00:00',
+    }
+    package.update(kwargs)
+    return package
+
+
+class PackageIndexTest(testtools.TestCase):
+
+    def setUp(self):
+        super(PackageIndexTest, self).setUp()
+        self.catalog = [
+            make_package('a', tags=['web'], categories=['Web']),
+            make_package('b', type='Library', owner_id='other',
+                         class_definitions=['org.example.b', 'org.base']),
+            make_package('c', enabled=False, tags=['web', 'db']),
+        ]
+        self.page_size = 2
+        self.api = mock.Mock()
+        self.api.json_request.side_effect = self._list
+        self.manager = packages.PackageManager(self.api)
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'index.db')
+        self.index = package_index.PackageIndex(self.manager, path)
+        self.manager.index = self.index
+
+    def _list(self, url, method):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        ids = [p['id'] for p in self.catalog]
+        start = 0
+        if 'marker' in query:
+            start = ids.index(query['marker'][0]) + 1
+        body = {'packages': self.catalog[start:start + self.page_size]}
+        if start + self.page_size < len(self.catalog):
+            body['next_marker'] = ids[start + self.page_size - 1]
+        return mock.Mock(), body
+
+    def _ids(self, **filters):
+        return [p.id for p in self.index.filter(**filters)]
+
+    def test_filters(self):
+        self.assertTrue(self.index.sync())
+        self.assertEqual(['a', 'b'], self._ids())
+        self.assertEqual(['a', 'b', 'c'], self._ids(include_disabled=True))
+        self.assertEqual(['b'], self._ids(fqn='org.example.b'))
+        self.assertEqual(['b'], self._ids(class_name='org.base'))
+        self.assertEqual(['a', 'c'], self._ids(tag='web',
+                                               include_disabled=True))
+        self.assertEqual(['c'], self._ids(tag=['db', 'none'],
+                                          include_disabled=True))
+        self.assertEqual(['a'], self._ids(category='Web'))
+        self.assertEqual(['b'], self._ids(type='Library'))
+        self.assertEqual(['a'], self._ids(owner='owner'))
+        self.assertEqual([], self._ids(fqn='org.example.a', type='Library'))
+        self.assertEqual(2, self.api.json_request.call_count)
+
+    def test_only_changed_packages_rewritten(self):
+        self.index.sync()
+        self.catalog[0]['name'] = 'Renamed'
+        self.catalog[1]['name'] = 'Updated'
+        self.catalog[1]['updated'] = '2016-02-01T00:00:00'
+        self.index.sync()
+        names = dict((p.id, p.name) for p in self.index.filter())
+        self.assertEqual({'a': 'Package a', 'b': 'Updated'}, names)
+
+    def test_removed_packages_dropped_after_walk(self):
+        self.index.sync()
+        del self.catalog[0]
+        self.page_size = 1
+        self.assertFalse(self.index.sync(max_pages=1))
+        self.assertEqual(['a', 'b'], self._ids())
+        self.assertTrue(self.index.sync())
+        self.assertEqual(['b'], self._ids())
+
+    def test_sync_resumed_from_marker(self):
+        self.page_size = 1
+        self.assertFalse(self.index.sync(max_pages=2))
+        self.assertIsNone(self.index.synced_at)
+        self.assertTrue(self.index.sync())
+        urls = [c[0][0] for c in self.api.json_request.call_args_list]
+        self.assertEqual(3, len(urls))
+        self.assertIn('marker=b', urls[2])
+        self.assertIsNotNone(self.index.synced_at)
+
+    def test_synced_when_stale(self):
+        self._ids()
+        self._ids()
+        self.assertEqual(2, self.api.json_request.call_count)
+        self._ids(max_age=-1)
+        self.assertEqual(4, self.api.json_request.call_count)
+        self.index.invalidate()
+        self._ids()
+        self.assertEqual(6, self.api.json_request.call_count)
+
+    def test_manager_filter(self):
+        self.assertEqual(['b'], [p.id for p in self.manager.filter(
+            class_name='org.base', include_disabled=False, owned=False)])
+        self.assertEqual(2, self.api.json_request.call_count)
+
+        # filters the index does not support are sent to the API
+        list(self.manager.filter(search='foo'))
+        self.assertEqual(4, self.api.json_request.call_count)
+        self.assertIn('search=foo', self.api.json_request.call_args[0][0])
+        list(self.manager.filter(owned=True))
+        self.assertEqual(6, self.api.json_request.call_count)
+
+    def test_manager_changes_invalidate(self):
+        self.index.sync()
+        self.manager.delete('a')
+        self.assertTrue(self.index.is_stale())
@@ -19,6 +19,8 @@ import logging
 import os
 import re
 import shutil
+import stat
+import subprocess
 import sys
 import tempfile
 
@@ -34,11 +36,13 @@ import six
 from testtools import matchers
 
 from muranoclient.apiclient import exceptions
+from muranoclient.common import cache
 from muranoclient.common import exceptions as common_exceptions
 from muranoclient.common import utils
 import muranoclient.shell
 from muranoclient.tests.unit import base
 from muranoclient.tests.unit import test_utils
+from muranoclient.v1 import client as v1_client
 from muranoclient.v1 import shell as v1_shell
 
 make_pkg = test_utils.make_pkg
@@ -183,6 +187,34 @@ class ShellCommandTest(ShellTest):
             self.assertThat((stdout + stderr),
                             matchers.MatchesRegex(r, re.DOTALL | re.MULTILINE))
 
+    def test_version(self):
+        stdout, stderr = self.shell('--version')
+        self.assertEqual(str(muranoclient.__version__), stdout.strip())
+
+    def test_startup_imports(self):
+        # NOTE: modules needed by a few commands only should not slow down
+        # start up of all the other ones, see tools/startup_benchmark.py
+        script = (
+            "import sys\n"
+            "import muranoclient.shell\n"
+            "import muranoclient.v1.shell\n"
+            "import muranoclient.v1.client\n"
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in\n"
+            "      ('glanceclient', 'muranopkgcheck', 'setuptools', 'yaql')\n"
+            "      or m in ('pbr.packaging', 'keystoneclient.discover')))\n")
+        output = subprocess.check_output([sys.executable, '-c', script])
+        self.assertEqual(b'[]', output.strip())
+
+    def test_glance_client_created_on_first_use(self):
+        glance_client = mock.Mock()
+        factory = mock.Mock(return_value=glance_client)
+        client = v1_client.Client('http://127.0.0.1', token='token',
+                                  glance_client_factory=factory)
+        self.assertFalse(factory.called)
+        self.assertIs(glance_client, client.glance_client)
+        self.assertIs(glance_client, client.glance_client)
+        factory.assert_called_once_with()
+
     def test_no_username(self):
         required = ('You must provide a username via either --os-username or '
                     'env[OS_USERNAME] or a token via --os-auth-token or '
@@ -238,6 +270,86 @@ class ShellCommandTest(ShellTest):
             include_disabled=False,
             owned=False)
 
+    @mock.patch('muranoclient.v1.packages.PackageManager')
+    @requests_mock.mock()
+    def test_repo_cache_option(self, mock_package_manager, m_requests):
+        self.useFixture(fixtures.MonkeyPatch(
+            'muranoclient.common.utils.File.download_cache', None))
+        self.useFixture(fixtures.MonkeyPatch(
+            'muranoclient.common.utils.Package.validation_cache', None))
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.client.packages = mock_package_manager()
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+        self.shell('--murano-repo-cache {0} --murano-repo-cache-size 10 '
+                   'package-list'.format(cache_dir))
+        download_cache = utils.File.download_cache
+        self.assertEqual(cache_dir, download_cache.cache_dir)
+        self.assertEqual(10 * 1024 * 1024, download_cache.max_size)
+        self.assertEqual(os.path.join(cache_dir, 'validation'),
+                         utils.Package.validation_cache.cache_dir)
+
+    @mock.patch('muranoclient.v1.packages.PackageManager')
+    @requests_mock.mock()
+    def test_auth_cache(self, mock_package_manager, m_requests):
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.client.packages = mock_package_manager()
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+        for _ in range(3):
+            self.shell('--murano-auth-cache {0} package-list'.format(
+                cache_dir))
+        # NOTE: keystone auth plugin runs version discovery on its own
+        self.assertEqual(['GET', 'GET', 'POST'],
+                         [r.method for r in m_requests.request_history])
+
+        self.shell('--murano-auth-cache {0} --os-password other '
+                   'package-list'.format(cache_dir))
+        self.assertEqual(['GET', 'GET', 'POST', 'GET', 'POST'],
+                         [r.method for r in m_requests.request_history])
+
+    @requests_mock.mock()
+    def test_auth_cache_invalidated_on_401(self, m_requests):
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+        m_requests.get('http://no.where/v1/environments',
+                       [{'status_code': 401},
+                        {'json': {'environments': []}},
+                        {'json': {'environments': []}}])
+        self.shell('--murano-auth-cache {0} environment-list'.format(
+            cache_dir))
+        self.shell('--murano-auth-cache {0} environment-list'.format(
+            cache_dir))
+        # discovery, token, rejected request, new token, retried request
+        # and then the second run with the new token
+        self.assertEqual(['GET', 'GET', 'POST', 'GET', 'POST', 'GET', 'GET'],
+                         [r.method for r in m_requests.request_history])
+        self.assertEqual(3, len([r for r in m_requests.request_history
+                                 if r.path == '/v1/environments']))
+
+    @mock.patch('muranoclient.v1.packages.PackageManager')
+    @requests_mock.mock()
+    def test_auth_cache_shared_directory(self, mock_package_manager,
+                                         m_requests):
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        os.chmod(cache_dir, 0o777)
+        self.client.packages = mock_package_manager()
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+        for _ in range(2):
+            self.shell('--murano-auth-cache {0} package-list'.format(
+                cache_dir))
+        # NOTE: discovery and token requests are not cached
+        self.assertEqual(['GET', 'GET', 'POST'] * 2,
+                         [r.method for r in m_requests.request_history])
+        self.assertEqual([], os.listdir(cache_dir))
+        self.assertEqual(0o777, stat.S_IMODE(os.stat(cache_dir).st_mode))
+
     @mock.patch('muranoclient.v1.packages.PackageManager')
     @requests_mock.mock()
     def test_package_list_with_limit(self, mock_package_manager, m_requests):
@@ -249,7 +361,8 @@ class ShellCommandTest(ShellTest):
         self.client.packages.filter.assert_called_once_with(
             include_disabled=False,
             limit=10,
-            owned=False)
+            owned=False,
+            prefetch=0)
 
     @mock.patch('muranoclient.v1.packages.PackageManager')
     @requests_mock.mock()
@@ -357,6 +470,26 @@ class ShellCommandTest(ShellTest):
             mock.call('1234'), mock.call('4321')])
         self.assertEqual(2, self.client.packages.delete.call_count)
 
+    @mock.patch('muranoclient.v1.packages.PackageManager')
+    @requests_mock.mock()
+    def test_package_delete_partial_failure(self, mock_package_manager,
+                                            m_requests):
+        self.client.packages = mock_package_manager()
+
+        def delete(package_id):
+            if package_id == '2':
+                raise common_exceptions.HTTPNotFound()
+
+        self.client.packages.delete.side_effect = delete
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+        stdout, _ = self.shell('package-delete 1 2 3')
+        self.assertEqual(3, self.client.packages.delete.call_count)
+        self.assertIn("Failed to delete '2'; package not found", stdout)
+        self.assertIn("Failed to delete 1 of 3 packages", stdout)
+        self.assertEqual(1, self.client.packages.filter.call_count)
+
     @mock.patch('muranoclient.v1.sessions.SessionManager')
     @requests_mock.mock()
     def test_environment_session_create(self, mock_manager, m_requests):
@@ -541,6 +674,42 @@ class ShellCommandTest(ShellTest):
         self.client.sessions.deploy.assert_called_once_with(
             '12345', '54321')
 
+    @mock.patch('muranoclient.v1.environments.EnvironmentManager')
+    @mock.patch('muranoclient.v1.sessions.SessionManager')
+    @requests_mock.mock()
+    def test_environment_deploy_wait(self, mock_manager, env_manager,
+                                     m_requests):
+        self.client.sessions = mock_manager()
+        self.client.environments = env_manager()
+        self.client.sessions.deploy.return_value.status = 'ready'
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+        _, stderr = self.shell('environment-deploy 12345 --session-id 54321 '
+                               '--wait')
+        self.client.sessions.deploy.assert_called_once_with(
+            '12345', '54321', wait=True, timeout=None)
+        self.assertIn("Environment 12345 finished deploying with status "
+                      "'ready' in ", stderr)
+        self.assertEqual(1, self.client.environments.get.call_count)
+
+        self.client.sessions.deploy.return_value.status = 'deploy failure'
+        ex = self.assertRaises(exceptions.CommandError, self.shell,
+                               'environment-deploy 12345 --session-id 54321 '
+                               '--timeout 60')
+        self.assertIn("Environment 12345 finished deploying with status "
+                      "'deploy failure' in ", six.text_type(ex))
+        self.client.sessions.deploy.assert_called_with(
+            '12345', '54321', wait=True, timeout=60)
+        self.assertEqual(1, self.client.environments.get.call_count)
+
+        self.client.sessions.deploy.side_effect = \
+            common_exceptions.WaitTimeout('timed out')
+        ex = self.assertRaises(exceptions.CommandError, self.shell,
+                               'environment-deploy 12345 --session-id 54321 '
+                               '--timeout 1')
+        self.assertEqual('timed out', six.text_type(ex))
+
     @mock.patch('muranoclient.v1.environments.EnvironmentManager')
     @requests_mock.mock()
     def test_environment_show_session(self, mock_manager, m_requests):
@@ -816,6 +985,48 @@ class ShellCommandTest(ShellTest):
             name='env-id-or-name')
         self.assertEqual(1, self.client.deployments.list.call_count)
 
+    @mock.patch('muranoclient.v1.environments.EnvironmentManager')
+    @mock.patch('muranoclient.v1.deployments.DeploymentManager')
+    @requests_mock.mock()
+    def test_deployment_watch(self, mock_deployment_manager, mock_env_manager,
+                              m_requests):
+        self.client.deployments = mock_deployment_manager()
+        self.client.environments = mock_env_manager()
+        self.client.environments.find.return_value.id = 'env-id'
+        self.client.deployments.list.return_value = [
+            mock.Mock(id='old', created='2016-01-01T00:00:00'),
+            mock.Mock(id='latest', created='2016-01-02T00:00:00')]
+        watch = self.client.deployments.watch.return_value
+        watch.__iter__ = mock.Mock(return_value=iter([
+            mock.Mock(created='2016-01-02T00:00:01', level='info',
+                      text='Deploying')]))
+        watch.deployment.state = 'success'
+        watch.elapsed = 12.34
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.register_keystone_token_fixture(m_requests)
+
+        stdout, _ = self.shell('deployment-watch env-name --timeout 60')
+
+        self.client.deployments.watch.assert_called_once_with(
+            'env-id', 'latest', interval=1, max_interval=30, timeout=60)
+        self.assertIn('2016-01-02T00:00:01 info    Deploying', stdout)
+        self.assertIn("Deployment latest finished with state 'success' in "
+                      "12.3s", stdout)
+
+        watch.__iter__ = mock.Mock(return_value=iter([]))
+        watch.deployment.state = 'completed_w_errors'
+        self.assertRaises(exceptions.CommandError, self.shell,
+                          'deployment-watch env-name dep-id')
+
+        self.client.deployments.watch.side_effect = ValueError(
+            'Polling interval must be positive, got 0.0')
+        ex = self.assertRaises(exceptions.CommandError, self.shell,
+                               'deployment-watch env-name dep-id '
+                               '--interval 0')
+        self.assertEqual('Polling interval must be positive, got 0.0',
+                         six.text_type(ex))
+
     @mock.patch('muranoclient.v1.services.ServiceManager')
     @mock.patch('muranoclient.v1.environments.EnvironmentManager')
     @requests_mock.mock()
@@ -1565,6 +1776,29 @@ class ShellPackagesOperations(ShellCommandTest):
 
         shutil.rmtree(tmp_dir)
 
+    @requests_mock.mock()
+    def test_package_save_cached(self, m):
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(fixtures.MonkeyPatch(
+            'muranoclient.common.utils.File.download_cache',
+            cache.DownloadCache(cache_dir)))
+        args = TestArgs()
+        args.package = ["test_app1"]
+        pkg = make_pkg({'FullName': 'test_app1'}).getvalue()
+        url = TestArgs.murano_repo_url + '/apps/test_app1.zip'
+        m.get(url, content=pkg, headers={'ETag': '"1"'})
+
+        args.path = self.useFixture(fixtures.TempDir()).path
+        v1_shell.do_package_save(self.client, args)
+        m.get(url, status_code=304)
+        args.path = self.useFixture(fixtures.TempDir()).path
+        v1_shell.do_package_save(self.client, args)
+
+        self.assertEqual('"1"', m.last_request.headers['If-None-Match'])
+        with open(os.path.join(args.path, 'test_app1.zip'), 'rb') as saved:
+            self.assertEqual(pkg, saved.read())
+        self.assertEqual(1, utils.File.download_cache.hits)
+
 
 class ShellPackagesOperationsV3(ShellPackagesOperations):
     def make_env(self, exclude=None, fake_env=FAKE_ENV):
@@ -0,0 +1,121 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import requests
+import six
+import testtools
+
+from muranoclient.common import http
+from muranoclient.common import tracing
+from muranoclient.tests.unit import fakes
+
+
+class ListSink(object):
+    def __init__(self, enabled=True):
+        self.is_enabled = enabled
+        self.traces = []
+
+    def enabled(self):
+        return self.is_enabled
+
+    def request(self, trace):
+        self.traces.append(trace)
+
+    def response(self, trace):
+        pass
+
+
+class TracerTest(testtools.TestCase):
+
+    def test_disabled_sinks_do_no_work(self):
+        tracer = tracing.Tracer([ListSink(enabled=False)])
+        with mock.patch.object(tracing, 'Trace') as mock_trace:
+            self.assertIsNone(tracer.start('GET', '/', {}))
+            tracer.finish(None, mock.Mock())
+        self.assertFalse(mock_trace.called)
+
+    @mock.patch('muranoclient.common.tracing.random.random')
+    def test_sampling(self, mock_random):
+        sink = ListSink()
+        tracer = tracing.Tracer([sink], sample_rate=0.5)
+        mock_random.return_value = 0.7
+        self.assertIsNone(tracer.start('GET', '/', {}))
+        mock_random.return_value = 0.2
+        self.assertIsNotNone(tracer.start('GET', '/', {}))
+        self.assertEqual(1, len(sink.traces))
+
+    def test_token_hashed(self):
+        trace = tracing.Trace('GET', 'http://example.com',
+                              {'X-Auth-Token': 'secret'})
+        self.assertNotIn('secret', trace.format_request())
+        self.assertIn('{SHA1}', trace.format_request())
+
+    def test_body_truncated(self):
+        trace = tracing.Trace('POST', 'http://example.com', {},
+                              body='x' * 100, max_body_bytes=10)
+        self.assertEqual('x' * 10 + '... (truncated)', trace.body)
+
+    def test_body_truncated_inside_character(self):
+        body = ('{"name": "' + u'\xe9' * 3000 + '"}').encode('utf-8')
+        for max_bytes in (1024, 1025):
+            captured = tracing.capture_body(body, max_bytes)
+            self.assertTrue(captured.startswith(u'{"name": "\xe9\xe9'))
+            self.assertTrue(captured.endswith(u'\xe9... (truncated)'))
+
+    def test_file_body_not_read(self):
+        body = mock.Mock()
+        trace = tracing.Trace('POST', 'http://example.com', {}, body=body)
+        self.assertEqual(tracing.STREAMED_BODY, trace.body)
+        self.assertFalse(body.read.called)
+
+    def test_streamed_response_not_consumed(self):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.raw = six.BytesIO(b'archive')
+        trace = tracing.Trace('GET', 'http://example.com', {})
+        trace.set_response(resp)
+        self.assertEqual(tracing.STREAMED_BODY, trace.response_body)
+        self.assertEqual(b'archive', resp.raw.read())
+
+    def test_response_body_truncated(self):
+        resp = fakes.FakeHTTPResponse(200, 'OK', {}, b'y' * 100)
+        trace = tracing.Trace('GET', 'http://example.com', {},
+                              max_body_bytes=10)
+        trace.set_response(resp)
+        self.assertEqual('y' * 10 + '... (truncated)', trace.response_body)
+
+
+@mock.patch('muranoclient.common.http.requests.Session.request')
+class HttpClientTracingTest(testtools.TestCase):
+
+    def test_request_traced(self, mock_request):
+        mock_request.return_value = fakes.FakeHTTPResponse(
+            200, 'OK', {'content-type': 'application/json'}, b'{}')
+        sink = ListSink()
+        client = http.HTTPClient('http://example.com:8082',
+                                 tracer=tracing.Tracer([sink]))
+        client.json_request('/v1/foo', 'GET')
+        trace = sink.traces[0]
+        self.assertEqual('http://example.com:8082/v1/foo', trace.url)
+        self.assertEqual(200, trace.status_code)
+        self.assertEqual('{}', trace.response_body)
+
+    def test_no_body_capture_without_log(self, mock_request):
+        mock_request.return_value = fakes.FakeHTTPResponse(
+            200, 'OK', {}, b'archive')
+        sink = ListSink()
+        client = http.HTTPClient('http://example.com:8082',
+                                 tracer=tracing.Tracer([sink]))
+        client.request('/v1/foo', 'GET', log=False)
+        self.assertIsNone(sink.traces[0].response_body)
@@ -13,11 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import json
 import os.path
+import shutil
 import tempfile
+import threading
 import zipfile
 
+import fixtures
 import mock
 import requests
 import requests_mock
@@ -25,6 +29,9 @@ import six
 import testtools
 import yaml
 
+from muranoclient.apiclient import exceptions as apiclient_exceptions
+from muranoclient.common import cache
+from muranoclient.common import exceptions
 from muranoclient.common import utils
 
 
@@ -53,6 +60,53 @@ class FileTest(testtools.TestCase):
             f = utils.File("http://127.0.0.1")
             self.assertRaises(ValueError, f.open)
 
+    def _make_dir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        os.mkdir(os.path.join(path, 'Classes'))
+        with open(os.path.join(path, 'manifest.yaml'), 'w') as manifest:
+            manifest.write('FullName: org.foo\n')
+        with open(os.path.join(path, 'Classes', 'foo.yaml'), 'w') as klass:
+            klass.write('Name: foo\n')
+        self.addCleanup(utils._dir_archives.clear)
+        return path
+
+    @mock.patch('muranoclient.common.utils._zip_tree',
+                side_effect=utils._zip_tree)
+    def test_directory_archive_cached(self, zip_tree):
+        path = self._make_dir()
+        first = utils.File(path).open().read()
+        second = utils.File(path).open().read()
+
+        self.assertEqual(1, zip_tree.call_count)
+        self.assertEqual(first, second)
+        self.assertEqual(
+            ['Classes/foo.yaml', 'manifest.yaml'],
+            sorted(zipfile.ZipFile(six.BytesIO(first)).namelist()))
+
+    @mock.patch('muranoclient.common.utils._zip_tree',
+                side_effect=utils._zip_tree)
+    def test_directory_archive_rebuilt_on_change(self, zip_tree):
+        path = self._make_dir()
+        utils.File(path).open()
+        with open(os.path.join(path, 'manifest.yaml'), 'a') as manifest:
+            manifest.write('Name: foo\n')
+        archive = zipfile.ZipFile(utils.File(path).open())
+
+        self.assertEqual(2, zip_tree.call_count)
+        self.assertIn(b'Name: foo', archive.read('manifest.yaml'))
+
+    def test_directory_archive_in_memory(self):
+        path = self._make_dir()
+        self.assertIsInstance(utils.File(path).open(), six.BytesIO)
+
+        utils._dir_archives.clear()
+        archive = utils.File(path, dir_memory_limit=0).open()
+        self.addCleanup(archive.close)
+        self.assertNotIsInstance(archive, six.BytesIO)
+        self.assertEqual(['Classes/foo.yaml', 'manifest.yaml'],
+                         sorted(zipfile.ZipFile(archive).namelist()))
+
     def test_file_object_url(self):
         resp = requests.Response()
         resp.raw = six.BytesIO(six.b("123"))
@@ -186,6 +240,50 @@ class PackageTest(testtools.TestCase):
             {'main_app': app, 'dep_app': mock.ANY, 'dep_of_dep': mock.ANY},
             reqs)
 
+    @mock.patch('muranoclient.common.utils.Package.from_location')
+    def test_requirements_loaded_concurrently(self, from_location):
+        """Test that dependencies are loaded in parallel and only once."""
+        pkgs = {
+            'd1': make_pkg({'FullName': 'd1', 'Require': {'d3': None}}),
+            'd2': make_pkg({'FullName': 'd2', 'Require': {'d3': None}}),
+            'd3': make_pkg({'FullName': 'd3'}),
+        }
+        d2_started = threading.Event()
+
+        def side_effect(name, **kwargs):
+            if name == 'd2':
+                d2_started.set()
+            elif name == 'd1':
+                # NOTE: d1 can only be loaded while d2 is being loaded
+                self.assertTrue(d2_started.wait(5))
+            return utils.Package(utils.File(pkgs[name]))
+
+        from_location.side_effect = side_effect
+        app = utils.Package.from_file(make_pkg(
+            {'FullName': 'M', 'Require': {'d1': None, 'd2': None}}))
+        reqs = app.requirements(base_url=self.base_url)
+
+        names = list(reqs)
+        self.assertEqual(['d3', 'M'], [names[0], names[-1]])
+        self.assertEqual(set(['d1', 'd2']), set(names[1:3]))
+        self.assertEqual(3, from_location.call_count)
+        self.assertEqual(set(['d1', 'd2', 'd3']),
+                         set(app.dependency_timings))
+
+    @mock.patch('muranoclient.common.utils.Package.from_location')
+    def test_requirements_broken_dependency_skipped(self, from_location):
+        def side_effect(name, **kwargs):
+            if name == 'broken':
+                raise ValueError("Can't open broken")
+            return utils.Package(utils.File(make_pkg({'FullName': name})))
+
+        from_location.side_effect = side_effect
+        app = utils.Package.from_file(make_pkg(
+            {'FullName': 'M', 'Require': {'broken': None, 'd1': None}}))
+        reqs = app.requirements(base_url=self.base_url, workers=2)
+
+        self.assertEqual(['d1', 'M'], list(reqs))
+
     @mock.patch('muranoclient.common.utils.Package.from_file')
     def test_requirements_order(self, from_file):
         """Test that dependencies are parsed in correct order."""
@@ -400,6 +498,63 @@ class PackageTest(testtools.TestCase):
             set(['test.qcow2', 'test2.qcow2']),
             set([img['Name'] for img in app.images()]))
 
+    def test_contents_read_in_place(self):
+        pkg_file = make_pkg({})
+        app = utils.Package.from_file(pkg_file)
+
+        # NOTE: File wraps passed file objects into NoCloseProxy
+        self.assertIs(pkg_file, app.contents.fp.obj)
+        self.assertIs(app.contents, app.contents)
+
+    def test_members_and_images_memoized(self):
+        app = utils.Package.from_file(
+            make_pkg({}, [{'Name': 'test.qcow2'}]))
+        self.assertIn('images.lst', app.members)
+        self.assertIs(app.members, app.members)
+        self.assertIs(app.images(), app.images())
+
+    def test_package_file_after_contents(self):
+        pkg_file = make_pkg({})
+        data = pkg_file.getvalue()
+        app = utils.Package.from_file(pkg_file)
+        self.assertEqual('org.foo', app.manifest['FullName'])
+        self.assertEqual(data, app.file().read())
+        self.assertIsNone(app.ui)
+
+    @mock.patch('muranoclient.common.utils.Package._validate')
+    def test_validation_cached(self, validate):
+        self.useFixture(fixtures.MonkeyPatch(
+            'muranoclient.common.utils.Package.validation_cache',
+            cache.ValidationCache()))
+        validate.return_value = None
+        archive = make_pkg({}).getvalue()
+        utils.Package.from_file(six.BytesIO(archive))
+        utils.Package.from_file(six.BytesIO(archive))
+        self.assertEqual(1, validate.call_count)
+
+        validate.return_value = 'Invalid Murano package'
+        archive = make_pkg({'FullName': 'org.bar'}).getvalue()
+        self.assertRaises(exceptions.HTTPBadRequest, utils.Package.from_file,
+                          six.BytesIO(archive))
+        self.assertRaises(exceptions.HTTPBadRequest, utils.Package.from_file,
+                          six.BytesIO(archive))
+        self.assertEqual(2, validate.call_count)
+
+    def test_opened_zip_loader(self):
+        contents = zipfile.ZipFile(make_pkg({}))
+        loader = utils._opened_zip_loader()(contents)
+        self.assertIs(contents, loader.path)
+        self.assertTrue(loader.exists('manifest.yaml'))
+        self.assertIn('manifest.yaml', loader.list_files())
+        with loader.open_file('manifest.yaml') as manifest:
+            self.assertEqual('org.foo',
+                             yaml.safe_load(manifest)['FullName'])
+        self.assertIs(utils._opened_zip_loader(), type(loader))
+
+    def test_invalid_archive(self):
+        self.assertRaises(zipfile.BadZipfile, utils.Package.from_file,
+                          six.BytesIO(b'not a zip'))
+
     def test_file_object_repo_fails(self):
         resp = requests.Response()
         resp.raw = six.BytesIO(six.b("123"))
@@ -461,6 +616,149 @@ class BundleTest(testtools.TestCase):
         )
 
 
+class YaqlYamlLoaderTest(testtools.TestCase):
+
+    document = """
+Name: $.name
+Expression: !yaql "$.foo"
+Plain: plain text
+Values: [1, 2.5, true, null]
+"""
+
+    def test_libyaml_used_if_available(self):
+        if yaml.__with_libyaml__:
+            self.assertTrue(issubclass(utils.YaqlYamlLoader,
+                                       yaml.CSafeLoader))
+            self.assertTrue(issubclass(utils.DummyYaqlYamlLoader,
+                                       yaml.CSafeLoader))
+        else:
+            self.assertIs(yaml.SafeLoader, utils.SafeLoader)
+
+    def test_yaql_loader(self):
+        result = yaml.load(self.document, utils.YaqlYamlLoader)
+        self.assertIsInstance(result['Name'], utils.YaqlExpression)
+        self.assertIsInstance(result['Expression'], utils.YaqlExpression)
+        self.assertEqual('$.foo', str(result['Expression']))
+        self.assertEqual('plain text', result['Plain'])
+        self.assertEqual([1, 2.5, True, None], result['Values'])
+
+    def test_dummy_yaql_loader(self):
+        result = yaml.load(self.document, utils.DummyYaqlYamlLoader)
+        self.assertEqual({'Name': '$.name', 'Expression': '$.foo',
+                          'Plain': 'plain text',
+                          'Values': [1, 2.5, True, None]}, result)
+
+    def test_unsafe_tags_rejected(self):
+        self.assertRaises(yaml.YAMLError, yaml.load,
+                          '!!python/object/apply:os.system ["true"]',
+                          utils.YaqlYamlLoader)
+
+
+class PrefetchTest(testtools.TestCase):
+
+    def _produce(self, count, produced):
+        for i in range(count):
+            produced.append(i)
+            yield i
+
+    def test_items_in_order(self):
+        for lookahead in (0, 1, 5):
+            self.assertEqual(list(range(10)), list(utils.prefetch(
+                self._produce(10, []), lookahead)))
+
+    def test_lookahead_bounded(self):
+        produced = []
+        items = utils.prefetch(self._produce(10, produced), lookahead=2)
+        self.assertEqual(0, next(items))
+        # NOTE: give the producer a chance to run ahead too far
+        for _ in range(50):
+            if len(produced) == 3:
+                break
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.05)
+        self.assertEqual([0, 1, 2], produced)
+        items.close()
+
+    def test_producer_stops_when_closed(self):
+        produced = []
+        items = utils.prefetch(self._produce(100, produced), lookahead=1)
+        next(items)
+        items.close()
+        threading.Event().wait(0.05)
+        self.assertLessEqual(len(produced), 2)
+
+    def test_errors_reraised(self):
+        def produce():
+            yield 1
+            raise ValueError('page 2')
+
+        items = utils.prefetch(produce())
+        self.assertEqual(1, next(items))
+        self.assertRaises(ValueError, next, items)
+
+
+class BulkTest(testtools.TestCase):
+
+    @mock.patch('sys.stdout', new_callable=six.StringIO)
+    def test_bulk_delete(self, stdout):
+        deleted = []
+
+        def delete(item):
+            if item == 'missing':
+                raise exceptions.HTTPNotFound()
+            if item == 'forbidden':
+                raise exceptions.HTTPForbidden()
+            deleted.append(item)
+
+        results = utils.bulk_delete(delete,
+                                    ['id1', 'missing', 'forbidden', 'id2'],
+                                    'thing', 'things')
+        self.assertEqual(['id1', 'id2'], sorted(deleted))
+        self.assertEqual([False, True, True, False],
+                         [r.error is not None for r in results])
+        output = stdout.getvalue()
+        self.assertIn("Deleted thing 'id1'", output)
+        self.assertIn("Failed to delete 'missing'; thing not found", output)
+        self.assertIn("Failed to delete 'forbidden'; ", output)
+        self.assertIn("Failed to delete 2 of 4 things", output)
+
+    @mock.patch('sys.stdout', new_callable=six.StringIO)
+    def test_bulk_delete_found_once(self, stdout):
+        manager = mock.Mock()
+        resources = {'name': mock.Mock(id='id1'), 'id1': mock.Mock(id='id1')}
+        results = utils.bulk_delete(manager.delete, ['name', 'id1'],
+                                    'thing', 'things', find=resources.get)
+        manager.delete.assert_called_once_with('id1')
+        self.assertEqual(['name', 'id1'], [r.item for r in results])
+        self.assertEqual([None, None], [r.error for r in results])
+
+    @mock.patch('sys.stdout', new_callable=six.StringIO)
+    def test_bulk_delete_all_failed(self, stdout):
+        manager = mock.Mock()
+        manager.delete.side_effect = exceptions.HTTPNotFound()
+        ex = self.assertRaises(apiclient_exceptions.CommandError,
+                               utils.bulk_delete, manager.delete,
+                               ['id1', 'id2'], 'thing', 'things')
+        self.assertEqual(
+            'Unable to find and delete any of the specified things.',
+            six.text_type(ex))
+        self.assertEqual(2, manager.delete.call_count)
+
+
+class BackoffTest(testtools.TestCase):
+
+    def test_backoff(self):
+        delays = list(itertools.islice(
+            utils.backoff(initial=1, maximum=10, factor=2, jitter=0.5), 6))
+        for delay, maximum in zip(delays, [1, 2, 4, 8, 10, 10]):
+            self.assertLessEqual(delay, maximum)
+            self.assertGreaterEqual(delay, maximum * 0.5)
+
+    def test_backoff_without_jitter(self):
+        self.assertEqual([1, 3, 9, 20], list(itertools.islice(
+            utils.backoff(initial=1, maximum=20, factor=3, jitter=0), 4)))
+
+
 class TraverseTest(testtools.TestCase):
 
     def test_traverse_and_replace(self):
@@ -0,0 +1,104 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import subprocess
+import sys
+import threading
+
+import fixtures
+import mock
+import testtools
+
+from muranoclient.common import cache
+from muranoclient.common import utils
+from muranoclient.common import yaqlexpression
+from muranoclient.common import yaqlexpression_legacy
+
+
+class YaqlExpressionTest(testtools.TestCase):
+
+    def setUp(self):
+        super(YaqlExpressionTest, self).setUp()
+        engine = yaqlexpression.get_engine()
+        self.errors = engine.errors
+        self.parse = mock.Mock(side_effect=engine.parse)
+        patcher = mock.patch.object(
+            engine, 'cache',
+            cache.ParseCache(self.parse, engine.errors, max_entries=10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_plain_strings_not_parsed(self):
+        self.assertFalse(utils.YaqlExpression.match('some.name: 42'))
+        self.assertFalse(utils.YaqlExpression.match(42))
+        self.assertFalse(self.parse.called)
+
+    def test_expressions_without_context_reference(self):
+        for expr in ('a-b', '[1, 2]'):
+            self.assertTrue(utils.YaqlExpression.match(expr))
+        self.assertEqual(2, self.parse.call_count)
+
+    def test_match_and_construction_parse_once(self):
+        self.assertTrue(utils.YaqlExpression.match('$.foo'))
+        self.assertTrue(utils.YaqlExpression.match('$.foo'))
+        expression = utils.YaqlExpression('$.foo')
+
+        self.assertEqual('$.foo', expression.expression())
+        self.parse.assert_called_once_with('$.foo')
+        self.assertEqual({'entries': 1, 'hits': 2, 'misses': 1,
+                          'evictions': 0},
+                         utils.YaqlExpression.cache_stats())
+
+    def test_invalid_expression_remembered(self):
+        self.assertFalse(utils.YaqlExpression.match('$.foo('))
+        self.assertFalse(utils.YaqlExpression.match('$.foo('))
+        self.assertEqual(1, self.parse.call_count)
+        self.assertRaises(self.errors, utils.YaqlExpression, '$.foo(')
+
+    def test_legacy_module_shares_implementation(self):
+        self.assertIs(yaqlexpression.YaqlExpression,
+                      yaqlexpression_legacy.YaqlExpression)
+        self.assertIs(yaqlexpression.YaqlExpression, utils.YaqlExpression)
+
+
+class YaqlEngineTest(testtools.TestCase):
+
+    def test_engine_created_once(self):
+        engines = []
+        self.useFixture(fixtures.MonkeyPatch(
+            'muranoclient.common.yaqlexpression._engine', None))
+        with mock.patch.object(yaqlexpression, 'Engine',
+                               side_effect=lambda: object()) as engine:
+            threads = [threading.Thread(
+                target=lambda: engines.append(yaqlexpression.get_engine()))
+                for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(1, engine.call_count)
+        self.assertEqual(1, len(set(id(e) for e in engines)))
+
+    def test_yaql_not_imported_on_startup(self):
+        # NOTE: commands which do not parse classes should not pay for
+        # importing yaql and building its engine
+        script = (
+            "import sys\n"
+            "import muranoclient.shell\n"
+            "import muranoclient.v1.shell\n"
+            "from muranoclient.osc.v1 import environment\n"
+            "print('yaql' in sys.modules)\n"
+            "from muranoclient.common import utils\n"
+            "utils.YaqlExpression('$.foo')\n"
+            "print('yaql' in sys.modules)\n")
+        output = subprocess.check_output([sys.executable, '-c', script])
+        self.assertEqual([b'False', b'True'], output.split())
@@ -13,8 +13,9 @@
 # under the License.
 
 import collections
+import hashlib
 
-from glanceclient import exc as glance_exc
+from oslo_utils import importutils
 import six
 import yaml
 
@@ -25,6 +26,7 @@ from muranoclient.i18n import _
 
 def rewrap_http_exceptions(func):
     def inner(*args, **kwargs):
+        glance_exc = importutils.import_module('glanceclient.exc')
         try:
             return func(*args, **kwargs)
         except glance_exc.HTTPException as e:
@@ -210,7 +212,7 @@ class ArtifactRepo(object):
         ui_stream = "".join(
             self.client.artifacts.download_blob(app_id, 'ui_definition'))
         if loader_cls is None:
-            loader_cls = yaml.SafeLoader
+            loader_cls = utils.SafeLoader
         return yaml.load(ui_stream, loader_cls)
 
     def get_logo(self, app_id):
@@ -296,7 +298,38 @@ class PackageManagerAdapter(object):
 
     @rewrap_http_exceptions
     def download(self, app_id):
-        return "".join(self.glare.download(app_id))
+        archive = six.BytesIO()
+        self.download_to(app_id, archive)
+        return archive.getvalue()
+
+    @rewrap_http_exceptions
+    def download_to(self, app_id, dst, checksum=None):
+        """Stream package archive to a file object or a file path.
+
+        :returns: number of bytes written
+        """
+        md5 = hashlib.md5()
+        written = 0
+        blob = self.glare.download(app_id)
+        with utils.open_destination(dst) as fileobj:
+            try:
+                for chunk in blob:
+                    fileobj.write(chunk)
+                    md5.update(chunk)
+                    written += len(chunk)
+            except IOError as e:
+                # NOTE: glanceclient reports md5 mismatch with IOError
+                raise exc.DownloadError(six.text_type(e))
+        expected = len(blob) if hasattr(blob, '__len__') else 0
+        if expected and written != expected:
+            raise exc.DownloadError(
+                "Downloaded {0} bytes of package {1}, expected {2}".format(
+                    written, app_id, expected))
+        if checksum is not None and md5.hexdigest() != checksum:
+            raise exc.DownloadError(
+                "Checksum of package {0} is {1}, expected {2}".format(
+                    app_id, md5.hexdigest(), checksum))
+        return written
 
     @rewrap_http_exceptions
     def get_logo(self, app_id):
@@ -19,6 +19,8 @@ from muranoclient.common import base
 
 
 class Category(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return "<Category %s>" % self._info
 
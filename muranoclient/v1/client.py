@@ -19,6 +19,7 @@ from muranoclient.v1 import categories
 from muranoclient.v1 import deployments
 from muranoclient.v1 import environments
 from muranoclient.v1 import instance_statistics
+from muranoclient.v1 import package_index
 from muranoclient.v1 import packages
 from muranoclient.v1 import request_statistics
 from muranoclient.v1 import schemas
@@ -35,13 +36,38 @@ class Client(object):
     :param string token: Token for authentication.
     :param integer timeout: Allows customization of the timeout for client
                             http requests. (optional)
+    :param integer pool_connections: Number of per-host connection pools
+                                     shared between clients. (optional)
+    :param integer pool_maxsize: Maximum number of keep-alive connections
+                                 per host. (optional)
+    :param integer pool_idle_timeout: Seconds after which idle keep-alive
+                                      connections are dropped. (optional)
+    :param cache: muranoclient.common.cache.ResponseCache used to revalidate
+                  GET requests with ETag/Last-Modified. (optional)
+    :param tracer: muranoclient.common.tracing.Tracer receiving traces of
+                   sent requests. (optional)
+    :param glance_client: glanceclient client used to upload images.
+                          (optional)
+    :param glance_client_factory: callable creating the glance client on
+                                  first access of glance_client, used
+                                  instead of glance_client. (optional)
+    :param package_index: path of a local package index file answering
+                          package filters. (optional)
+    :param package_index_max_age: seconds after which the package index
+                                  is synced before it is queried.
+                                  (optional)
     """
 
     def __init__(self, *args, **kwargs):
         """Initialize a new client for the Murano v1 API."""
-        self.glance_client = kwargs.pop('glance_client', None)
+        self._glance_client = kwargs.pop('glance_client', None)
+        self._glance_client_factory = kwargs.pop('glance_client_factory',
+                                                 None)
         tenant = kwargs.pop('tenant', None)
         artifacts_client = kwargs.pop('artifacts_client', None)
+        index_path = kwargs.pop('package_index', None)
+        index_max_age = kwargs.pop('package_index_max_age',
+                                   package_index.DEFAULT_MAX_AGE)
         self.http_client = http._construct_http_client(*args, **kwargs)
         self.environments = environments.EnvironmentManager(self.http_client)
         self.env_templates = templates.EnvTemplateManager(self.http_client)
@@ -54,6 +80,9 @@ class Client(object):
         self.instance_statistics = \
             instance_statistics.InstanceStatisticsManager(self.http_client)
         pkg_mgr = packages.PackageManager(self.http_client)
+        if index_path:
+            pkg_mgr.index = package_index.PackageIndex(
+                pkg_mgr, index_path, max_age=index_max_age)
         if artifacts_client:
             artifact_repo = artifact_packages.ArtifactRepo(artifacts_client,
                                                            tenant)
@@ -65,3 +94,15 @@ class Client(object):
         self.static_actions = static_actions.StaticActionManager(
             self.http_client)
         self.categories = categories.CategoryManager(self.http_client)
+
+    @property
+    def glance_client(self):
+        if self._glance_client is None and self._glance_client_factory:
+            self._glance_client = self._glance_client_factory()
+            self._glance_client_factory = None
+        return self._glance_client
+
+    @glance_client.setter
+    def glance_client(self, value):
+        self._glance_client = value
+        self._glance_client_factory = None
@@ -12,10 +12,28 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import heapq
+import time
+
+from six.moves import urllib
+
+from muranoclient.apiclient import exceptions
 from muranoclient.common import base
+from muranoclient.common import exceptions as common_exceptions
+
+# states of deployments which are not going to change anymore
+TERMINAL_STATES = frozenset(['success', 'completed_w_errors'])
+
+WATCH_INTERVAL = 1  # seconds
+WATCH_MAX_INTERVAL = 30  # seconds
+WATCH_BACKOFF = 2
+
+REPORTS_CONCURRENCY = 8
 
 
 class Deployment(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return '<Deployment %s>' % self._info
 
@@ -24,6 +42,8 @@ class Deployment(base.Resource):
 
 
 class Status(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return '<Status %s>' % self._info
 
@@ -31,21 +51,191 @@ class Status(base.Resource):
         return self.manager.data(self, **kwargs)
 
 
+def _merge_reports(streams):
+    """Merge streams of reports ordered by creation time."""
+    def decorated(index, reports):
+        # NOTE: index and position order reports created at the same time
+        # and keep the reports themselves from being compared
+        for position, report in enumerate(reports):
+            yield (getattr(report, 'created', None) or '', index, position,
+                   report)
+
+    merged = heapq.merge(*[decorated(index, reports)
+                           for index, reports in enumerate(streams)])
+    return (item[-1] for item in merged)
+
+
+def _report_key(report):
+    report_id = getattr(report, 'id', None)
+    if report_id is not None:
+        return report_id
+    return (getattr(report, 'created', None), getattr(report, 'text', None))
+
+
+class DeploymentWatch(object):
+    """Iterator over new reports of a deployment until it finishes.
+
+    The deployment and its reports are polled, every poll yields the
+    reports which were not seen before. The API has no filter for new
+    reports, so they are picked by their ids from the whole list, which
+    is decoded incrementally. The polling interval starts at
+    ``interval``, grows by ``backoff`` times after every poll without new
+    reports up to ``max_interval``, and drops back to ``interval`` when
+    new reports arrive. The iteration stops once the deployment reaches
+    one of TERMINAL_STATES and its last reports have been yielded.
+
+    After the iteration ``deployment`` holds the finished deployment and
+    ``elapsed`` the seconds it took since the iteration started.
+
+    :param timeout: seconds to wait for the deployment, WaitTimeout is
+                    raised when they run out (optional)
+    :raises ValueError: if interval is not positive or max_interval is
+                        less than interval
+    """
+
+    def __init__(self, manager, environment_id, deployment_id,
+                 service_ids=(), interval=WATCH_INTERVAL,
+                 max_interval=WATCH_MAX_INTERVAL, backoff=WATCH_BACKOFF,
+                 timeout=None):
+        if interval <= 0:
+            raise ValueError("Polling interval must be positive, got "
+                             "{0}".format(interval))
+        if max_interval < interval:
+            raise ValueError("Maximum polling interval {0} is less than "
+                             "the interval {1}".format(max_interval,
+                                                       interval))
+        self.manager = manager
+        self.environment_id = environment_id
+        self.deployment_id = deployment_id
+        self.service_ids = service_ids
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.deployment = None
+        self.elapsed = None
+
+    @property
+    def finished(self):
+        return (self.deployment is not None and
+                self.deployment.state in TERMINAL_STATES)
+
+    def __iter__(self):
+        started = time.time()
+        interval = self.interval
+        seen = set()
+        while True:
+            # NOTE: the state is fetched before the reports, so that the
+            # reports of a finished deployment are complete
+            self.deployment = self.manager.get(self.environment_id,
+                                               self.deployment_id)
+            new = 0
+            for report in self.manager.reports(self.environment_id,
+                                               self.deployment_id,
+                                               *self.service_ids,
+                                               stream=True):
+                key = _report_key(report)
+                if key in seen:
+                    continue
+                seen.add(key)
+                new += 1
+                yield report
+            self.elapsed = time.time() - started
+            if self.finished:
+                return
+
+            if new:
+                interval = self.interval
+            if self.timeout is not None:
+                remaining = self.timeout - self.elapsed
+                if remaining <= 0:
+                    raise common_exceptions.WaitTimeout(
+                        "Deployment {0} did not finish in {1} seconds"
+                        .format(self.deployment_id, self.timeout))
+                time.sleep(min(interval, remaining))
+            else:
+                time.sleep(interval)
+            if not new:
+                interval = min(interval * self.backoff, self.max_interval)
+
+
 class DeploymentManager(base.Manager):
     resource_class = Deployment
 
-    def list(self, environment_id):
+    def list(self, environment_id, stream=False):
         return self._list('/v1/environments/{id}/deployments'.
-                          format(id=environment_id), 'deployments')
+                          format(id=environment_id), 'deployments',
+                          stream=stream)
 
-    def reports(self, environment_id, deployment_id, *service_ids):
+    def get(self, environment_id, deployment_id):
+        for deployment in self.list(environment_id, stream=True):
+            if deployment.id == deployment_id:
+                return deployment
+        raise exceptions.NotFound("Deployment {0} not found".format(
+            deployment_id))
+
+    def _fetch_reports(self, environment_id, deployment_id, service_ids,
+                       stream):
         path = '/v1/environments/{id}/deployments/{deployment_id}'
         path = path.format(id=environment_id, deployment_id=deployment_id)
         if service_ids:
-            for service_id in service_ids:
-                path += '?service_id={0}'.format(service_id)
+            path += '?' + urllib.parse.urlencode(
+                [('service_id', service_id) for service_id in service_ids])
+
+        if stream:
+            resp, data = self.api.json_stream_request(path, 'GET',
+                                                      response_key='reports')
+            return (Status(self, res, loaded=True) for res in data if res)
 
         resp, body = self.api.json_request(path, 'GET')
 
         data = body.get('reports', [])
         return [Status(self, res, loaded=True) for res in data if res]
+
+    def reports(self, environment_id, deployment_id, *service_ids, **kwargs):
+        """Return status reports of a deployment.
+
+        Reports of several services are requested at once. With
+        ``fan_out`` the reports of every service are requested separately
+        by concurrent requests instead, and are merged in the order of
+        their creation time.
+
+        :param stream: return an iterator yielding reports as they are
+                       decoded from the responses (keyword only)
+        :param fan_out: request reports of every service separately
+                        (keyword only). The responses are not streamed,
+                        the merge would keep all of them open at once.
+        :param concurrency: maximum number of concurrent requests with
+                            fan_out (keyword only)
+        """
+        stream = kwargs.pop('stream', False)
+        fan_out = kwargs.pop('fan_out', False)
+        concurrency = kwargs.pop('concurrency', REPORTS_CONCURRENCY)
+        if kwargs:
+            raise TypeError("Unexpected arguments: {0}".format(
+                ', '.join(sorted(kwargs))))
+
+        if not fan_out or len(service_ids) < 2:
+            return self._fetch_reports(environment_id, deployment_id,
+                                       service_ids, stream)
+
+        # NOTE: a streamed response holds its connection until it is
+        # read through, merging them would hold one per service and leak
+        # the opened ones if another request failed
+        results = base.run_concurrently(
+            lambda service_id: self._fetch_reports(
+                environment_id, deployment_id, (service_id,), False),
+            service_ids, concurrency)
+        for result in results:
+            if result.error is not None:
+                raise result.error
+        reports = _merge_reports(result.result for result in results)
+        return reports if stream else list(reports)
+
+    def watch(self, environment_id, deployment_id, *service_ids, **kwargs):
+        """Return DeploymentWatch following reports of a deployment.
+
+        Keyword arguments are passed to DeploymentWatch.
+        """
+        return DeploymentWatch(self, environment_id, deployment_id,
+                               service_ids, **kwargs)
@@ -18,6 +18,8 @@ from muranoclient.common import base
 
 
 class Environment(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return "<Environment %s>" % self._info
 
@@ -26,6 +28,8 @@ class Environment(base.Resource):
 
 
 class Status(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return '<Status %s>' % self._info
 
@@ -36,13 +40,13 @@ class Status(base.Resource):
 class EnvironmentManager(base.ManagerWithFind):
     resource_class = Environment
 
-    def list(self, all_tenants=False, tenant_id=None):
+    def list(self, all_tenants=False, tenant_id=None, stream=False):
         params = {'all_tenants': all_tenants}
         if tenant_id:
             params['tenant'] = tenant_id
         path = '/v1/environments?{query}'.format(
             query=urllib.parse.urlencode(params))
-        return self._list(path, 'environments')
+        return self._list(path, 'environments', stream=stream)
 
     def create(self, data):
         return self._create('/v1/environments', data)
@@ -16,6 +16,8 @@ from muranoclient.common import base
 
 
 class InstanceStatistics(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return "<Instance statistics %s>" % self._info
 
@@ -26,7 +28,7 @@ class InstanceStatistics(base.Resource):
 class InstanceStatisticsManager(base.Manager):
     resource_class = InstanceStatistics
 
-    def get(self, environment_id, instance_id=None):
+    def get(self, environment_id, instance_id=None, stream=False):
         if instance_id:
             path = '/v1/environments/{id}/instance-statistics/raw/' \
                    '{instance_id}'.format(id=environment_id,
@@ -34,7 +36,7 @@ class InstanceStatisticsManager(base.Manager):
         else:
             path = '/v1/environments/{id}/instance-statistics/raw'.format(
                 id=environment_id)
-        return self._list(path, None)
+        return self._list(path, None, stream=stream)
 
     def get_aggregated(self, environment_id):
         path = '/v1/environments/{id}/instance-statistics/aggregated'.format(
@@ -0,0 +1,281 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local SQLite index of the package catalog.
+"""
+
+import contextlib
+import sqlite3
+import time
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 300  # 5 minutes
+SYNC_PAGE_SIZE = 100
+LOCK_TIMEOUT = 30
+
+# filters answered by the index, other ones are sent to the API
+LOCAL_FILTERS = frozenset(['id', 'fqn', 'name', 'type', 'version', 'owner',
+                           'class_name', 'tag', 'category',
+                           'include_disabled', 'owned', 'limit', 'page_size',
+                           'prefetch'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS packages (
+    id TEXT PRIMARY KEY,
+    fqn TEXT,
+    name TEXT,
+    type TEXT,
+    version TEXT,
+    owner_id TEXT,
+    enabled INTEGER,
+    updated TEXT,
+    generation INTEGER,
+    body TEXT
+);
+CREATE TABLE IF NOT EXISTS package_attributes (
+    package_id TEXT,
+    kind TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS packages_fqn ON packages (fqn);
+CREATE INDEX IF NOT EXISTS package_attributes_value
+    ON package_attributes (kind, value);
+CREATE INDEX IF NOT EXISTS package_attributes_package
+    ON package_attributes (package_id);
+"""
+
+# package_attributes kinds and package fields they are taken from
+_ATTRIBUTES = {
+    'class_name': 'class_definitions',
+    'tag': 'tags',
+    'category': 'categories',
+}
+
+# filters matched against columns of packages table
+_COLUMNS = {
+    'id': 'id',
+    'fqn': 'fqn',
+    'name': 'name',
+    'type': 'type',
+    'version': 'version',
+    'owner': 'owner_id',
+}
+
+
+def _values(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+class PackageIndex(object):
+    """Local index of packages answering filters without the API.
+
+    The index is synced by walking the package listing page by page. The
+    marker of the last stored page is kept in the index, so a sync that
+    was interrupted or limited with ``max_pages`` continues where it
+    stopped. Only packages whose ``updated`` time changed are rewritten,
+    and packages missing from the listing are removed once a walk over
+    the whole listing completes. Several processes can share an index
+    file, SQLite locking serializes their writes.
+
+    Visibility of packages depends on the project, so an index should
+    only be shared by clients of a single project.
+
+    :param manager: PackageManager used to sync the index
+    :param path: path of the index file
+    :param max_age: seconds after the start of the last completed sync
+                    after which the index is synced before it is queried
+    """
+
+    def __init__(self, manager, path, max_age=DEFAULT_MAX_AGE):
+        self.manager = manager
+        self.path = path
+        self.max_age = max_age
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_meta(conn, key, default=None):
+        row = conn.execute('SELECT value FROM meta WHERE key = ?',
+                           (key,)).fetchone()
+        return default if row is None else row[0]
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                     (key, value))
+
+    @property
+    def synced_at(self):
+        """Start time of the last completed sync or None."""
+        with self._connect() as conn:
+            synced_at = self._get_meta(conn, 'synced_at')
+        return None if synced_at is None else float(synced_at)
+
+    @property
+    def age(self):
+        """Seconds since the start of the last completed sync or None."""
+        synced_at = self.synced_at
+        return None if synced_at is None else time.time() - synced_at
+
+    def is_stale(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        age = self.age
+        return age is None or age > max_age
+
+    def invalidate(self):
+        """Make the next query sync the index first."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM meta WHERE key = 'synced_at'")
+
+    def sync(self, max_pages=None):
+        """Walk the package listing and update the index.
+
+        :param max_pages: number of pages to process in this call, the
+                          next call continues from the last one (optional)
+        :returns: True if the walk over the listing was completed
+        """
+        with self._connect() as conn:
+            marker = self._get_meta(conn, 'marker')
+            generation = int(self._get_meta(conn, 'generation', 0))
+            if marker is None:
+                generation += 1
+                self._set_meta(conn, 'generation', generation)
+                self._set_meta(conn, 'walk_started', time.time())
+
+        pages = self.manager.pages(include_disabled=True,
+                                   limit=SYNC_PAGE_SIZE, marker=marker)
+        try:
+            for count, (packages, next_marker) in enumerate(pages, 1):
+                with self._connect() as conn:
+                    changed = self._store(conn, packages, generation)
+                    LOG.debug("Indexed page of {0} packages, {1} changed"
+                              .format(len(packages), changed))
+                    if next_marker is None:
+                        self._finish(conn, generation)
+                        return True
+                    self._set_meta(conn, 'marker', next_marker)
+                if max_pages is not None and count >= max_pages:
+                    return False
+        finally:
+            pages.close()
+        return False
+
+    def _store(self, conn, packages, generation):
+        changed = 0
+        for package in packages:
+            row = conn.execute('SELECT updated FROM packages WHERE id = ?',
+                               (package['id'],)).fetchone()
+            if row is not None and row[0] == package.get('updated'):
+                conn.execute('UPDATE packages SET generation = ? '
+                             'WHERE id = ?', (generation, package['id']))
+                continue
+            changed += 1
+            conn.execute(
+                'INSERT OR REPLACE INTO packages (id, fqn, name, type, '
+                'version, owner_id, enabled, updated, generation, body) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (package['id'], package.get('fully_qualified_name'),
+                 package.get('name'), package.get('type'),
+                 package.get('version'), package.get('owner_id'),
+                 package.get('enabled', True), package.get('updated'),
+                 generation, jsonutils.dumps(package)))
+            conn.execute('DELETE FROM package_attributes '
+                         'WHERE package_id = ?', (package['id'],))
+            conn.executemany(
+                'INSERT INTO package_attributes (package_id, kind, value) '
+                'VALUES (?, ?, ?)',
+                [(package['id'], kind, value)
+                 for kind, field in six.iteritems(_ATTRIBUTES)
+                 for value in package.get(field) or []])
+        return changed
+
+    def _finish(self, conn, generation):
+        conn.execute('DELETE FROM package_attributes WHERE package_id IN '
+                     '(SELECT id FROM packages WHERE generation < ?)',
+                     (generation,))
+        removed = conn.execute('DELETE FROM packages WHERE generation < ?',
+                               (generation,)).rowcount
+        LOG.debug("Package index synced, {0} packages removed".format(
+            removed))
+        conn.execute("DELETE FROM meta WHERE key = 'marker'")
+        self._set_meta(conn, 'synced_at',
+                       self._get_meta(conn, 'walk_started'))
+
+    @staticmethod
+    def can_filter(filters):
+        """Whether filters can be answered by the index."""
+        return (set(filters) <= LOCAL_FILTERS and
+                not filters.get('owned'))
+
+    def filter(self, max_age=None, **filters):
+        """Return packages matching filters.
+
+        Accepts the filters of :meth:`PackageManager.filter` listed in
+        LOCAL_FILTERS, plus ``owner`` (owner project id). ``tag``,
+        ``class_name`` and ``category`` match packages having any of the
+        given values. The index is synced first if it is older than
+        ``max_age`` (defaults to the max_age of the index).
+        """
+        if self.is_stale(max_age):
+            self.sync()
+
+        clauses = []
+        params = []
+        for key, column in six.iteritems(_COLUMNS):
+            if filters.get(key) is not None:
+                values = _values(filters[key])
+                clauses.append('{0} IN ({1})'.format(
+                    column, ', '.join('?' * len(values))))
+                params.extend(values)
+        for kind in _ATTRIBUTES:
+            if filters.get(kind) is not None:
+                values = _values(filters[kind])
+                clauses.append(
+                    'id IN (SELECT package_id FROM package_attributes '
+                    'WHERE kind = ? AND value IN ({0}))'.format(
+                        ', '.join('?' * len(values))))
+                params.append(kind)
+                params.extend(values)
+        if not filters.get('include_disabled'):
+            clauses.append('enabled')
+
+        query = 'SELECT body FROM packages'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY name, id'
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self.manager.resource_class(self.manager,
+                                            jsonutils.loads(row[0]),
+                                            loaded=True)
+                for row in rows]
@@ -12,20 +12,35 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import re
+import socket
+
+from oslo_log import log as logging
 from oslo_serialization import jsonutils
+import requests
 import six
 from six.moves import urllib
 import yaml
 
 from muranoclient.common import base
 from muranoclient.common import exceptions
+from muranoclient.common import multipart
 from muranoclient.common import utils
 
+LOG = logging.getLogger(__name__)
 
 DEFAULT_PAGE_SIZE = 20
+PREFETCH_PAGES = 1
+DOWNLOAD_CHUNK_SIZE = 1024 * 64  # 64kB
+DOWNLOAD_RETRIES = 3
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-\d+/(\d+|\*)$')
 
 
 class Package(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return "<Package %s>" % self._info
 
@@ -34,6 +49,8 @@ class Package(base.Resource):
 
 
 class Category(base.Resource):
+    __slots__ = ()
+
     def __init__(self, manager, info, loaded=False):
         self.value = info
 
@@ -47,73 +64,108 @@ class Category(base.Resource):
 class PackageManager(base.Manager):
     resource_class = Package
     _tracked_packages = set()
+    # muranoclient.v1.package_index.PackageIndex answering filters locally
+    index = None
+
+    def _changed(self):
+        if self.index is not None:
+            self.index.invalidate()
 
     def categories(self):
         return self._list('/v1/catalog/packages/categories',
                           response_key='categories', obj_class=Category)
 
-    def create(self, data, files):
+    def create(self, data, files, progress=None):
+        """Upload package archives with metadata.
+
+        The multipart body is streamed from ``files``, so archives are read
+        in chunks while being sent rather than copied into memory.
+
+        :param progress: called with ``(bytes_sent, total_bytes)`` while
+                         the body is being sent (optional)
+        """
         for pkg_file in files.values():
             utils.Package.from_file(pkg_file)
             pkg_file.seek(0)
 
+        body = multipart.MultipartEncoder(
+            fields={'__metadata__': jsonutils.dumps(data)},
+            files=files,
+            callback=progress)
         response = self.api.request(
             '/v1/catalog/packages',
             'POST',
-            data={'__metadata__': jsonutils.dumps(data)},
-            files=files
+            data=body,
+            headers={'Content-Type': body.content_type}
         )
         if not response.ok:
             setattr(response, 'status', response.status_code)
             raise exceptions.from_response(response)
         body = jsonutils.loads(response.text)
+        self._changed()
         return self.resource_class(self, body)
 
     def get(self, app_id):
         return self._get('/v1/catalog/packages/{0}'.format(app_id))
 
     def filter(self, **kwargs):
+        """Iterate over packages matching kwargs.
 
-        def construct_url(params):
-            for k, v in params.items():
-                if isinstance(v, six.text_type):
-                    v = v.encode('utf-8')
-                    params[k] = v
-            return '?'.join(
-                ['/v1/catalog/packages',
-                 urllib.parse.urlencode(params, doseq=True)]
-            )
-
-        def paginate(_url):
-            # code from Glance
-            resp, body = self.api.json_request(_url, 'GET')
-            for package in body['packages']:
-                yield package
-            try:
-                m_kwargs = kwargs.copy()
-                m_kwargs['marker'] = body['next_marker']
-                next_url = construct_url(m_kwargs)
-            except KeyError:
-                return
-            else:
-                for package in paginate(next_url):
-                    yield package
+        Filters supported by the ``index`` of the manager, if it is set,
+        are answered by the index. Otherwise pages are requested
+        iteratively, the next page is requested in the background while
+        the current one is consumed. ``prefetch`` is the number of pages
+        requested in advance, 0 disables it.
+        """
+        if self.index is not None and self.index.can_filter(kwargs):
+            return iter(self.index.filter(**kwargs))
+        return self._filter(**kwargs)
+
+    def _filter(self, **kwargs):
+        prefetch = kwargs.pop('prefetch', PREFETCH_PAGES)
+        pages = utils.prefetch(self.pages(**kwargs), prefetch)
+        for packages, next_marker in pages:
+            for package in packages:
+                yield self.resource_class(self, package, loaded=True)
 
+    def pages(self, **kwargs):
+        """Iterate over (packages, next_marker) pairs of listing pages.
+
+        next_marker is None for the last page.
+        """
         if 'page_size' not in kwargs:
             kwargs['limit'] = kwargs.get('limit', DEFAULT_PAGE_SIZE)
         else:
             kwargs['limit'] = kwargs['page_size']
-
-        url = construct_url(kwargs)
-
-        for package in paginate(url):
-            yield self.resource_class(self, package, loaded=True)
+        marker = kwargs.pop('marker', None)
+
+        for k, v in kwargs.items():
+            if isinstance(v, six.text_type):
+                kwargs[k] = v.encode('utf-8')
+        url = '?'.join(['/v1/catalog/packages',
+                        urllib.parse.urlencode(kwargs, doseq=True)])
+
+        # code from Glance
+        while True:
+            page_url = url
+            if isinstance(marker, six.text_type):
+                marker = marker.encode('utf-8')
+            if marker is not None:
+                page_url = '&'.join([url, urllib.parse.urlencode(
+                    {'marker': marker})])
+            resp, body = self.api.json_request(page_url, 'GET')
+            marker = body.get('next_marker')
+            yield body['packages'], marker
+            if marker is None:
+                return
 
     def list(self, include_disabled=False, limit=20):
         return self.filter(include_disabled=include_disabled, limit=limit)
 
     def delete(self, app_id):
-        return self._delete('/v1/catalog/packages/{0}'.format(app_id))
+        result = self._delete('/v1/catalog/packages/{0}'.format(app_id))
+        self._changed()
+        return result
 
     def update(self, app_id, body, operation='replace'):
         """Translates dictionary to jsonpatch request
@@ -127,32 +179,125 @@ class PackageManager(base.Manager):
         data = []
         for key, value in six.iteritems(body):
             data.append({'op': operation, 'path': '/' + key, 'value': value})
-        return self.api.json_patch_request(url, data=data)
+        result = self.api.json_patch_request(url, data=data)
+        self._changed()
+        return result
 
     def download(self, app_id):
+        archive = six.BytesIO()
+        self.download_to(app_id, archive)
+        return archive.getvalue()
+
+    def download_to(self, app_id, dst, checksum=None,
+                    chunk_size=DOWNLOAD_CHUNK_SIZE,
+                    retries=DOWNLOAD_RETRIES):
+        """Stream package archive to a file object or a file path.
+
+        The archive is written in chunks of ``chunk_size`` bytes, so memory
+        usage does not depend on the archive size. Interrupted transfers are
+        resumed with HTTP Range requests up to ``retries`` times.
+
+        :param app_id: id of the package to download
+        :param dst: writable binary file object or a path to write to
+        :param checksum: expected md5 hex digest of the archive (optional)
+        :returns: number of bytes written
+        :raises DownloadError: if the archive is incomplete or corrupted
+        """
         url = '/v1/catalog/packages/{0}/download'.format(app_id)
-        response = self.api.request(url, 'GET', log=False)
-        if response.status_code == 200:
-            return response.content
-        else:
-            raise exceptions.from_response(response)
+        md5 = hashlib.md5()
+        written = 0
+        total = None
+        attempt = 0
+        with utils.open_destination(dst) as fileobj:
+            while True:
+                headers = {}
+                if written:
+                    headers['Range'] = 'bytes={0}-'.format(written)
+                try:
+                    response = self.api.request(url, 'GET', log=False,
+                                                stream=True, headers=headers)
+                    if response.status_code not in (200, 206):
+                        raise exceptions.from_response(response)
+                    if written and response.status_code == 200:
+                        raise exceptions.DownloadError(
+                            "Server does not support resuming downloads "
+                            "of package {0}".format(app_id))
+                    total = self._download_size(response, written, total)
+                    try:
+                        for chunk in response.iter_content(chunk_size):
+                            fileobj.write(chunk)
+                            md5.update(chunk)
+                            written += len(chunk)
+                    finally:
+                        response.close()
+                    if total is not None and written < total:
+                        raise exceptions.CommunicationError(
+                            "Connection closed after {0} of {1} "
+                            "bytes".format(written, total))
+                    break
+                except (exceptions.CommunicationError,
+                        requests.exceptions.RequestException,
+                        socket.error) as e:
+                    attempt += 1
+                    if attempt > retries:
+                        raise exceptions.DownloadError(
+                            "Download of package {0} failed after {1} "
+                            "bytes: {2}".format(app_id, written, e))
+                    LOG.warning("Download of package {0} interrupted after "
+                                "{1} bytes ({2}), resuming".format(
+                                    app_id, written, e))
+
+        if total is not None and written != total:
+            raise exceptions.DownloadError(
+                "Downloaded {0} bytes of package {1}, expected {2}".format(
+                    written, app_id, total))
+        if checksum is not None and md5.hexdigest() != checksum:
+            raise exceptions.DownloadError(
+                "Checksum of package {0} is {1}, expected {2}".format(
+                    app_id, md5.hexdigest(), checksum))
+        return written
+
+    @staticmethod
+    def _download_size(response, offset, total):
+        """Return total archive size announced by a (partial) response."""
+        if response.status_code == 206:
+            match = _CONTENT_RANGE_RE.match(
+                response.headers.get('content-range', ''))
+            if not match or int(match.group(1)) != offset:
+                raise exceptions.DownloadError(
+                    "Unexpected Content-Range in resumed download: "
+                    "{0}".format(response.headers.get('content-range')))
+            if match.group(2) != '*':
+                return int(match.group(2))
+            return total
+        length = response.headers.get('content-length')
+        if response.headers.get('content-encoding', 'identity') != 'identity':
+            # NOTE: decoded body size differs from the announced one
+            return None
+        if length is not None:
+            return int(length)
+        return total
 
     def toggle_active(self, app_id):
         url = '/v1/catalog/packages/{0}'.format(app_id)
         enabled = self.get(app_id).enabled
         data = [{'op': 'replace', 'path': '/enabled', 'value': not enabled}]
-        return self.api.json_patch_request(url, data=data)
+        result = self.api.json_patch_request(url, data=data)
+        self._changed()
+        return result
 
     def toggle_public(self, app_id):
         url = '/v1/catalog/packages/{0}'.format(app_id)
         is_public = self.get(app_id).is_public
         data = [{'op': 'replace', 'path': '/is_public',
                 'value': not is_public}]
-        return self.api.json_patch_request(url, body=data)
+        result = self.api.json_patch_request(url, body=data)
+        self._changed()
+        return result
 
     def get_ui(self, app_id, loader_cls=None):
         if loader_cls is None:
-            loader_cls = yaml.SafeLoader
+            loader_cls = utils.SafeLoader
 
         url = '/v1/catalog/packages/{0}/ui'.format(app_id)
         response = self.api.request(url, 'GET')
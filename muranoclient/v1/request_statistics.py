@@ -16,6 +16,8 @@ from muranoclient.common import base
 
 
 class RequestStatistics(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return "<Request statistics %s>" % self._info
 
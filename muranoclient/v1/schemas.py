@@ -18,6 +18,8 @@ from muranoclient.common import base
 
 
 class Schema(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return "<Schema %s>" % self._info
 
@@ -39,6 +39,8 @@ def normalize_path(f):
 
 
 class Service(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return '<Service %s>' % self._info
 
@@ -12,10 +12,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 from muranoclient.common import base
+from muranoclient.common import exceptions
+from muranoclient.common import utils
+from muranoclient.v1 import environments
+
+# statuses of environments with a deployment in progress
+DEPLOYING_STATUSES = frozenset(['deploying'])
 
 
 class Session(base.Resource):
+    __slots__ = ()
+
     def __repr__(self):
         return '<Session %s>' % self._info
 
@@ -34,10 +44,43 @@ class SessionManager(base.Manager):
         return self._create('/v1/environments/{id}/configure'.
                             format(id=environment_id), None)
 
-    def deploy(self, environment_id, session_id):
+    def deploy(self, environment_id, session_id, wait=False, timeout=None,
+               poll=None):
+        """Deploy a configuration session.
+
+        :param wait: poll the environment until the deployment finishes
+                     and return the environment
+        :param timeout: seconds to wait, WaitTimeout is raised when they
+                        run out (optional)
+        :param poll: iterable of delays between polls in seconds, jittered
+                     exponential backoff of utils.backoff() by default.
+                     The last delay is repeated once it runs out.
+        """
         path = '/v1/environments/{id}/sessions/{session_id}/deploy'
         self.api.json_request(path.format(id=environment_id,
                                           session_id=session_id), 'POST')
+        if not wait:
+            return
+
+        manager = environments.EnvironmentManager(self.api)
+        delays = iter(utils.backoff() if poll is None else poll)
+        delay = None
+        started = time.time()
+        while True:
+            environment = manager.get(environment_id)
+            if environment.status not in DEPLOYING_STATUSES:
+                return environment
+            delay = next(delays, delay)
+            if delay is None:
+                raise ValueError("poll has no delays")
+            if timeout is not None:
+                remaining = timeout - (time.time() - started)
+                if remaining <= 0:
+                    raise exceptions.WaitTimeout(
+                        "Environment {0} was not deployed in {1} seconds"
+                        .format(environment_id, timeout))
+                delay = min(delay, remaining)
+            time.sleep(delay)
 
     def delete(self, environment_id, session_id):
         return self._delete("/v1/environments/{id}/sessions/{session_id}".
@@ -20,6 +20,7 @@ import os
 import shutil
 import sys
 import tempfile
+import time
 import uuid
 import zipfile
 
@@ -31,6 +32,7 @@ import six.moves
 from muranoclient.apiclient import exceptions
 from muranoclient.common import exceptions as common_exceptions
 from muranoclient.common import utils
+from muranoclient.v1 import deployments
 from muranoclient.v1.package_creator import hot_package
 from muranoclient.v1.package_creator import mpl_package
 
@@ -106,18 +108,11 @@ def do_environment_create(mc, args):
 def do_environment_delete(mc, args):
     """Delete an environment."""
     abandon = getattr(args, 'abandon', False)
-    failure_count = 0
-    for environment_id in args.id:
-        try:
-            environment = utils.find_resource(mc.environments, environment_id)
-            mc.environments.delete(environment.id, abandon)
-        except exceptions.NotFound:
-            failure_count += 1
-            print("Failed to delete '{0}'; environment not found".
-                  format(environment_id))
-    if failure_count == len(args.id):
-        raise exceptions.CommandError("Unable to find and delete any of the "
-                                      "specified environments.")
+    utils.bulk_delete(
+        lambda environment_id: mc.environments.delete(environment_id,
+                                                      abandon),
+        args.id, 'environment', 'environments',
+        find=functools.partial(utils.find_resource, mc.environments))
     do_environment_list(mc)
 
 
@@ -150,6 +145,11 @@ def do_environment_show(mc, args):
     except exceptions.NotFound:
         raise exceptions.CommandError("Environment %s not found" % args.id)
     else:
+        if not hasattr(environment, 'services'):
+            # NOTE: environments found by name come from the listing, which
+            # has no services
+            environment = mc.environments.get(environment.id,
+                                              session_id=args.session_id)
         if getattr(args, 'only_apps', False):
             print(utils.json_formatter(environment.services))
         else:
@@ -169,9 +169,32 @@ def do_environment_show(mc, args):
 @utils.arg("--session-id", metavar="<SESSION>",
            required=True,
            help="ID of configuration session to deploy.")
+@utils.arg("--wait", action='store_true', default=False,
+           help="Wait until the deployment finishes.")
+@utils.arg("--timeout", type=float, default=None,
+           help="Fail if the deployment does not finish in that many "
+                "seconds, implies --wait.")
 def do_environment_deploy(mc, args):
     """Start deployment of a murano environment session."""
-    mc.sessions.deploy(args.id, args.session_id)
+    wait = args.wait or args.timeout is not None
+    if not wait:
+        mc.sessions.deploy(args.id, args.session_id)
+        do_environment_show(mc, args)
+        return
+
+    started = time.time()
+    try:
+        environment = mc.sessions.deploy(args.id, args.session_id,
+                                         wait=True, timeout=args.timeout)
+    except common_exceptions.WaitTimeout as e:
+        raise exceptions.CommandError(six.text_type(e))
+    message = ("Environment {0} finished deploying with status '{1}' in "
+               "{2:.1f}s".format(args.id, environment.status,
+                                 time.time() - started))
+    if environment.status != 'ready':
+        raise exceptions.CommandError(message)
+    # NOTE: stdout is left to the environment, as in openstack CLI
+    sys.stderr.write(message + '\n')
     do_environment_show(mc, args)
 
 
@@ -483,17 +506,8 @@ def do_env_template_update(mc, args):
            nargs="+", help="ID of environment(s) template to delete.")
 def do_env_template_delete(mc, args):
     """Delete an environment template."""
-    failure_count = 0
-    for env_template_id in args.id:
-        try:
-            mc.env_templates.delete(env_template_id)
-        except common_exceptions.HTTPNotFound:
-            failure_count += 1
-            mns = "Failed to delete '{0}'; environment template not found".\
-                format(env_template_id)
-
-    if failure_count == len(args.id):
-        raise exceptions.CommandError(mns)
+    utils.bulk_delete(mc.env_templates.delete, args.id,
+                      'environment template', 'environment templates')
     do_env_template_list(mc)
 
 
@@ -538,6 +552,72 @@ def do_deployment_list(mc, args):
         utils.print_list(deployments, fields, field_labels, sortby=0)
 
 
+def _print_report(report):
+    print("{0} {1:<7} {2}".format(getattr(report, 'created', ''),
+                                  getattr(report, 'level', ''),
+                                  getattr(report, 'text', '')))
+
+
+def _watch_deployment(mc, environment_id, deployment_id, service_ids=(),
+                      **kwargs):
+    try:
+        watch = mc.deployments.watch(environment_id, deployment_id,
+                                     *service_ids, **kwargs)
+    except ValueError as e:
+        raise exceptions.CommandError(six.text_type(e))
+    try:
+        for report in watch:
+            _print_report(report)
+    except common_exceptions.WaitTimeout as e:
+        raise exceptions.CommandError(six.text_type(e))
+    print("Deployment {0} finished with state '{1}' in {2:.1f}s".format(
+        deployment_id, watch.deployment.state, watch.elapsed))
+    if watch.deployment.state != 'success':
+        raise exceptions.CommandError("Deployment {0} completed with errors"
+                                      .format(deployment_id))
+
+
+@utils.arg("id", metavar="<NAME or ID>",
+           help="Environment ID or name.")
+@utils.arg("deployment_id", metavar="<DEPLOYMENT_ID>", nargs='?',
+           help="Deployment ID, defaults to the latest deployment of the "
+                "environment.")
+@utils.arg("--service-id", metavar="<SERVICE_ID>", action='append',
+           default=[], dest='service_ids',
+           help="Only show reports of the service. Can be repeated.")
+@utils.arg("--interval", type=float, default=deployments.WATCH_INTERVAL,
+           help="Initial polling interval in seconds. It grows while no "
+                "new reports arrive.")
+@utils.arg("--max-interval", type=float,
+           default=deployments.WATCH_MAX_INTERVAL,
+           help="Maximum polling interval in seconds.")
+@utils.arg("--timeout", type=float, default=None,
+           help="Fail if the deployment does not finish in that many "
+                "seconds.")
+def do_deployment_watch(mc, args):
+    """Print new reports of a deployment until it finishes."""
+    try:
+        environment = utils.find_resource(mc.environments, args.id)
+    except exceptions.NotFound:
+        raise exceptions.CommandError("Environment %s not found" % args.id)
+    deployment_id = args.deployment_id
+    if deployment_id is None:
+        environment_deployments = mc.deployments.list(environment.id)
+        if not environment_deployments:
+            raise exceptions.CommandError("Environment %s has no deployments"
+                                          % args.id)
+        deployment_id = max(environment_deployments,
+                            key=lambda d: d.created).id
+    try:
+        _watch_deployment(mc, environment.id, deployment_id,
+                          args.service_ids, interval=args.interval,
+                          max_interval=args.max_interval,
+                          timeout=args.timeout)
+    except exceptions.NotFound:
+        raise exceptions.CommandError("Deployment %s not found"
+                                      % deployment_id)
+
+
 @utils.arg("--limit", type=int, default=0,
            help='Show limited number of packages')
 @utils.arg("--marker", default='',
@@ -578,6 +658,8 @@ def do_package_list(mc, args=None):
                 '--limit parameter must be non-negative')
         if args.limit != 0:
             filter_args['limit'] = args.limit
+            # NOTE: only the first page of limit packages is printed
+            filter_args['prefetch'] = 0
         if args.marker:
             filter_args['marker'] = args.marker
         if args.search:
@@ -618,16 +700,13 @@ def _print_package_list(packages):
 def do_package_download(mc, args):
     """Download a package to a filename or stdout."""
 
-    def download_to_fh(package_id, fh):
-        fh.write(mc.packages.download(package_id))
-
     try:
         if args.filename:
-            with open(args.filename, 'wb') as fh:
-                download_to_fh(args.id, fh)
-                print("Package downloaded to %s" % args.filename)
+            mc.packages.download_to(args.id, args.filename)
+            print("Package downloaded to %s" % args.filename)
         elif not sys.stdout.isatty():
-            download_to_fh(args.id, sys.stdout)
+            mc.packages.download_to(args.id,
+                                    getattr(sys.stdout, 'buffer', sys.stdout))
         else:
             msg = ('No stdout redirection or local file specified for '
                    'downloaded package. Please specify a local file to save '
@@ -672,21 +751,8 @@ def do_package_show(mc, args):
            nargs='+', help="Package ID to delete.")
 def do_package_delete(mc, args):
     """Delete a package."""
-    failure_count = 0
-    for package_id in args.id:
-        try:
-            mc.packages.delete(package_id)
-            print("Deleted package '{0}'".format(package_id))
-        except exceptions.NotFound:
-            failure_count += 1
-            print("Failed to delete '{0}'; package not found".
-                  format(package_id))
-
-    if failure_count == len(args.id):
-        raise exceptions.CommandError("Unable to find and delete any of the "
-                                      "specified packages.")
-    else:
-        do_package_list(mc)
+    utils.bulk_delete(mc.packages.delete, args.id, 'package', 'packages')
+    do_package_list(mc)
 
 
 def _handle_package_exists(mc, data, package, exists_action):
@@ -1218,17 +1284,8 @@ def do_category_create(mc, args):
            nargs="+", help="ID of a category(ies) to delete.")
 def do_category_delete(mc, args):
     """Delete a category."""
-    failure_count = 0
-    for category_id in args.id:
-        try:
-            mc.categories.delete(category_id)
-        except common_exceptions.HTTPNotFound:
-            failure_count += 1
-            print("Failed to delete '{0}'; category not found".
-                  format(category_id))
-    if failure_count == len(args.id):
-        raise exceptions.CommandError("Unable to find and delete any of the "
-                                      "specified categories.")
+    utils.bulk_delete(mc.categories.delete, args.id, 'category',
+                      'categories')
     do_category_list(mc)
 
 
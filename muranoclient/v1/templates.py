@@ -17,6 +17,8 @@ from muranoclient.common import base
 
 class Template(base.Resource):
     """Involves the template resource."""
+    __slots__ = ()
+
     def __repr__(self):
         return "<Template %s>" % self._info
 
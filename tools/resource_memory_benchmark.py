@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure memory used by resources of large listings.
+
+Usage: resource_memory_benchmark.py [-n COUNT] [--services N]
+                                    [--max-bytes BYTES]
+
+A listing of COUNT environments, each with N services, is decoded from
+JSON the same way the API responses are. The memory kept by the resources
+wrapping the decoded listing is reported, on top of the listing itself,
+together with the time of to_dict() of all of them. The numbers are
+compared with resources which copy every field into the instance
+__dict__, as the resources of older releases did. The benchmark fails if
+the resources use more than --max-bytes per environment.
+"""
+
+from __future__ import print_function
+
+import argparse
+import copy
+import json
+import sys
+import time
+import tracemalloc
+
+from muranoclient.v1 import environments
+
+
+class DictResource(object):
+    """Resource keeping every field in the instance __dict__."""
+
+    def __init__(self, manager, info, loaded=False):
+        self.manager = manager
+        self._info = info
+        for k, v in info.items():
+            setattr(self, k, v)
+        self._loaded = loaded
+
+    def to_dict(self):
+        return copy.deepcopy(self._info)
+
+
+def listing(count, services):
+    envs = []
+    for i in range(count):
+        envs.append({
+            'id': 'env-{0:032d}'.format(i),
+            'name': 'environment-{0}'.format(i),
+            'status': 'ready',
+            'created': '2016-01-01T00:00:00',
+            'updated': '2016-01-01T00:00:00',
+            'tenant_id': 'tenant',
+            'version': 1,
+            'services': [{
+                '?': {'id': 'svc-{0}-{1}'.format(i, j),
+                      'type': 'io.murano.apps.App/0.0.0@io.murano.apps',
+                      'name': 'App'},
+                'name': 'app-{0}'.format(j),
+                'instance': {'?': {'id': 'inst-{0}-{1}'.format(i, j),
+                                   'type': 'io.murano.resources.Instance'},
+                             'flavor': 'm1.small',
+                             'image': 'image',
+                             'keyname': ''},
+            } for j in range(services)],
+        })
+    return json.dumps({'environments': envs})
+
+
+def measure(resource_class, body):
+    """Return (bytes kept by resources, seconds of to_dict of all)."""
+    envs = json.loads(body)['environments']
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    resources = [resource_class(None, env, loaded=True) for env in envs]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    started = time.time()
+    for resource in resources:
+        resource.to_dict()
+    return used, time.time() - started
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    parser.add_argument('--services', type=int, default=5)
+    parser.add_argument('--max-bytes', type=int, default=None,
+                        help='Fail if resources use more bytes per '
+                             'environment.')
+    args = parser.parse_args(argv)
+
+    body = listing(args.count, args.services)
+    print("{0} environments, {1} services each, {2:.1f}MB of JSON".format(
+        args.count, args.services, len(body) / 1024.0 / 1024))
+    failed = False
+    for name, resource_class in (('Resource', environments.Environment),
+                                 ('dict resource', DictResource)):
+        used, to_dict = measure(resource_class, body)
+        per_env = used / float(args.count)
+        print("{0:>14}: {1:8.0f} bytes per environment, to_dict() "
+              "{2:6.3f}s".format(name, per_env, to_dict))
+        if (resource_class is environments.Environment and
+                args.max_bytes is not None and per_env > args.max_bytes):
+            print("resources use more than {0} bytes per environment".format(
+                args.max_bytes))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
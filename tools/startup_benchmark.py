@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure cold start time of the murano CLI and fail on regressions.
+
+Usage: startup_benchmark.py [-n REPEAT] [--max-ms MS] [--profile N]
+
+Every run imports what ``murano help`` needs in a fresh interpreter.
+The benchmark fails if any of the modules that only some commands need
+was imported, or if the median start up time exceeds --max-ms. With
+--profile the N slowest imports reported by ``python -X importtime``
+(python 3.7+) are printed as well.
+"""
+
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+import time
+
+STARTUP = ("import muranoclient.shell\n"
+           "import muranoclient.v1.shell\n"
+           "import muranoclient.v1.client\n")
+
+# modules which must only be imported by the commands that use them
+LAZY_MODULES = ('glanceclient', 'keystoneclient.discover', 'muranopkgcheck',
+                'pbr.packaging', 'setuptools', 'yaql')
+
+CHECK = STARTUP + (
+    "import sys\n"
+    "for name in {0!r}:\n"
+    "    if name in sys.modules:\n"
+    "        print(name)\n").format(LAZY_MODULES)
+
+
+def cold_start():
+    started = time.time()
+    subprocess.check_call([sys.executable, '-c', STARTUP])
+    return time.time() - started
+
+
+def eager_imports():
+    output = subprocess.check_output([sys.executable, '-c', CHECK])
+    return output.decode().split()
+
+
+def profile(limit):
+    """Return the slowest imports as (cumulative_us, self_us, name)."""
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        stderr=subprocess.PIPE)
+    _, output = process.communicate()
+    imports = []
+    for line in output.decode().splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        try:
+            imports.append((int(cumulative), int(own), name.rstrip()))
+        except ValueError:
+            # header line
+            continue
+    return sorted(imports, reverse=True)[:limit]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='Fail if median start up time exceeds it.')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='Print N slowest imports.')
+    args = parser.parse_args(argv)
+
+    failed = False
+    eager = eager_imports()
+    for name in eager:
+        print("{0} is imported on start up".format(name))
+        failed = True
+
+    timings = sorted(cold_start() for _ in range(args.repeat))
+    median = timings[len(timings) // 2] * 1000
+    print("cold start: median {0:.0f}ms, best {1:.0f}ms of {2} runs".format(
+        median, timings[0] * 1000, args.repeat))
+    if args.max_ms is not None and median > args.max_ms:
+        print("cold start is slower than {0:.0f}ms".format(args.max_ms))
+        failed = True
+
+    if args.profile:
+        if sys.version_info < (3, 7):
+            print("-X importtime requires python 3.7 or newer")
+        else:
+            print("{0:>10} {1:>10}  module".format('cumul(us)', 'self(us)'))
+            for cumulative, own, name in profile(args.profile):
+                print("{0:>10} {1:>10} {2}".format(cumulative, own, name))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare pure python and LibYAML based loaders on package contents.
+
+Usage: yaml_loader_benchmark.py [-n REPEAT] PACKAGE [PACKAGE ...]
+
+PACKAGE is a package archive or directory, e.g. a checkout of
+murano-apps. Manifests, classes and UI definitions of all the packages
+are parsed with the loaders used by muranoclient and with their pure
+python equivalents.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+import zipfile
+
+import yaml
+
+from muranoclient.common import utils
+
+
+def pure_loader(loader):
+    """Return copy of a loader class based on pure python SafeLoader."""
+    pure = type('Pure' + loader.__name__, (yaml.SafeLoader,), {})
+    pure.yaml_constructors = dict(loader.yaml_constructors)
+    pure.yaml_implicit_resolvers = dict(
+        (k, v[:]) for k, v in loader.yaml_implicit_resolvers.items())
+    return pure
+
+
+def collect_documents(paths):
+    """Return list of (loader, text) pairs to parse."""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for name in files:
+                    full_name = os.path.join(root, name)
+                    with open(full_name, 'rb') as f:
+                        documents.extend(classify(full_name, f.read()))
+        elif zipfile.is_zipfile(path):
+            archive = zipfile.ZipFile(path)
+            for name in archive.namelist():
+                documents.extend(classify(name, archive.read(name)))
+    return documents
+
+
+def classify(name, content):
+    name = name.replace(os.sep, '/')
+    if name.endswith('manifest.yaml') or name.endswith('images.lst'):
+        return [(utils.SafeLoader, content)]
+    if '/Classes/' in '/' + name and name.endswith('.yaml'):
+        return [(utils.DummyYaqlYamlLoader, content)]
+    if '/UI/' in '/' + name and name.endswith('.yaml'):
+        return [(utils.YaqlYamlLoader, content)]
+    return []
+
+
+def run(documents, repeat, pure):
+    loaders = {}
+    started = time.time()
+    for _ in range(repeat):
+        for loader, content in documents:
+            if pure:
+                if loader not in loaders:
+                    loaders[loader] = pure_loader(loader)
+                loader = loaders[loader]
+            list(yaml.load_all(content, loader))
+    return time.time() - started
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    parser.add_argument('packages', nargs='+')
+    args = parser.parse_args(argv)
+
+    documents = collect_documents(args.packages)
+    if not documents:
+        print("No manifests, classes or UI definitions found")
+        return 1
+    size = sum(len(content) for loader, content in documents)
+    print("Parsing {0} documents ({1} kB) {2} times".format(
+        len(documents), size // 1024, args.repeat))
+    if not yaml.__with_libyaml__:
+        print("LibYAML is not available, both runs use pure python loaders")
+
+    pure = run(documents, args.repeat, pure=True)
+    accelerated = run(documents, args.repeat, pure=False)
+    print("pure python: {0:.3f}s".format(pure))
+    print("libyaml:     {0:.3f}s".format(accelerated))
+    print("speedup:     {0:.1f}x".format(pure / accelerated))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))